@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+bench_features.py
+
+Étape 7 de la Silver : ancien assemblage (2 merges + .dt par ligne) contre
+features.build_features (lookup indexé, float32/int8). Temps et pic mémoire
+(tracemalloc, sur une passe séparée).
+
+Usage :
+    python bench/bench_features.py --sensors 5000 --hours 720
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from features import build_features, FEATURE_COLUMNS
+
+
+def legacy_features(df_hist, df_pos, df_proxy):
+    df_feat = (
+        df_hist
+        .merge(df_pos[["sensor_id","lat","lon","capacity_tons"]], on="sensor_id", how="left")
+        .merge(df_proxy, on="sensor_id", how="left")
+    )
+    df_feat["hour_of_day"] = df_feat["ts"].dt.hour
+    df_feat["day_of_week"] = df_feat["ts"].dt.dayofweek
+    return df_feat[FEATURE_COLUMNS]
+
+
+def dataset(sensors, hours, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = np.array([f"S{i+1}" for i in range(sensors)])
+    ts = pd.date_range("2024-01-01", periods=hours, freq="h")
+    df_hist = pd.DataFrame({"sensor_id": np.tile(ids, hours),
+                            "ts": np.repeat(ts.values, sensors),
+                            "fill_level": rng.random(sensors * hours)})
+    df_pos = pd.DataFrame({"lat": 48.8 + rng.random(sensors) / 10, "lon": 2.3 + rng.random(sensors) / 10,
+                           "sensor_id": ids, "capacity_tons": 0.12})
+    df_proxy = pd.DataFrame({"sensor_id": ids, "annual_tons": 1.5, "daily_tons": 1.5 / 365})
+    return df_hist, df_pos, df_proxy
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=5000)
+    parser.add_argument("--hours", type=int, default=720)
+    args = parser.parse_args()
+
+    inputs = dataset(args.sensors, args.hours)
+    print(f"{args.sensors} capteurs × {args.hours} h = {args.sensors * args.hours} lignes")
+    for name, fn in (("merge", legacy_features), ("build_features", build_features)):
+        t = time.perf_counter()
+        out = fn(*inputs)
+        elapsed = time.perf_counter() - t
+        tracemalloc.start()
+        fn(*inputs)
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        size = out.memory_usage(deep=True).sum() / 2**20
+        print(f"{name:>15}: {elapsed:.3f} s, pic {peak:.0f} MiB, table {size:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
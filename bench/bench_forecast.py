@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+bench_forecast.py
+
+Temps de la prévision multi-horizon récursive (forecast.forecast) : un
+`predict` par horizon sur tous les capteurs, avec le même pipeline que
+gold.py entraîné sur des features synthétiques. Le temps de mise à jour des
+features entre deux horizons (`forecast.advance`) est mesuré à part.
+
+Usage :
+    python bench/bench_forecast.py --sensors 10000 --hours 48
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import Pipeline
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import forecast
+from rolling_features import ROLLING_COLUMNS
+
+BASE_COLUMNS = ['lat', 'lon', 'capacity_tons', 'annual_tons', 'daily_tons', 'hour_of_day', 'day_of_week']
+
+
+def synthetic(n, rng, ts):
+    df = pd.DataFrame({c: rng.random(n, dtype=np.float32) for c in BASE_COLUMNS + ROLLING_COLUMNS})
+    df["hour_of_day"] = rng.integers(0, 24, n).astype(np.float32)
+    df["day_of_week"] = rng.integers(0, 7, n).astype(np.float32)
+    df["hours_since_empty"] *= 72
+    df["fill_level"] = (0.3 * df["fill_lag_1"] + 0.02 * df["hours_since_empty"]).clip(0, 1)
+    df["sensor_id"] = [f"S{i+1}" for i in range(n)]
+    df["ts"] = ts
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=10_000)
+    parser.add_argument("--hours", type=int, default=forecast.FORECAST_HOURS)
+    parser.add_argument("--train-rows", type=int, default=50_000)
+    parser.add_argument("--jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    cols = BASE_COLUMNS + ROLLING_COLUMNS
+    train = synthetic(args.train_rows, rng, pd.Timestamp("2024-01-01"))
+    pipeline = Pipeline([
+        ('scaler', StandardScaler()),
+        ('rf', RandomForestRegressor(n_estimators=100, max_depth=10, random_state=42)),
+    ]).fit(train[cols], train["fill_level"])
+    pipeline.named_steps['rf'].n_jobs = args.jobs
+
+    latest = synthetic(args.sensors, rng, pd.Timestamp("2024-02-01 08:00"))
+    mat = latest[cols].to_numpy(np.float32, copy=True)
+    col = {c: i for i, c in enumerate(cols)}
+    level = latest["fill_level"].to_numpy(np.float32)
+    t = time.perf_counter()
+    for target in forecast.horizon_times(latest, args.hours):
+        forecast.advance(mat, col, target, level, level)
+    build = time.perf_counter() - t
+
+    t = time.perf_counter()
+    df_fc = forecast.forecast(pipeline, latest, cols, args.hours)
+    total = time.perf_counter() - t
+    print(f"{args.sensors} capteurs × {args.hours} h ({args.sensors * args.hours} lignes), "
+          f"{os.cpu_count()} CPU : features {build * 1000:.0f} ms, total {total:.2f} s "
+          f"({total / args.hours * 1000:.0f} ms par horizon)")
+    print(f"délai avant seuil connu pour {int(df_fc['hours_to_threshold'].notna().sum())} capteurs")
+
+
+if __name__ == "__main__":
+    main()
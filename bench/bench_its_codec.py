@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+bench_its_codec.py
+
+CAM / DENM : taille des payloads et messages/s en encodage et décodage,
+JSON contre ASN.1 UPER (script/its_codec.py), sur les messages réellement
+publiés par obu.py (CAM) et rsu.py (DENM issu de in_denm.json). UPER ne
+vise que la taille ; les débits servent à dimensionner (asn1tools, Python
+pur, est plus lent que le module json).
+
+Usage :
+    python bench/bench_its_codec.py --messages 20000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_DIR = os.path.join(os.path.dirname(BENCH_DIR), "script")
+sys.path.insert(0, SCRIPT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import datagen
+import its_codec
+
+
+def messages(n, rng):
+    with open(os.path.join(SCRIPT_DIR, "in_denm.json")) as f:
+        tpl = f.read()
+    lats = rng.uniform(*datagen.LAT_RANGE, n)
+    lons = rng.uniform(*datagen.LON_RANGE, n)
+    cams, denms = [], []
+    for i in range(n):
+        cams.append({"stationID": i % 20 + 1, "latitude": float(lats[i]), "longitude": float(lons[i]),
+                     "timestamp": "2024-01-30T08:00:00.250000Z"})
+        denm = json.loads(tpl)
+        denm["management"]["actionID"]["originatingStationID"] = i + 1
+        denm["situation"]["eventType"]["causeCode"] = 50
+        denm["situation"]["eventPosition"] = {"latitude": float(lats[i]), "longitude": float(lons[i])}
+        denm["situation"]["startTime"] = "2024-01-30T08:00:00.250000Z"
+        denm["management"].setdefault("eventType", {})["subCauseCode"] = i % 20 + 1
+        denms.append(denm)
+    return {"vanetza/in/cam": cams, "vanetza/in/denm": denms}
+
+
+def rate(fn, items, repeat=5):
+    """Meilleur débit sur `repeat` passes (la machine partagée est bruitée)."""
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = [fn(x) for x in items]
+        best = min(best, time.perf_counter() - t)
+    return len(items) / best, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20_000)
+    args = parser.parse_args()
+
+    t = time.perf_counter()
+    its_codec.spec.cache_clear()
+    its_codec.spec()
+    print(f"schéma compilé en {(time.perf_counter() - t) * 1000:.1f} ms")
+
+    report = {}
+    for topic, msgs in messages(args.messages, np.random.default_rng(0)).items():
+        kind = topic.rsplit("/", 1)[-1]
+        for encoding in its_codec.ENCODINGS:
+            enc_rate, payloads = rate(lambda m: its_codec.encode(topic, m, encoding), msgs)
+            dec_rate, _ = rate(lambda p: its_codec.decode(topic, p, encoding), payloads)
+            size = float(np.mean([len(p) for p in payloads]))
+            report[f"{kind}/{encoding}"] = {"bytes": size, "encode_per_s": enc_rate, "decode_per_s": dec_rate}
+            print(f"{kind:5s} {encoding:5s} {size:7.1f} o/msg  "
+                  f"encode {enc_rate:9.0f} msg/s  decode {dec_rate:9.0f} msg/s")
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+bench_route.py
+
+Géométrie des tournées (route_service.py) : taille de la réponse `/route/{id}`
+par zoom et encodage, avec et sans la partie déjà parcourue, et latence
+(première préparation, réponse en cache, nouvelle position du camion).
+
+La tournée est une polyline dense de type Mapbox : marche aléatoire sur des
+rues, un sommet tous les ~`--step` mètres.
+
+Usage :
+    python bench/bench_route.py --vertices 20000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import datagen
+import route_service
+
+
+def dense_route(n, step, rng):
+    # tronçons rectilignes de 20 à 200 sommets, virages à ±90°, léger bruit GPS
+    lat0, lon0 = np.mean(datagen.LAT_RANGE), np.mean(datagen.LON_RANGE)
+    headings = np.repeat(rng.choice([0, np.pi / 2, np.pi, -np.pi / 2], n // 20 + 1),
+                         rng.integers(20, 200, n // 20 + 1))[:n]
+    headings = np.resize(headings, n)
+    dy = step * np.cos(headings) + rng.normal(0, 0.5, n)
+    dx = step * np.sin(headings) + rng.normal(0, 0.5, n)
+    lat = lat0 + np.degrees(np.cumsum(dy) / route_service.EARTH_RADIUS_M)
+    lon = lon0 + np.degrees(np.cumsum(dx) / route_service.EARTH_RADIUS_M / np.cos(np.radians(lat0)))
+    return np.column_stack((lat, lon)).tolist()
+
+
+def timed(fn, repeat=1):
+    t = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - t) / repeat * 1000, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vertices", type=int, default=20_000)
+    parser.add_argument("--step", type=float, default=5.0)
+    parser.add_argument("--zooms", default="10,12,14,16,18")
+    args = parser.parse_args()
+
+    geometry = dense_route(args.vertices, args.step, np.random.default_rng(0))
+    tmp = tempfile.mkdtemp()
+    with open(os.path.join(tmp, "route_obu1.json"), "w") as f:
+        json.dump({"geometry": geometry, "distance": 12.3, "duration": "0:42"}, f)
+    routes = route_service.RouteService(os.path.join(tmp, "route_obu{}.json"))
+
+    size = lambda r: len(json.dumps(r).encode())
+    ms, full = timed(lambda: routes.get(1))
+    print(f"historique : {len(geometry)} sommets, {size(full) / 1024:.0f} Kio, "
+          f"{ms:.0f} ms (préparation incluse)")
+    report = {"vertices": len(geometry), "full_bytes": size(full), "prepare_ms": ms, "zooms": {}}
+
+    middle = geometry[len(geometry) // 2]
+    for zoom in (int(z) for z in args.zooms.split(",")):
+        row = {}
+        for encoding in route_service.ENCODINGS:
+            cold, r = timed(lambda: routes.get(1, zoom=zoom, encoding=encoding))
+            warm, _ = timed(lambda: routes.get(1, zoom=zoom, encoding=encoding), repeat=100)
+            moved, r_ahead = timed(lambda: routes.get(1, zoom=zoom, position=middle, encoding=encoding))
+            row[encoding] = {"points": r["points"], "bytes": size(r), "bytes_ahead": size(r_ahead),
+                             "cold_ms": cold, "cached_ms": warm, "ahead_ms": moved}
+            print(f"zoom {zoom:2d} {encoding:8s} {r['points']:6d} sommets {size(r):8d} o "
+                  f"(mi-parcours {size(r_ahead):8d} o)  calcul {cold:6.2f} ms  cache {warm:6.3f} ms  "
+                  f"position {moved:6.2f} ms")
+        report["zooms"][zoom] = row
+
+    # le décodage de la polyline redonne la géométrie arrondie
+    r = routes.get(1, zoom=18, encoding="polyline")
+    back = np.asarray(route_service.decode_polyline(r["polyline"]))
+    ref = np.asarray(routes.get(1, zoom=18)["geometry"])
+    report["polyline_max_error_deg"] = float(np.abs(back - ref).max())
+    print(f"polyline : écart max {report['polyline_max_error_deg']:.1e}°, "
+          f"cache {routes.hits} hits / {routes.misses} misses")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+bench_rsu_sharding.py
+
+Débit du dispatch RSU partitionné (script/rsu_shard.py) en fonction du
+nombre de shards : un process par shard, camions placés aléatoirement et
+visibles par les shards dont la bordure les contient.
+
+Les handoffs passent par un bus entre process (une file par shard, à la
+place de `rsu/handoff/<shard>`) : le shard du camion les traite vraiment
+(DENM ou refus renvoyé à l'origine). Seuls les DENM effectivement publiés
+(`vanetza/in/denm`) sont comptés, pas les handoffs.
+
+Chaque passe : « tous les capteurs pleins », traitement des handoffs, puis
+des refus, puis « tous vidés » (libération), `--rounds` fois.
+
+L'accélération n'est rapportée que sur une machine à plusieurs CPU : avec
+un seul, les process se partagent le même cœur.
+
+Usage :
+    python bench/bench_rsu_sharding.py --sensors 20000 --trucks 400 --shards 1,2,4,8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import io
+import multiprocessing as mp
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT, "script"))
+sys.path.insert(0, BENCH_DIR)
+
+import datagen
+import rsu
+import rsu_shard
+
+
+class BusClient:
+    """Client MQTT du bench : handoffs vers la file du shard destinataire, DENM comptés."""
+
+    def __init__(self, inboxes, posted):
+        self.inboxes = inboxes
+        self.posted = posted     # messages envoyés par shard destinataire
+        self.denm = 0
+
+    def publish(self, topic, payload):
+        if topic.startswith(rsu_shard.HANDOFF_TOPIC):
+            shard = int(topic[len(rsu_shard.HANDOFF_TOPIC):])
+            with self.posted.get_lock():
+                self.posted[shard] += 1
+            self.inboxes[shard].put(payload)
+        elif topic == "vanetza/in/denm":
+            self.denm += 1
+
+
+def drain(w, inbox, posted, done, client):
+    """Traite les messages du bus destinés à ce shard jusqu'au nombre envoyé."""
+    while done < posted[w.shard]:
+        w.on_handoff(json.loads(inbox.get()), client)
+        done += 1
+    return done
+
+
+def worker(plan, shard, positions, trucks, halo, rounds, barrier, inboxes, posted, results):
+    rsu.init_state(positions, truck_count=len(trucks))
+    rsu_shard.TRUCK_TTL = float("inf")   # pas de CAM pendant le bench
+    w = rsu_shard.ShardWorker(plan, shard)
+    visible = {rsu_shard.ShardPlan.cell_name(c) for c in plan.cells_of(shard, halo)}
+    now = time.time()
+    for t, (lat, lon) in enumerate(trucks):
+        if rsu_shard.ShardPlan.cell_name(plan.clamp(plan.cell(lat, lon))) in visible:
+            rsu.truck_positions[t] = [lat, lon]
+            rsu.truck_seen[t] = now
+    full, empty = ["80"] * len(positions), ["10"] * len(positions)
+    client = BusClient(inboxes, posted)
+    done = 0
+    barrier.wait()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(rounds):
+            w.cycle(full, client)
+            barrier.wait()
+            done = drain(w, inboxes[shard], posted, done, client)   # demandes des voisins
+            barrier.wait()
+            done = drain(w, inboxes[shard], posted, done, client)   # refus
+            barrier.wait()
+            w.cycle(empty, client)
+    results.put((shard, client.denm, w.handoffs, time.perf_counter() - t0))
+
+
+def run(positions, trucks, shards, halo, rounds, cell_size):
+    plan = rsu_shard.ShardPlan(positions, shards, cell_size)
+    barrier, results = mp.Barrier(shards), mp.Queue()
+    inboxes = [mp.Queue() for _ in range(shards)]
+    posted = mp.Array("i", shards)
+    procs = [mp.Process(target=worker, args=(plan, s, positions, trucks, halo, rounds, barrier,
+                                             inboxes, posted, results))
+             for s in range(shards)]
+    for p in procs:
+        p.start()
+    out = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    denm = sum(o[1] for o in out)
+    handoffs = sum(o[2] for o in out)
+    wall = max(o[3] for o in out)
+    return {"denm": denm, "handoffs": handoffs, "seconds": wall, "denm_per_s": denm / wall,
+            "sensors_per_shard": [len(s) for s in plan.sensors]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=20_000)
+    parser.add_argument("--trucks", type=int, default=400)
+    parser.add_argument("--shards", default=f"1,2,4,{os.cpu_count()}")
+    parser.add_argument("--halo", type=int, default=rsu_shard.DEFAULT_HALO)
+    parser.add_argument("--cell-size", type=float, default=rsu_shard.DEFAULT_CELL)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    if cpus < 2:
+        print("⚠️  1 seul CPU : accélération non rapportée, seuls les débits sont mesurés")
+    positions = datagen.sensor_positions(args.sensors, seed=1)
+    rng = np.random.default_rng(2)
+    trucks = list(zip(rng.uniform(*datagen.LAT_RANGE, args.trucks).tolist(),
+                      rng.uniform(*datagen.LON_RANGE, args.trucks).tolist()))
+
+    report = {}
+    for shards in sorted({int(s) for s in args.shards.split(",")}):
+        r = run(positions, trucks, shards, args.halo, args.rounds, args.cell_size)
+        r["speedup"] = r["denm_per_s"] / report.get(1, r)["denm_per_s"] if cpus > 1 else None
+        report[shards] = r
+        gain = f"x{r['speedup']:.2f}, " if r["speedup"] else ""
+        print(f"shards={shards}: {r['denm']} DENM, {r['denm_per_s']:.0f} DENM/s, {gain}"
+              f"handoffs={r['handoffs']}, capteurs/shard={min(r['sensors_per_shard'])}"
+              f"–{max(r['sensors_per_shard'])}")
+    print(f"{cpus} CPU")
+    print(json.dumps({k: {kk: vv for kk, vv in v.items() if kk != 'sensors_per_shard'}
+                      for k, v in report.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+bench_silver_scaling.py
+
+Accélération de la Silver en fonction du nombre de process de parsing
+(`--workers`), sur un jeu synthétique local (file://), et vérification que la
+table de features produite est identique au mode séquentiel.
+
+Seul le parsing est réparti sur les process, transformations et écritures
+restent séquentielles : la part du parsing dans le
+temps séquentiel (PARSE_SECONDS) est rapportée, c'est la borne de
+l'accélération possible. Sur une machine à un seul CPU, l'accélération
+mesurée n'a pas de sens et n'est pas rapportée.
+
+Usage :
+    python bench/bench_silver_scaling.py --sensors 500 --days 60 --workers 1,2,4,8
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import io
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+# le backend doit être choisi avant l'import des étapes
+TMP = tempfile.mkdtemp(prefix="bench_silver_")
+os.environ["STORAGE_URL"] = f"file://{os.path.join(TMP, 'lake')}"
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+import datagen
+import pyspark_clean_silver
+from storage import get_storage
+from metrics import PARSE_SECONDS
+
+
+def parse_seconds():
+    return sum(child.sum for _, child in PARSE_SECONDS._samples())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=200)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--samples-per-hour", type=int, default=1)
+    parser.add_argument("--workers", default=f"1,2,4,{os.cpu_count()}")
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    store = get_storage()
+    scale = datagen.generate(store, sensors=args.sensors, days=args.days,
+                             samples_per_hour=args.samples_per_hour)
+    cpus = os.cpu_count() or 1
+    print(f"{scale['historic_rows']} lignes, {args.days} partitions date=, {cpus} CPU")
+    if cpus < 2:
+        print("⚠️  1 seul CPU : accélération non mesurable, seule l'identité de la sortie est vérifiée")
+    silver_dir = os.path.join(TMP, "lake", "silver")
+    reference, report = None, {}
+    for workers in sorted({int(w) for w in args.workers.split(",")}):
+        samples, parsing = [], []
+        for _ in range(args.repeat):
+            # état Silver vidé : chaque passe refait le même travail
+            shutil.rmtree(silver_dir, ignore_errors=True)
+            t, p = time.perf_counter(), parse_seconds()
+            with contextlib.redirect_stdout(io.StringIO()):
+                pyspark_clean_silver.main(workers)
+            samples.append(time.perf_counter() - t)
+            parsing.append(parse_seconds() - p)
+        features = store.read_parquet("silver", "features/features.parquet")
+        if reference is None:
+            reference = features
+        identical = features.equals(reference)
+        best = samples.index(min(samples))
+        speedup = report.get(1, {"seconds": min(samples)})["seconds"] / min(samples) if cpus > 1 else None
+        report[workers] = {"seconds": min(samples),
+                           "parse_seconds": parsing[best],   # CPU cumulé des process
+                           "parse_share": parsing[best] / min(samples),
+                           "speedup": speedup,
+                           "identical_output": identical}
+        gain = f"x{speedup:.2f}, " if speedup else ""
+        print(f"workers={workers}: {min(samples):.2f} s, parsing {parsing[best]:.2f} s "
+              f"({report[workers]['parse_share']:.0%}), {gain}identique={identical}")
+    print(json.dumps({"cpus": cpus, "workers": report}, indent=2))
+    shutil.rmtree(TMP, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+bench_spatial.py
+
+Temps de calcul du voisinage PAV (spatial_features.compute) sur des
+capteurs et PAV synthétiques, et contrôle par force brute (haversine)
+sur un échantillon de capteurs.
+
+Usage :
+    python bench/bench_spatial.py --sensors 100000 --pav 50000
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import datagen
+import spatial_features
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * spatial_features.EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=100_000)
+    parser.add_argument("--pav", type=int, default=50_000)
+    parser.add_argument("--check", type=int, default=500, help="capteurs vérifiés en force brute")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pos = datagen.sensor_positions(args.sensors)
+    df_pos = pd.DataFrame(pos, columns=["lat", "lon"])
+    df_pos.insert(0, "sensor_id", [f"S{i+1}" for i in range(len(df_pos))])
+    df_pav = pd.DataFrame({
+        "pav_type": rng.choice(datagen.PAV_TYPES, args.pav),
+        "lat": rng.uniform(*datagen.LAT_RANGE, args.pav),
+        "lon": rng.uniform(*datagen.LON_RANGE, args.pav),
+    })
+
+    t = time.perf_counter()
+    res = spatial_features.compute(df_pos, df_pav)
+    elapsed = time.perf_counter() - t
+    print(f"{args.sensors} capteurs × {args.pav} PAV : {elapsed:.2f} s "
+          f"({len(spatial_features.spatial_columns(res.columns))} colonnes)")
+
+    sample = rng.choice(len(df_pos), min(args.check, len(df_pos)), replace=False)
+    mismatches, max_err = 0, 0.0
+    for pav_type, pts in df_pav.groupby("pav_type"):
+        d = haversine(df_pos["lat"].to_numpy()[sample, None], df_pos["lon"].to_numpy()[sample, None],
+                      pts["lat"].to_numpy()[None], pts["lon"].to_numpy()[None])
+        for r in spatial_features.DEFAULT_RADII:
+            col = f"pav_{pav_type}_n_{r}m"
+            # tolérance : points à moins de 1 m de la frontière du rayon
+            exact = (d < r).sum(axis=1)
+            near_edge = (np.abs(d - r) < 1.0).sum(axis=1)
+            mismatches += int((np.abs(res[col].to_numpy()[sample] - exact) > near_edge).sum())
+        max_err = max(max_err, float(np.abs(res[f"pav_{pav_type}_dist_m"].to_numpy()[sample] - d.min(axis=1)).max()))
+    print(f"contrôle force brute ({len(sample)} capteurs) : {mismatches} écarts de comptage, "
+          f"erreur max distance {max_err:.2f} m")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py
+
+Mesure le coût de démarrage lié au client S3 :
+ - before : ancien s3clinet.py tel quel, exécuté à chaque import :
+            import boto3 + boto3.client(...) + list_buckets + create_bucket
+ - after  : `import s3clinet` (client paresseux), puis premier `get_s3()`
+ - bootstrap complet, à comparer à before : `get_s3()` + `ensure_buckets()`,
+   fait une fois (ingest raw, `python s3clinet.py`) au lieu d'à chaque import
+ - appels suivants à `get_s3()` (client mis en cache)
+
+Chaque mesure tourne dans un interpréteur neuf (pas de cache d'import).
+Les deux bootstraps font les allers-retours réseau vers S3_ENDPOINT (MinIO
+du docker-compose) : sans endpoint joignable, ils ne sont pas mesurés. Les
+buckets existent après la première passe, les passes suivantes ne font que
+`list_buckets`, dans les deux cas.
+
+Usage :
+    S3_ENDPOINT=http://localhost:9000 python bench/bench_startup.py --repeat 5
+"""
+import os
+import sys
+import json
+import socket
+import argparse
+import subprocess
+import statistics
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from s3clinet import S3_ENDPOINT, S3_KEY, S3_SECRET
+
+# ancien s3clinet.py (avant le client paresseux), corps exécuté à l'import
+BEFORE = """
+import time; t = time.perf_counter()
+import os
+from botocore.client import Config
+import boto3
+
+S3_ENDPOINT   = os.getenv("S3_ENDPOINT", "http://localhost:9000")
+S3_KEY        = os.getenv("S3_KEY", "minioadmin")
+S3_SECRET     = os.getenv("S3_SECRET", "minioadmin123")
+
+RAW_BUCKET    = os.getenv("RAW_BUCKET", "raw")
+SILVER_BUCKET = os.getenv("SILVER_BUCKET", "silver")
+GOLD_BUCKET   = os.getenv("GOLD_BUCKET", "gold")
+
+s3 = boto3.client(
+    's3',
+    endpoint_url=S3_ENDPOINT,
+    aws_access_key_id=S3_KEY,
+    aws_secret_access_key=S3_SECRET,
+    config=Config(signature_version='s3v4'),
+    region_name='us-east-1'
+)
+
+existing = {b['Name'] for b in s3.list_buckets().get('Buckets', [])}
+
+for bucket in (RAW_BUCKET, SILVER_BUCKET, GOLD_BUCKET):
+    if bucket not in existing:
+        s3.create_bucket(Bucket=bucket)
+        print(f"Bucket créé : {bucket}")
+    else:
+        print(f"Bucket déjà existant : {bucket}")
+print(time.perf_counter() - t)
+"""
+
+AFTER_BOOTSTRAP = """
+import time; t = time.perf_counter()
+import s3clinet
+s3clinet.get_s3()
+s3clinet.ensure_buckets()
+print(time.perf_counter() - t)
+"""
+
+AFTER_IMPORT = """
+import time; t = time.perf_counter()
+import s3clinet
+print(time.perf_counter() - t)
+"""
+
+AFTER_FIRST_CLIENT = """
+import time
+import s3clinet
+t = time.perf_counter()
+s3clinet.get_s3()
+print(time.perf_counter() - t)
+"""
+
+AFTER_CACHED_CLIENT = """
+import time
+import s3clinet
+s3clinet.get_s3()
+t = time.perf_counter()
+for _ in range(10000):
+    s3clinet.get_s3()
+print((time.perf_counter() - t) / 10000)
+"""
+
+
+def run(snippet, repeat):
+    samples = []
+    for _ in range(repeat):
+        # même endpoint pour l'ancien module, qui ne lit pas MINIO_*
+        env = dict(os.environ, S3_ENDPOINT=S3_ENDPOINT, S3_KEY=S3_KEY, S3_SECRET=S3_SECRET)
+        out = subprocess.run([sys.executable, "-c", snippet], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return {"median_ms": statistics.median(samples) * 1000,
+            "min_ms": min(samples) * 1000}
+
+
+def reachable(endpoint, timeout=1.0):
+    url = urlparse(endpoint)
+    try:
+        socket.create_connection((url.hostname, url.port or (443 if url.scheme == "https" else 80)),
+                                 timeout).close()
+        return True
+    except OSError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    report = {
+        "after_import": run(AFTER_IMPORT, args.repeat),
+        "after_first_get_s3": run(AFTER_FIRST_CLIENT, args.repeat),
+        "after_cached_get_s3": run(AFTER_CACHED_CLIENT, args.repeat),
+    }
+    if reachable(S3_ENDPOINT):
+        report["before_import_with_bootstrap"] = run(BEFORE, args.repeat)
+        report["after_get_s3_ensure_buckets"] = run(AFTER_BOOTSTRAP, args.repeat)
+    else:
+        print(f"⚠️  {S3_ENDPOINT} injoignable : bootstraps (list_buckets / create_bucket) non mesurés",
+              file=sys.stderr)
+        report["before_import_with_bootstrap"] = report["after_get_s3_ensure_buckets"] = None
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+bench_storage.py
+
+Coût du saut objet-store : mêmes opérations (put/get d'objets, lecture
+Parquet) contre chaque backend de storage.py.
+
+Usage :
+    python bench/bench_storage.py                                   # mem:// + file://
+    python bench/bench_storage.py --url s3:// --url file:///tmp/lake
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from storage import open_storage
+
+BUCKET = "bench"
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return statistics.median(samples) * 1000
+
+
+def bench_backend(url, rows, objects, repeat):
+    store = open_storage(url)
+    store.ensure_buckets([BUCKET])
+    payload = os.urandom(4096)
+    df = pd.DataFrame({
+        "sensor_id": np.repeat([f"S{i+1}" for i in range(45)], rows // 45 + 1)[:rows],
+        "ts": pd.date_range("2024-01-01", periods=rows, freq="10s"),
+        "fill_level": np.random.default_rng(0).random(rows),
+    })
+    store.write_parquet(df, BUCKET, "features.parquet")
+
+    def put_small():
+        for i in range(objects):
+            store.put_bytes(BUCKET, f"small/{i}.bin", payload)
+
+    def get_small():
+        for i in range(objects):
+            store.get_bytes(BUCKET, f"small/{i}.bin")
+
+    result = {
+        "put_4k_ms_per_obj": timed(put_small, repeat) / objects,
+        "get_4k_ms_per_obj": timed(get_small, repeat) / objects,
+        "list_ms": timed(lambda: list(store.list_keys(BUCKET, "small/")), repeat),
+        "read_parquet_ms": timed(lambda: store.read_parquet(BUCKET, "features.parquet"), repeat),
+        "write_parquet_ms": timed(lambda: store.write_parquet(df, BUCKET, "features.parquet"), repeat),
+    }
+    for i in range(objects):
+        store.delete(BUCKET, f"small/{i}.bin")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", action="append", help="backend(s) à mesurer")
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--objects", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_storage_")
+    urls = args.url or ["mem://bench", f"file://{tmp}"]
+    report = {url: bench_backend(url, args.rows, args.objects, args.repeat) for url in urls}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
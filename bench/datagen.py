@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+datagen.py
+
+Jeux de données synthétiques pour les benchmarks, écrits dans le bucket raw
+d'un backend storage.py, avec le même partitionnement que raw_ingest_api.py :
+    sensor/sensor_position.json
+    sensor/historic_fill_levels/date=%Y/%m/%d/historic_%Y%m%dT%H%M%SZ.jsonl
+    demographics/populations_legales_2021.csv
+    api/<pav_type>/date=%Y/%m/%d/<pav_type>_<ts>.geojson
+    api/tonnage_par_habitant/date=%Y/%m/%d/tonnage_par_habitant_<ts>.geojson
+
+Échelle : sensors × days (× samples_per_hour) × pav_points.
+"""
+import os
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAV_TYPES = ["colonnes_verre", "composteurs", "conteneur_textile", "stations_trilib", "recycleries"]
+
+# Emprise approximative de Paris intra-muros
+LAT_RANGE = (48.815, 48.902)
+LON_RANGE = (2.255, 2.415)
+
+
+def sensor_positions(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(*LAT_RANGE, n).round(6)
+    lon = rng.uniform(*LON_RANGE, n).round(6)
+    return np.column_stack([lat, lon]).tolist()
+
+
+def generate(store, bucket="raw", sensors=45, days=30, samples_per_hour=1, pav_points=1000,
+             end=None, seed=0):
+    """Écrit un jeu complet ; retourne le nombre d'enregistrements par source."""
+    rng = np.random.default_rng(seed)
+    end = end or datetime(2024, 1, 31)
+    ts_tag = end.strftime("%Y%m%dT%H%M%SZ")
+    store.ensure_buckets([bucket])
+
+    # 1) positions
+    positions = sensor_positions(sensors, seed)
+    store.put_bytes(bucket, "sensor/sensor_position.json",
+                    json.dumps({"positions": positions}).encode("utf-8"), "application/json")
+
+    # 2) historique : un objet JSONL par jour (partition date=)
+    step = 3600 // samples_per_hour
+    ids = np.array([f"S{i+1}" for i in range(sensors)])
+    hist_rows = 0
+    for d in range(days):
+        day = end - timedelta(days=days - d)
+        t0 = int(day.timestamp())
+        ticks = np.arange(t0, t0 + 86400, step)
+        hours = (ticks % 86400) / 3600.0
+        base = 0.5 + 0.3 * np.maximum(0, np.sin(2 * np.pi * hours / 24))
+        levels = np.clip(base[:, None] + rng.normal(0, 0.05, (len(ticks), sensors)), 0, 1)
+        lines = [
+            f'{{"sensor_id":"{sid}","timestamp":{t * 1000},"fill_level":{lvl:.6f}}}'
+            for t, row in zip(ticks, levels) for sid, lvl in zip(ids, row)
+        ]
+        key = day.strftime("sensor/historic_fill_levels/date=%Y/%m/%d/historic_") + f"{ts_tag}.jsonl"
+        store.put_bytes(bucket, key, "\n".join(lines).encode("utf-8"), "application/json")
+        hist_rows += len(lines)
+
+    # 3) population (CSV réel du dépôt)
+    with open(os.path.join(ROOT, "raw", "demographics", "populations_legales_2021.csv"), "rb") as f:
+        store.put_bytes(bucket, "demographics/populations_legales_2021.csv", f.read(), "text/csv")
+
+    # 4) points d'apport volontaire, répartis entre les types
+    date_part = end.strftime("%Y/%m/%d")
+    for i, pav_type in enumerate(PAV_TYPES):
+        n = pav_points // len(PAV_TYPES) + (1 if i < pav_points % len(PAV_TYPES) else 0)
+        lat = rng.uniform(*LAT_RANGE, n)
+        lon = rng.uniform(*LON_RANGE, n)
+        features = [{"type": "Feature", "properties": {},
+                     "geometry": {"type": "Point", "coordinates": [float(x), float(y)]}}
+                    for x, y in zip(lon, lat)]
+        store.put_bytes(bucket, f"api/{pav_type}/date={date_part}/{pav_type}_{ts_tag}.geojson",
+                        json.dumps({"type": "FeatureCollection", "features": features}).encode("utf-8"),
+                        "application/geo+json")
+
+    # 5) tonnage par habitant
+    features = [{"type": "Feature", "properties": {"quantite": q}, "geometry": None}
+                for q in (250.0, 45.0, 30.0, 12.0)]
+    store.put_bytes(bucket, f"api/tonnage_par_habitant/date={date_part}/tonnage_par_habitant_{ts_tag}.geojson",
+                    json.dumps({"type": "FeatureCollection", "features": features}).encode("utf-8"),
+                    "application/geo+json")
+
+    return {"sensors": sensors, "historic_rows": hist_rows, "pav_points": pav_points}
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+run_pipeline.py
+
+Benchmark de bout en bout raw → silver → gold → RSU / dashboard.
+
+ - Génère un jeu synthétique (bench/datagen.py) à l'échelle demandée
+ - Exécute chaque étape contre un stockage local (file:// par défaut, voir
+   storage.py) et, pour le RSU, un broker MQTT local (repli sur un client
+   nul si le broker est injoignable — signalé dans le rapport)
+ - Mesure par étape : débit, latences p50/p95/p99, pic mémoire (tracemalloc,
+   sur une passe dédiée pour ne pas fausser les temps)
+ - Écrit un rapport JSON et le compare à une baseline sauvegardée
+
+Usage :
+    python bench/run_pipeline.py --sensors 200 --days 7 --pav-points 5000
+    python bench/run_pipeline.py --save-baseline bench/baseline.json
+    python bench/run_pipeline.py --baseline bench/baseline.json --tolerance 0.15
+"""
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import warnings
+import contextlib
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+import storage
+import datagen
+
+STAGES = ["ingest", "silver", "gold", "rsu", "dashboard"]
+
+
+# ----------------------------------------------------------------------
+# Mesures
+# ----------------------------------------------------------------------
+def percentiles(samples):
+    arr = np.asarray(samples, dtype=np.float64) * 1000
+    return {"p50_ms": float(np.percentile(arr, 50)),
+            "p95_ms": float(np.percentile(arr, 95)),
+            "p99_ms": float(np.percentile(arr, 99))}
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def quiet():
+    # les étapes impriment leurs propres traces (✔️ Uploaded, DENM généré, ...)
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        yield
+
+
+def measure(run, records, repeat, op_latencies=None):
+    """
+    `run()` exécute une passe de l'étape. Si `op_latencies` est fourni, il
+    renvoie la liste des latences unitaires (requêtes, DENM) de la dernière passe.
+    """
+    durations = []
+    with quiet():
+        for _ in range(repeat):
+            t = time.perf_counter()
+            run()
+            durations.append(time.perf_counter() - t)
+        peak = peak_memory(run)
+    result = {"records": records, "runs": repeat,
+              "throughput_per_s": records / float(np.median(durations)),
+              "peak_mem_mb": peak}
+    result.update(percentiles(op_latencies() if op_latencies else durations))
+    return result
+
+
+# ----------------------------------------------------------------------
+# Étapes
+# ----------------------------------------------------------------------
+def stage_ingest(args, tmp):
+    import raw_ingest_api
+    ingest_url = f"file://{os.path.join(tmp, 'ingest')}"
+
+    def run():
+        storage.STORAGE_URL = ingest_url
+        store = storage.get_storage()
+        for key in list(store.list_keys("raw")):
+            store.delete("raw", key)
+        ts = datetime.utcnow()
+        raw_ingest_api.ingest_sensor_positions(ts)
+        raw_ingest_api.ingest_historic_fill(ts, args.sensors, args.days, args.samples_per_hour)
+        raw_ingest_api.ingest_population(ts)   # CSV résolu depuis raw_ingest_api.__file__
+
+    try:
+        # même échelle que le jeu datagen des autres étapes
+        return measure(run, args.sensors * args.days * 24 * args.samples_per_hour, args.repeat)
+    finally:
+        storage.STORAGE_URL = args.storage
+
+
+def stage_silver(args, tmp, scale):
+    import pyspark_clean_silver
+    return measure(pyspark_clean_silver.main, scale["historic_rows"], args.repeat)
+
+
+def stage_gold(args, tmp, scale):
+    import gold
+    return measure(gold.main, scale["historic_rows"], args.repeat)
+
+
+class NullClient:
+    def publish(self, topic, payload):
+        pass
+
+
+def mqtt_client(host, port):
+    import paho.mqtt.client as mqtt
+    client = mqtt.Client()
+    try:
+        client.connect(host, port, 60)
+    except OSError:
+        return NullClient(), False
+    client.loop_start()
+    return client, True
+
+
+def stage_rsu(args, tmp, scale):
+    sys.path.insert(0, os.path.join(ROOT, "script"))
+    import rsu
+    positions = datagen.sensor_positions(scale["sensors"], seed=1)
+    client, connected = mqtt_client(args.mqtt_host, args.mqtt_port)
+    rng = np.random.default_rng(2)
+    latencies = []
+    generate = rsu.generate_denm
+
+    def timed_generate(*a, **kw):
+        t = time.perf_counter()
+        ok = generate(*a, **kw)
+        latencies.append(time.perf_counter() - t)
+        return ok
+
+    def run():
+        latencies.clear()
+        rsu.init_state(positions, truck_count=min(20, len(positions)))
+        for i in range(rsu.TRUCK_COUNT):
+            rsu.truck_positions[i] = [float(rng.uniform(*datagen.LAT_RANGE)),
+                                      float(rng.uniform(*datagen.LON_RANGE))]
+        lines = ["80"] * len(positions)
+        rsu.dispatch_cycle(lines, client)
+
+    rsu.generate_denm = timed_generate
+    try:
+        result = measure(run, len(positions), args.repeat, op_latencies=lambda: latencies)
+    finally:
+        rsu.generate_denm = generate
+        if connected:
+            client.loop_stop()
+            client.disconnect()
+    result["mqtt"] = f"{args.mqtt_host}:{args.mqtt_port}" if connected else "unavailable (null client)"
+    return result
+
+
+def stage_dashboard(args, tmp, scale):
+    from timeseries_store import TimeSeriesStore
+    history_dir = os.path.join(tmp, "history")
+    with open(os.path.join(ROOT, "sensor", "sensor_position.json")) as f:
+        n_sensors = len(json.load(f)["positions"])
+    hist = TimeSeriesStore(history_dir)
+    now = int(time.time())
+    rng = np.random.default_rng(3)
+    for t in range(now - 86400, now, 10):
+        hist.append(t, rng.random(n_sensors, dtype=np.float32))
+
+    os.environ["HISTORY_DIR"] = history_dir
+    cwd = os.getcwd()
+    os.chdir(os.path.join(ROOT, "dashboard"))
+    sys.path.insert(0, os.path.join(ROOT, "dashboard"))
+    try:
+        import main as dashboard
+        loop = asyncio.new_event_loop()
+        calls = [
+            lambda: dashboard.garbage(),
+            lambda: dashboard.garbage_history(1 + int(rng.integers(n_sensors)), resolution="1m"),
+            lambda: dashboard.garbage_sparkline(1 + int(rng.integers(n_sensors))),
+        ]
+        latencies = []
+
+        def run():
+            latencies.clear()
+            for _ in range(args.requests):
+                for call in calls:
+                    t = time.perf_counter()
+                    loop.run_until_complete(call())
+                    latencies.append(time.perf_counter() - t)
+
+        result = measure(run, args.requests * len(calls), args.repeat, op_latencies=lambda: latencies)
+        loop.close()
+        return result
+    finally:
+        os.chdir(cwd)
+
+
+# ----------------------------------------------------------------------
+# Rapport & baseline
+# ----------------------------------------------------------------------
+def compare(report, baseline, tolerance):
+    """Régressions : p50 plus lent ou débit plus faible au-delà de `tolerance`."""
+    regressions = []
+    for stage, cur in report["stages"].items():
+        ref = baseline.get("stages", {}).get(stage)
+        if not ref:
+            continue
+        if cur["p50_ms"] > ref["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{stage}: p50 {ref['p50_ms']:.2f} → {cur['p50_ms']:.2f} ms")
+        if cur["throughput_per_s"] < ref["throughput_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{stage}: débit {ref['throughput_per_s']:.0f} → {cur['throughput_per_s']:.0f} /s"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=45)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--samples-per-hour", type=int, default=1)
+    parser.add_argument("--pav-points", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=50, help="requêtes dashboard par passe")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--storage", help="backend (défaut : file:// dans un répertoire temporaire)")
+    parser.add_argument("--mqtt-host", default=os.getenv("MQTT_HOST", "127.0.0.1"))
+    parser.add_argument("--mqtt-port", type=int, default=int(os.getenv("MQTT_PORT", "1883")))
+    parser.add_argument("--output", default=os.path.join(BENCH_DIR, "report.json"))
+    parser.add_argument("--baseline")
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_pipeline_")
+    args.storage = args.storage or f"file://{os.path.join(tmp, 'lake')}"
+    os.environ["STORAGE_URL"] = args.storage
+    storage.STORAGE_URL = args.storage
+
+    scale = datagen.generate(storage.get_storage(), sensors=args.sensors, days=args.days,
+                             samples_per_hour=args.samples_per_hour, pav_points=args.pav_points)
+    print(f"Jeu synthétique : {scale} → {args.storage}")
+
+    runners = {
+        "ingest": lambda: stage_ingest(args, tmp),
+        "silver": lambda: stage_silver(args, tmp, scale),
+        "gold": lambda: stage_gold(args, tmp, scale),
+        "rsu": lambda: stage_rsu(args, tmp, scale),
+        "dashboard": lambda: stage_dashboard(args, tmp, scale),
+    }
+    report = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "storage": args.storage,
+        "scale": dict(scale, days=args.days, samples_per_hour=args.samples_per_hour),
+        "stages": {},
+    }
+    for stage in args.stages.split(","):
+        print(f"⏱️  {stage} ...")
+        report["stages"][stage] = runners[stage]()
+        r = report["stages"][stage]
+        print(f"   {r['throughput_per_s']:.0f} rec/s, p50={r['p50_ms']:.2f} ms, "
+              f"p95={r['p95_ms']:.2f} ms, peak={r['peak_mem_mb']:.1f} MiB")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Rapport : {args.output}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline sauvegardée : {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"❌ {line}")
+        if regressions:
+            sys.exit(1)
+        print("✅ Pas de régression par rapport à la baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import uvicorn
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.exceptions import HTTPException
@@ -9,12 +9,20 @@ import json
 import requests
 import datetime
 import os
+import sys
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from timeseries_store import TimeSeriesStore, RESOLUTIONS
+from route_service import RouteService, ENCODINGS
+import metrics
+
 app = FastAPI(title="Smart City Waste Management", version="1.0")
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+HTTP_SECONDS = metrics.histogram("http_request_seconds", "Dashboard request latency", ["path", "status"])
+
 templates = Jinja2Templates(directory="templates")
 
 # Get coordinates of all garbage containers
@@ -27,6 +35,12 @@ with open(path, "r") as file:
 
 GARBAGE_COORDINATES = sensor_positions['positions']
 
+# Fill level history written by the sensor simulator
+history = TimeSeriesStore(os.getenv("HISTORY_DIR", "../sensor/history"))
+
+# Route geometry, simplified per zoom level and cached per route file version
+routes = RouteService("static/route_obu{}.json")
+
 # Delete previous OBU positions, if any
 if os.path.exists("static/out_cam_obu1.json"):
     os.remove("static/out_cam_obu1.json")
@@ -44,6 +58,22 @@ if os.path.exists("static/route_obu3.json"):
     os.remove("static/route_obu3.json")
 
 
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # route template (/truck/{truck_id}) rather than raw path, to bound label cardinality
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    HTTP_SECONDS.labels(path=path, status=response.status_code).observe(time.perf_counter() - start)
+    return response
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/", response_class=HTMLResponse)
 async def dashboard(request: Request):
     return templates.TemplateResponse("index.html", {"request": request, "garbage_coordinates": GARBAGE_COORDINATES})
@@ -82,17 +112,63 @@ async def garbage():
     return data
 
 
-@app.get("/route/{route_id}")
-async def route(route_id: int):
+@app.get("/history/{garbage_id}")
+async def garbage_history(garbage_id: int, start: int = None, end: int = None, resolution: str = "1m"):
 
-    path = f'static/route_obu{route_id}.json'
-    if not os.path.isfile(path):
-        raise HTTPException(status_code=404, detail="File not found")
+    if not 1 <= garbage_id <= len(GARBAGE_COORDINATES):
+        raise HTTPException(status_code=404, detail="Garbage container not found")
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown resolution, expected one of {list(RESOLUTIONS)}")
 
-    with open(path) as route:
-        data = json.load(route)
+    end = end if end is not None else int(time.time()) + 1
+    start = start if start is not None else end - 24 * 3600
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    # Long ranges are served from the rollups: the raw matrix is tick-major,
+    # reading one container over a week would scan the whole week of ticks
+    resolution = history.resolution_for(start, end, resolution)
+    timestamps, values = history.query(garbage_id - 1, start, end, resolution)
 
-    return {"geometry": data['geometry'], "distance": data['distance'], "duration": data['duration']}
+    return {"garbage_id": garbage_id, "resolution": resolution,
+            "timestamps": timestamps.tolist(),
+            "fill_percentage": [round(float(v) * 100, 1) for v in values]}
+
+
+@app.get("/sparkline/{garbage_id}")
+async def garbage_sparkline(garbage_id: int, hours: int = Query(24, gt=0, le=24 * 31),
+                            points: int = Query(48, gt=0, le=1000)):
+
+    if not 1 <= garbage_id <= len(GARBAGE_COORDINATES):
+        raise HTTPException(status_code=404, detail="Garbage container not found")
+
+    timestamps, values = history.sparkline(garbage_id - 1, int(time.time()) + 1, hours, points)
+
+    return {"garbage_id": garbage_id,
+            "timestamps": timestamps.tolist(),
+            "fill_percentage": [round(float(v) * 100, 1) for v in values]}
+
+
+@app.get("/route/{route_id}")
+async def route(route_id: int, zoom: int = None, ahead: bool = False, encoding: str = "geojson", precision: int = 5):
+
+    if encoding not in ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"Unknown encoding, expected one of {list(ENCODINGS)}")
+    if not 1 <= precision <= 7:
+        raise HTTPException(status_code=400, detail="Precision must be between 1 and 7")
+
+    # Only the part of the route still ahead of the truck, if its position is known
+    position = None
+    cam_path = f'static/out_cam_obu{route_id}.json'
+    if ahead and os.path.isfile(cam_path):
+        with open(cam_path) as out_cam:
+            data = json.load(out_cam)
+        position = (data['latitude'], data['longitude'])
+
+    data = routes.get(route_id, zoom=zoom, position=position, encoding=encoding, precision=precision)
+    if data is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    return data
 
 
 if __name__ == "__main__":
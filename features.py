@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+features.py
+
+Assemblage du jeu de features Silver (étape 7 de pyspark_clean_silver.py),
+sans merge pandas :
+
+– `sensor_id` encodé en catégoriel (catégories = ordre de positions.parquet,
+  puis capteurs inconnus), ses codes entiers servent d'index pour aller
+  chercher les attributs par capteur (`np.take`) au lieu de deux hash-merges
+  qui recopient l'historique ; un capteur inconnu garde son identifiant et
+  des attributs NaN, comme avec un left join ;
+– colonnes réduites : float32 pour positions / tonnages / fill_level,
+  int8 pour les features calendaires ;
+– heure et jour de semaine calculés une fois par timestamp distinct puis
+  diffusés, au lieu d'une fois par ligne.
+
+Le schéma de sortie (noms, ordre des colonnes) est celui attendu par gold.py.
+"""
+import numpy as np
+import pandas as pd
+
+FEATURE_COLUMNS = [
+    "sensor_id", "ts", "lat", "lon", "capacity_tons",
+    "annual_tons", "daily_tons", "hour_of_day", "day_of_week", "fill_level"
+]
+
+
+def encode_sensors(sensor_ids, categories):
+    """
+    Catégoriel sur `categories`, complétées par les capteurs inconnus (absents
+    de positions.parquet) dans leur ordre d'apparition : l'identifiant
+    d'origine est conservé, leurs codes sont ≥ len(categories).
+    Les chaînes ne sont hachées qu'une fois (factorize), puis seuls les
+    identifiants distincts sont résolus dans `categories`.
+    """
+    inverse, uniques = pd.factorize(sensor_ids)
+    uniques = pd.Index(uniques).astype(str)
+    mapping = categories.get_indexer(uniques)
+    unknown = mapping == -1
+    if unknown.any():
+        mapping[unknown] = len(categories) + np.arange(unknown.sum())
+        categories = categories.append(uniques[unknown])
+    mapping = np.append(mapping, -1)  # NaN (-1) → -1
+    codes = np.take(mapping, inverse).astype(np.int32)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def lookup(values, codes, dtype=np.float32):
+    """`values[codes]` avec NaN pour les codes -1 (équivalent d'un left join)."""
+    table = np.append(np.asarray(values, dtype=dtype), np.array(np.nan, dtype=dtype))
+    return np.take(table, codes)  # -1 → dernier élément : le NaN sentinelle
+
+
+def calendar_features(ts):
+    """(hour_of_day, day_of_week) en int8, calculés par timestamp distinct."""
+    inverse, uniques = pd.factorize(ts)
+    uniques = pd.DatetimeIndex(uniques)
+    hours = uniques.hour.to_numpy(dtype=np.int8)
+    days = uniques.dayofweek.to_numpy(dtype=np.int8)
+    return np.take(hours, inverse), np.take(days, inverse)
+
+
+def build_features(df_hist, df_pos, df_proxy):
+    """
+    df_hist  : sensor_id, ts, fill_level
+    df_pos   : sensor_id, lat, lon, capacity_tons
+    df_proxy : sensor_id, annual_tons, daily_tons
+    """
+    categories = pd.Index(df_pos["sensor_id"].astype(str))
+    sensor = encode_sensors(df_hist["sensor_id"], categories)
+    # capteurs inconnus : pas d'attributs, même lookup que les NaN (-1)
+    codes = np.where(sensor.codes < len(categories), sensor.codes, -1)
+
+    # Attributs par capteur alignés sur les catégories
+    proxy = df_proxy.set_index(df_proxy["sensor_id"].astype(str)).reindex(categories)
+    hour_of_day, day_of_week = calendar_features(df_hist["ts"])
+
+    return pd.DataFrame({
+        "sensor_id":     sensor,
+        "ts":            df_hist["ts"].to_numpy(),
+        "lat":           lookup(df_pos["lat"], codes),
+        "lon":           lookup(df_pos["lon"], codes),
+        "capacity_tons": lookup(df_pos["capacity_tons"], codes),
+        "annual_tons":   lookup(proxy["annual_tons"], codes),
+        "daily_tons":    lookup(proxy["daily_tons"], codes),
+        "hour_of_day":   hour_of_day,
+        "day_of_week":   day_of_week,
+        "fill_level":    df_hist["fill_level"].to_numpy(dtype=np.float32),
+    }, columns=FEATURE_COLUMNS, copy=False)
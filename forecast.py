@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+forecast.py
+
+Prévision multi-horizon du remplissage (étape 8b de gold.py) et délai avant
+seuil, pour que le dispatch puisse planifier les tournées à l'avance.
+
+– Prévision récursive, heure par heure : la prévision à h devient la mesure
+  précédente de l'horizon h + 1. Entre deux horizons, `advance` met à jour la
+  matrice capteurs × features en place :
+    • hour_of_day / day_of_week : instant visé
+    • hours_since_empty         : + 1 h
+    • fill_lag_k                : décalés, le dernier niveau devient fill_lag_1
+    • fill_mean_w / fill_slope_w : fenêtre glissante approchée au pas horaire,
+      le dernier niveau (resp. la dernière variation horaire) remplace 1/w de
+      la fenêtre (w en heures ; la fenêtre 1 h ne garde que le dernier niveau)
+  Les features absentes (MISSING) le restent.
+– Un `predict` par horizon, sur tous les capteurs à la fois (arbres
+  parallélisés : n_jobs=-1 le temps de la prévision seulement, voir
+  `all_cores`, le modèle n'est pas modifié).
+– Délai avant seuil : premier horizon où la prévision atteint le seuil,
+  interpolé linéairement depuis l'horizon précédent (0 = niveau actuel).
+
+Coût (bench/bench_forecast.py, 10k capteurs × 48 h, forêt de gold.py) : le
+predict domine, 2.4 s mesurées sur 1 CPU (50 ms par horizon), au-dessus de
+l'objectif de 1 s ; il se répartit sur les cœurs disponibles.
+"""
+import contextlib
+
+import numpy as np
+import pandas as pd
+
+from rolling_features import WINDOWS
+
+FORECAST_HOURS = 48
+THRESHOLD      = 0.70   # même seuil que le DENM de script/rsu.py
+LAG_COLUMNS    = ["fill_lag_1", "fill_lag_2", "fill_lag_3"]
+MISSING        = -1.0   # sentinelle des features absentes (gold.py)
+
+
+def horizon_times(df_latest, hours=FORECAST_HOURS):
+    """Instants visés : dernière mesure + 1..hours heures."""
+    issued = pd.Timestamp(df_latest["ts"].max())
+    return pd.DatetimeIndex([issued + pd.Timedelta(hours=h) for h in range(1, hours + 1)])
+
+
+def advance(mat, col, target, level, previous=None):
+    """
+    Avance d'une heure la matrice `mat` [n_capteurs, n_features] (en place) :
+    features de l'instant `target`, sachant le niveau `level` [n] de l'heure
+    précédente (niveau actuel pour le premier horizon) et celui d'avant
+    (`previous`, None au premier horizon : pas de variation horaire connue).
+    """
+    if "hour_of_day" in col:
+        mat[:, col["hour_of_day"]] = target.hour
+    if "day_of_week" in col:
+        mat[:, col["day_of_week"]] = target.dayofweek
+    if "hours_since_empty" in col:
+        j = col["hours_since_empty"]
+        mat[mat[:, j] != MISSING, j] += 1.0
+
+    lags = [c for c in LAG_COLUMNS if c in col]
+    for k in range(len(lags) - 1, 0, -1):
+        mat[:, col[lags[k]]] = mat[:, col[lags[k - 1]]]
+    if lags:
+        mat[:, col[lags[0]]] = level
+
+    for name, width in WINDOWS.items():
+        weight = np.float32(3600 / width)
+        if f"fill_mean_{name}" in col:
+            j = col[f"fill_mean_{name}"]
+            known = mat[:, j] != MISSING
+            mat[known, j] += weight * (level[known] - mat[known, j])
+        if previous is not None and f"fill_slope_{name}" in col:
+            j = col[f"fill_slope_{name}"]
+            known = mat[:, j] != MISSING
+            mat[known, j] += weight * ((level - previous)[known] - mat[known, j])
+    return mat
+
+
+def time_to_threshold(current, preds, threshold=THRESHOLD):
+    """
+    `current` [n] niveau actuel, `preds` [n, H] prévisions aux horizons 1..H.
+    Heures avant d'atteindre `threshold` (0 si déjà atteint, NaN si pas dans l'horizon).
+    """
+    levels = np.column_stack((current, preds)).astype(np.float64)
+    reached = levels >= threshold
+    crossed = reached.any(axis=1)
+    k = reached.argmax(axis=1)                 # premier indice ≥ seuil (0 = maintenant)
+    prev = np.maximum(k - 1, 0)
+    rows = np.arange(len(levels))
+    v0, v1 = levels[rows, prev], levels[rows, k]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.where(v1 > v0, (threshold - v0) / (v1 - v0), 1.0)
+    hours = np.where(k == 0, 0.0, prev + np.clip(frac, 0.0, 1.0))
+    return np.where(crossed, hours, np.nan).astype(np.float32)
+
+
+@contextlib.contextmanager
+def all_cores(model):
+    """n_jobs=-1 sur les estimateurs du modèle le temps du bloc, puis restauré."""
+    saved = {k: v for k, v in model.get_params().items() if k == "n_jobs" or k.endswith("__n_jobs")}
+    model.set_params(**{k: -1 for k in saved})
+    try:
+        yield model
+    finally:
+        model.set_params(**saved)
+
+
+def forecast(model, df_latest, feature_cols, hours=FORECAST_HOURS, threshold=THRESHOLD):
+    """
+    Table compacte, une ligne par capteur :
+        sensor_id, issued_at, fill_now, fill_max, hours_to_threshold, h01..hNN (float32)
+    """
+    mat = df_latest[feature_cols].to_numpy(dtype=np.float32, copy=True)
+    col = {c: i for i, c in enumerate(feature_cols)}
+    current = df_latest["fill_level"].to_numpy(np.float32)
+    preds = np.empty((len(df_latest), hours), dtype=np.float32)
+
+    level, previous = current, None
+    with all_cores(model):
+        for h, target in enumerate(horizon_times(df_latest, hours)):
+            advance(mat, col, target, level, previous)
+            X = pd.DataFrame(mat, columns=feature_cols, copy=False)
+            preds[:, h] = model.predict(X)
+            level, previous = preds[:, h], level
+
+    out = pd.DataFrame({
+        "sensor_id":          df_latest["sensor_id"].astype(str).to_numpy(),
+        "issued_at":          pd.Timestamp(df_latest["ts"].max()),
+        "fill_now":           current,
+        "fill_max":           preds.max(axis=1),
+        "hours_to_threshold": time_to_threshold(current, preds, threshold),
+    })
+    horizons = pd.DataFrame(preds, columns=[f"h{h:02d}" for h in range(1, hours + 1)])
+    return pd.concat([out, horizons], axis=1)
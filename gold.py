@@ -8,53 +8,46 @@ Pipeline Gold en Python pour Smart City Waste Management :
  - Évalue le modèle (RMSE, R2)
  - Sauvegarde le modèle et les métriques dans le bucket `gold`
  - Génère `sensor_data.txt` et `sensor_position.json` à partir des données Silver
+ - Publie une prévision 1..48 h par capteur et le délai avant seuil (`forecast/`)
 
 Usage :
     pip install pandas scikit-learn joblib boto3 pyarrow
     python gold_train_model.py
 """
 import io
+import os
 import json
-import boto3
 import joblib
 import pandas as pd
-from botocore.client import Config
 from datetime import datetime
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import mean_squared_error, r2_score
+from s3clinet import SILVER_BUCKET, GOLD_BUCKET
+from storage import get_storage
+from metrics import MODEL_SECONDS, start_http_server
+from rolling_features import ROLLING_COLUMNS
+from spatial_features import spatial_columns
+from forecast import forecast, FORECAST_HOURS, THRESHOLD
 
 # ----------------------------------------------------------------------
 # CONFIGURATION MINIO
 # ----------------------------------------------------------------------
-SILVER_BUCKET = 'silver'
-GOLD_BUCKET   = 'gold'
-ENDPOINT_URL  = 'http://localhost:9000'
-ACCESS_KEY    = 'minioadmin'
-SECRET_KEY    = 'minioadmin123'
-
-# Init client
-s3 = boto3.client(
-    's3',
-    endpoint_url=ENDPOINT_URL,
-    aws_access_key_id=ACCESS_KEY,
-    aws_secret_access_key=SECRET_KEY,
-    config=Config(signature_version='s3v4')
-)
+# Buckets : voir s3clinet.py ; backend (MinIO, local, mémoire) : STORAGE_URL, voir storage.py
 
 # ----------------------------------------------------------------------
 # UTILS
 # ----------------------------------------------------------------------
 def read_parquet_from_s3(bucket: str, key: str) -> pd.DataFrame:
-    obj = s3.get_object(Bucket=bucket, Key=key)
-    return pd.read_parquet(io.BytesIO(obj['Body'].read()))
+    return get_storage().read_parquet(bucket, key)
 
 
 def upload_to_s3(body: bytes, bucket: str, key: str, content_type: str):
-    s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType=content_type)
-    print(f"✔️  Uploaded s3://{bucket}/{key}")
+    store = get_storage()
+    store.put_bytes(bucket, key, body, content_type)
+    print(f"✔️  Uploaded {store.url} {bucket}/{key}")
 
 # ----------------------------------------------------------------------
 # MAIN
@@ -68,6 +61,10 @@ def main():
 
     # 2) Préparation X, y
     feature_cols = ['lat','lon','capacity_tons','annual_tons','daily_tons','hour_of_day','day_of_week']
+    feature_cols += [c for c in ROLLING_COLUMNS if c in df.columns]
+    feature_cols += spatial_columns(df.columns)
+    # pas d'historique suffisant (début de série) → valeur sentinelle, séparée par les arbres
+    df[feature_cols] = df[feature_cols].fillna(-1.0)
     X = df[feature_cols]
     y = df['fill_level']
 
@@ -81,10 +78,12 @@ def main():
         ('scaler', StandardScaler()),
         ('rf', RandomForestRegressor(n_estimators=100, max_depth=10, random_state=42))
     ])
-    pipeline.fit(X_train, y_train)
+    with MODEL_SECONDS.labels(phase="fit").time():
+        pipeline.fit(X_train, y_train)
 
     # 5) Évaluation
-    y_pred = pipeline.predict(X_test)
+    with MODEL_SECONDS.labels(phase="predict").time():
+        y_pred = pipeline.predict(X_test)
     rmse = mean_squared_error(y_test, y_pred, squared=False)
     r2   = r2_score(y_test, y_pred)
     metrics = {'rmse': rmse, 'r2': r2, 'timestamp': ts}
@@ -103,12 +102,32 @@ def main():
 
     # 8) Génération de sensor_data.txt (prédictions pour la dernière date)
     df_latest = df[df['ts'] == df['ts'].max()].sort_values('sensor_id')
-    preds = pipeline.predict(df_latest[feature_cols])
+    with MODEL_SECONDS.labels(phase="predict").time():
+        preds = pipeline.predict(df_latest[feature_cols])
     # Formater en entiers 0-100 par ligne
     lines = [str(int(round(p * 100))) for p in preds]
     sensor_txt = '\n'.join(lines)
     upload_to_s3(sensor_txt.encode('utf-8'), GOLD_BUCKET, 'sensor/sensor_data.txt', 'text/plain')
 
+    # 8b) Prévision 1..FORECAST_HOURS h et délai avant seuil (voir forecast.py)
+    hours = int(os.getenv('FORECAST_HOURS', FORECAST_HOURS))
+    with MODEL_SECONDS.labels(phase="forecast").time():
+        df_fc = forecast(pipeline, df_latest, feature_cols, hours, THRESHOLD)
+    get_storage().write_parquet(df_fc, GOLD_BUCKET, 'forecast/forecast.parquet')
+    # version JSON réduite pour le dispatch : délai avant seuil, dans l'ordre des capteurs
+    fc_json = {
+        'issued_at': df_fc['issued_at'].iloc[0].isoformat() if len(df_fc) else None,
+        'threshold': THRESHOLD,
+        'horizon_hours': hours,
+        'sensors': [
+            {'sensor_id': sid, 'hours_to_threshold': None if pd.isna(h) else round(float(h), 2)}
+            for sid, h in zip(df_fc['sensor_id'], df_fc['hours_to_threshold'])
+        ],
+    }
+    upload_to_s3(json.dumps(fc_json).encode('utf-8'), GOLD_BUCKET, 'forecast/time_to_threshold.json', 'application/json')
+    print(f"✅ Forecast: {len(df_fc)} capteurs × {hours} h, "
+          f"{int((df_fc['hours_to_threshold'] <= 24).sum())} au-dessus de {THRESHOLD:.0%} sous 24 h")
+
     # 9) Génération de sensor_position.json à partir de Silver
     df_pos = read_parquet_from_s3(SILVER_BUCKET, 'sensors/positions.parquet')
     positions = df_pos[['lat','lon']].values.tolist()
@@ -120,6 +139,7 @@ def main():
 
 if __name__ == '__main__':
     import time
+    start_http_server(int(os.getenv('METRICS_PORT', '9101')))
     print("⏰ Scheduler démarré — génération de sensor_data.txt toutes les 10 secondes")
     while True:
         main()
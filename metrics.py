@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+metrics.py
+
+Instrumentation légère (compteurs, histogrammes) au format Prometheus,
+partagée par toutes les étapes du pipeline.
+
+– Pas de dépendance : un `observe()` = un verrou + une bissection, assez peu
+  coûteux pour rester actif en production.
+– Exposition texte Prometheus via `render()` : endpoint `/metrics` du
+  dashboard, ou `start_http_server(port)` (thread daemon) pour les boucles
+  longues (`gold.py`, `rsu.py`, `obu.py`).
+
+Usage :
+    from metrics import histogram, counter, start_http_server
+    S3_SECONDS = histogram("storage_op_seconds", "Durée des appels stockage", ["backend", "op"])
+    with S3_SECONDS.labels(backend="s3", op="get").time():
+        ...
+    start_http_server(9102)
+"""
+import os
+import abc
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Timer:
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _CounterChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("_lock", "_bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Metric(abc.ABC):
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Série (compteur / histogramme) pour un jeu de valeurs de labels."""
+
+    def labels(self, *values, **kwvalues):
+        if kwvalues:
+            values = tuple(kwvalues[n] for n in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def render(self):
+        lines = []
+        for key, child in self._samples():
+            lines.append(f"{self.name}{_label_str(self.labelnames, key)} {child.value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def render(self):
+        lines = []
+        for key, child in self._samples():
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _label_str(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _label_str(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Métrique {metric.name} déjà enregistrée avec un autre schéma")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render():
+    return REGISTRY.render()
+
+
+# ----------------------------------------------------------------------
+# Métriques communes au pipeline
+# ----------------------------------------------------------------------
+STORAGE_SECONDS = histogram("storage_op_seconds", "Durée des opérations de stockage objet",
+                            ["backend", "op"])
+STORAGE_BYTES   = counter("storage_bytes_total", "Octets lus/écrits sur le stockage objet",
+                          ["backend", "direction"])
+PARSE_SECONDS   = histogram("parse_seconds", "Durée de parsing des données brutes", ["format"])
+MODEL_SECONDS   = histogram("model_seconds", "Durée d'entraînement / prédiction du modèle", ["phase"])
+DENM_SECONDS    = histogram("denm_generation_seconds", "Durée de génération d'un DENM (choix du camion inclus)")
+MQTT_SECONDS    = histogram("mqtt_publish_seconds", "Durée d'un publish MQTT", ["topic"])
+MQTT_MESSAGES   = counter("mqtt_messages_total", "Messages MQTT", ["topic", "direction"])
+MQTT_BYTES      = counter("mqtt_bytes_total", "Octets de payload MQTT", ["topic", "direction"])
+
+
+def _payload_bytes(payload):
+    # paho encode les str en UTF-8 : compter les octets, pas les caractères
+    return len(payload.encode("utf-8")) if isinstance(payload, str) else len(payload)
+
+
+def publish(client, topic, payload):
+    """`client.publish` instrumenté (durée, messages, octets)."""
+    with MQTT_SECONDS.labels(topic=topic).time():
+        result = client.publish(topic, payload)
+    MQTT_MESSAGES.labels(topic=topic, direction="out").inc()
+    MQTT_BYTES.labels(topic=topic, direction="out").inc(_payload_bytes(payload))
+    return result
+
+
+def received(topic, payload):
+    MQTT_MESSAGES.labels(topic=topic, direction="in").inc()
+    MQTT_BYTES.labels(topic=topic, direction="in").inc(_payload_bytes(payload))
+
+
+# ----------------------------------------------------------------------
+# Exporter HTTP pour les process longs
+# ----------------------------------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port, addr=None):
+    """Sert /metrics sur `port` dans un thread daemon ; port 0/None = désactivé."""
+    if not port:
+        return None
+    addr = addr if addr is not None else os.getenv("METRICS_ADDR", "0.0.0.0")
+    server = ThreadingHTTPServer((addr, int(port)), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📈 Métriques Prometheus sur http://{addr}:{server.server_port}/metrics")
+    return server
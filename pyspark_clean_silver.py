@@ -2,82 +2,175 @@
 """
 silver_etl.py
 
-Pipeline Silver en Python (pandas + boto3) pour Smart City Waste Management.
+Pipeline Silver en Python (pandas + storage.py) pour Smart City Waste Management.
 
 Étapes :
- 1. Récupérer les données brutes depuis MinIO (`raw`)
+ 1. Récupérer les données brutes depuis le stockage (`raw`, MinIO par défaut)
  2. Nettoyer et transformer (JSON, JSONL, CSV, GeoJSON)
  3. Calculer les métriques métier et assembler le jeu de features
  4. Écrire les Parquets dans le bucket `silver`
 
+Parsing parallèle : `--workers N` (ou SILVER_WORKERS) répartit le parsing
+des partitions `date=` de l'historique et des fichiers PAV sur N process.
+L'ordre des clés est conservé, la sortie est identique au mode séquentiel.
+Rien d'autre n'est parallèle : transformations, features (étapes 7 à 7c) et
+écritures restent dans le process principal (les fenêtres glissantes et le
+voisinage PAV traversent les jours, un découpage par date ne s'applique pas).
+Le gain est donc borné par la part du parsing (PARSE_SECONDS, observées dans
+le parent pour tous les process ; voir bench/bench_silver_scaling.py).
+
 Usage :
     pip install pandas boto3 pyarrow
-    python silver_etl.py
+    python silver_etl.py [--workers 4]
 """
-import io, json, boto3, pandas as pd
-from botocore.client import Config
+import io, os, gzip, json, time, functools, contextlib, pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from timeseries_store import TimeSeriesStore
+from s3clinet import RAW_BUCKET, SILVER_BUCKET
+from storage import get_storage
+from metrics import PARSE_SECONDS
+from features import build_features
+from rolling_features import attach, update_table
+from raw_compaction import plan_reads
+import spatial_features
 
 # ----------------------------------------------------------------------
 # CONFIGURATION MINIO
 # ----------------------------------------------------------------------
-RAW_BUCKET    = "raw"
-SILVER_BUCKET = "silver"
-ENDPOINT_URL  = "http://localhost:9000"
-ACCESS_KEY    = "minioadmin"
-SECRET_KEY    = "minioadmin123"
+# Buckets : voir s3clinet.py ; backend (MinIO, local, mémoire) : STORAGE_URL, voir storage.py
 CAPACITY_TONS = 0.12  # 120 L = 0.12 t par poubelle
-
-# Init client
-s3 = boto3.client(
-    "s3",
-    endpoint_url=ENDPOINT_URL,
-    aws_access_key_id=ACCESS_KEY,
-    aws_secret_access_key=SECRET_KEY,
-    config=Config(signature_version="s3v4")
-)
+HISTORY_DIR   = os.getenv("HISTORY_DIR")  # store live (sensor/history), optionnel
+HISTORY_RES   = os.getenv("HISTORY_RESOLUTION", "1m")
+WORKERS       = int(os.getenv("SILVER_WORKERS", "1"))  # process de parsing
+PAV_RADII     = tuple(int(r) for r in os.getenv("PAV_RADII", "100,250,500").split(","))  # m
 
 # ----------------------------------------------------------------------
 # UTILITAIRES
 # ----------------------------------------------------------------------
+_in_worker = False
+_worker_parse = []   # (format, secondes) mesurées dans un process fils
+
+
+@contextlib.contextmanager
+def parse_timer(fmt):
+    """PARSE_SECONDS ; dans un process fils, la mesure est renvoyée au parent."""
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    if _in_worker:
+        _worker_parse.append((fmt, elapsed))
+    else:
+        PARSE_SECONDS.labels(format=fmt).observe(elapsed)
+
+
 def list_keys(bucket, prefix):
-    paginator = s3.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-        for obj in page.get("Contents", []):
-            yield obj["Key"]
+    yield from get_storage().list_keys(bucket, prefix)
 
 
 def read_json(bucket, key):
-    return json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+    raw = get_storage().get_bytes(bucket, key)
+    with parse_timer("json"):
+        return json.loads(raw)
 
 
 def read_csv(bucket, key):
-    raw = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+    raw = get_storage().get_bytes(bucket, key)
     text = raw.decode("utf-8", errors="ignore")
     sep = ";" if ";" in text.splitlines()[0] and "," not in text.splitlines()[0] else ","
-    return pd.read_csv(io.BytesIO(raw), sep=sep, engine="python")
+    with parse_timer("csv"):
+        return pd.read_csv(io.BytesIO(raw), sep=sep, engine="python")
 
 
-def read_jsonl(bucket, prefix):
-    dfs = []
-    for key in list_keys(bucket, prefix):
-        if key.lower().endswith(".jsonl"):
-            data = s3.get_object(Bucket=bucket, Key=key)["Body"].read().decode()
-            dfs.append(pd.read_json(io.StringIO(data), lines=True))
+def read_jsonl_key(bucket, key):
+    data = get_storage().get_bytes(bucket, key)
+    # lots live de sensor_stream_ingest.py : JSONL gzip
+    data = (gzip.decompress(data) if key.lower().endswith(".gz") else data).decode()
+    with parse_timer("jsonl"):
+        return pd.read_json(io.StringIO(data), lines=True)
+
+
+def read_parquet_key(bucket, key):
+    with parse_timer("parquet"):
+        return get_storage().read_parquet(bucket, key)
+
+
+def read_jsonl(bucket, prefix, workers=1):
+    # partitions compactées (raw_compaction.py) + JSONL arrivés depuis
+    compacted, keys = plan_reads(get_storage(), bucket, prefix)
+    dfs = parallel_map(functools.partial(read_parquet_key, bucket), compacted, workers)
+    dfs += parallel_map(functools.partial(read_jsonl_key, bucket), keys, workers)
     return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
 
 
+def read_pav_key(bucket, key):
+    pav_type = key.split('/')[1]
+    gj = read_json(bucket, key)
+    pav = []
+    for feat in gj.get("features", []):
+        lon, lat = feat["geometry"]["coordinates"]
+        pav.append({"pav_type": pav_type, "lat": lat, "lon": lon})
+    return pd.DataFrame(pav)
+
+
+def _init_worker():
+    # process fils : ne pas réutiliser le pool HTTP / client boto3 du parent
+    global _in_worker
+    import s3clinet, storage
+    s3clinet._client = None
+    storage._instances.clear()
+    _in_worker = True
+
+
+def _call_in_worker(fn, item):
+    del _worker_parse[:]
+    return fn(item), list(_worker_parse)
+
+
+def parallel_map(fn, items, workers):
+    """
+    `map` ordonné, sur `workers` process si utile (mem:// reste séquentiel).
+    Réservé au parsing des clés raw : `fn` lit et parse une clé, le résultat
+    revient au parent qui fait seul la suite.
+    """
+    if workers <= 1 or len(items) <= 1 or get_storage().backend == "mem":
+        return [fn(item) for item in items]
+    results = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(items)), initializer=_init_worker) as ex:
+        for result, parse in ex.map(functools.partial(_call_in_worker, fn), items):
+            for fmt, elapsed in parse:
+                PARSE_SECONDS.labels(format=fmt).observe(elapsed)
+            results.append(result)
+    return results
+
+
+def merge_live(df_hist, history):
+    """
+    Ajoute à l'historique raw les mesures du store live postérieures, par
+    capteur, à la dernière mesure raw. Lecture incrémentale : seuls les ticks
+    après la plus ancienne de ces dernières mesures sont lus.
+    """
+    if df_hist.empty:
+        return history.to_frame(resolution=HISTORY_RES)
+    last_raw = df_hist.groupby("sensor_id")["ts"].max()
+    df_live = history.to_frame(since=int(last_raw.min().timestamp()), resolution=HISTORY_RES)
+    if df_live.empty:
+        return df_hist
+    cutoff = df_live["sensor_id"].map(last_raw)
+    df_live = df_live[cutoff.isna() | (df_live["ts"] > cutoff)]
+    df = pd.concat([df_hist, df_live], ignore_index=True)
+    return df.drop_duplicates(["sensor_id", "ts"], keep="first", ignore_index=True)
+
+
 def upload_parquet(df, bucket, key):
-    buf = io.BytesIO()
-    df.to_parquet(buf, index=False)
-    buf.seek(0)
-    s3.put_object(Bucket=bucket, Key=key, Body=buf.read())
-    print(f"✔️  s3://{bucket}/{key}")
+    store = get_storage()
+    store.write_parquet(df, bucket, key)
+    print(f"✔️  {store.url} {bucket}/{key}")
 
 # ----------------------------------------------------------------------
 # ETL SILVER
 # ----------------------------------------------------------------------
-def main():
+def main(workers=WORKERS):
     start = datetime.utcnow().isoformat()
     print(f"🚀 Silver ETL démarré à {start}")
 
@@ -89,9 +182,15 @@ def main():
     upload_parquet(df_pos, SILVER_BUCKET, "sensors/positions.parquet")
 
     # 2) Historique fill levels
-    df_hist = read_jsonl(RAW_BUCKET, "sensor/historic_fill_levels/")
+    df_hist = read_jsonl(RAW_BUCKET, "sensor/historic_fill_levels/", workers)
     if not df_hist.empty:
         df_hist["ts"] = pd.to_datetime(df_hist["timestamp"], unit="ms")
+    # Historique live du store time-series (rollup HISTORY_RES, lecture memmap).
+    # Les mêmes mesures arrivent aussi en raw (sensor_stream_ingest.py) : le raw
+    # fait foi, le store ne complète que ce qui suit la dernière mesure ingérée.
+    if HISTORY_DIR and os.path.isdir(HISTORY_DIR):
+        df_hist = merge_live(df_hist, TimeSeriesStore(HISTORY_DIR))
+    if not df_hist.empty:
         upload_parquet(
             df_hist[["sensor_id","ts","fill_level"]],
             SILVER_BUCKET, "sensors/historic_fill.parquet"
@@ -113,16 +212,13 @@ def main():
     upload_parquet(df_pop, SILVER_BUCKET, "demographics/population.parquet")
 
     # 4) PAV points (tous api/* sauf tonnage)
-    pav = []
-    for key in list_keys(RAW_BUCKET, "api/"):
-        if key.lower().endswith(".geojson") and "tonnage_par_habitant" not in key:
-            pav_type = key.split('/')[1]
-            gj = read_json(RAW_BUCKET, key)
-            for feat in gj.get("features", []):
-                lon, lat = feat["geometry"]["coordinates"]
-                pav.append({"pav_type": pav_type, "lat": lat, "lon": lon})
+    pav_keys = [k for k in list_keys(RAW_BUCKET, "api/")
+                if k.lower().endswith(".geojson") and "tonnage_par_habitant" not in k]
+    pav = [df for df in parallel_map(functools.partial(read_pav_key, RAW_BUCKET), pav_keys, workers)
+           if not df.empty]
+    df_pav = pd.concat(pav, ignore_index=True) if pav else pd.DataFrame(columns=["pav_type", "lat", "lon"])
     if pav:
-        upload_parquet(pd.DataFrame(pav), SILVER_BUCKET, "pav/points.parquet")
+        upload_parquet(df_pav, SILVER_BUCKET, "pav/points.parquet")
 
         # 5) Tonnage par habitant → annual_tons city-wide
     ton_keys = [k for k in list_keys(RAW_BUCKET, "api/tonnage_par_habitant/") if k.lower().endswith(".geojson")]
@@ -172,23 +268,33 @@ def main():
     })
     upload_parquet(df_proxy, SILVER_BUCKET, "sensor_tonnage/proxy.parquet")
 
-    # 7) Jeu de features
+    # 7) Jeu de features (lookup indexé sur sensor_id catégoriel, voir features.py)
     if not df_hist.empty:
-        df_feat = (
-            df_hist
-            .merge(df_pos[["sensor_id","lat","lon","capacity_tons"]], on="sensor_id", how="left")
-            .merge(df_proxy, on="sensor_id", how="left")
-        )
-        df_feat["hour_of_day"] = df_feat["ts"].dt.hour
-        df_feat["day_of_week"] = df_feat["ts"].dt.dayofweek
-        final = df_feat[[
-            "sensor_id","ts","lat","lon","capacity_tons",
-            "annual_tons","daily_tons","hour_of_day","day_of_week","fill_level"
-        ]]
+        final = build_features(df_hist, df_pos, df_proxy)
+
+        # 7b) Lags / fenêtres glissantes : seules les lignes absentes de la
+        # table partitionnée sont calculées, l'état par capteur est conservé dans Silver
+        store = get_storage()
+        df_roll, written = update_table(store, SILVER_BUCKET, df_hist)
+        for key in written:
+            print(f"✔️  {store.url} {SILVER_BUCKET}/{key}")
+        final = attach(final, df_roll)
+
+        # 7c) Voisinage PAV par capteur (KD-tree, cache par version des PAV)
+        if not df_pav.empty:
+            df_near, key, computed = spatial_features.neighbourhood(
+                store, SILVER_BUCKET, df_pos, df_pav, PAV_RADII)
+            print(f"✔️  {store.url} {SILVER_BUCKET}/{key}" + ("" if computed else " (cache)"))
+            final = spatial_features.attach(final, df_near)
+
         upload_parquet(final, SILVER_BUCKET, "features/features.parquet")
 
     end = datetime.utcnow().isoformat()
     print(f"🎉 Silver ETL terminé à {end}")
 
 if __name__=="__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="process de parsing du raw (le reste est séquentiel)")
+    main(parser.parse_args().workers)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+raw_compaction.py
+
+Compaction de la zone raw de l'historique des niveaux de remplissage.
+
+Chaque `ingest_historic_fill` et chaque flush de `sensor_stream_ingest.py`
+ajoute un petit objet JSONL(.gz) sous
+    sensor/historic_fill_levels/date=%Y/%m/%d/
+Ce job fusionne, par partition date=, tous ces objets en un seul Parquet
+trié par (timestamp, sensor_id), dédupliqué sur (sensor_id, timestamp),
+avec statistiques de colonnes, et tient à jour un manifeste :
+    sensor/historic_fill_levels/_manifest.json
+    {"partitions": {"2024/01/05": {"compacted_key", "sources", "first_compacted",
+                                    "rows", "min_ts", "max_ts", "compacted_at"}},
+     "stale": [{"key", "since"}]}
+
+– Le Parquet est écrit sous un nom versionné puis le manifeste est basculé :
+  un lecteur voit toujours un couple (Parquet, sources) cohérent. L'ancien
+  Parquet passe dans `stale` et n'est supprimé qu'après `--stale-grace`
+  secondes, le temps que les lecteurs de l'ancien manifeste terminent.
+– Les objets sources sont conservés, ou supprimés par `--retention-days`
+  une fois compactés depuis plus de N jours (date de première compaction de
+  chaque source, `first_compacted`, qu'une recompaction ne remet pas à zéro).
+– `pyspark_clean_silver.read_jsonl` lit les Parquet compactés et seulement
+  les objets JSONL arrivés depuis (`plan_reads`).
+
+Usage :
+    python raw_compaction.py --once [--retention-days 7]
+"""
+import io
+import gzip
+import json
+import time
+import logging
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from s3clinet import RAW_BUCKET
+from storage import get_storage
+
+PREFIX        = "sensor/historic_fill_levels/"
+MANIFEST      = "_manifest.json"
+SOURCE_SUFFIX = (".jsonl", ".jsonl.gz")
+COLUMNS       = ["sensor_id", "timestamp", "fill_level"]
+DEFAULT_INTERVAL = 3600
+DEFAULT_GRACE    = 3600   # s avant suppression d'un Parquet remplacé
+
+
+# ----------------------------------------------------------------------
+# Manifeste
+# ----------------------------------------------------------------------
+def load_manifest(store, bucket=RAW_BUCKET, prefix=PREFIX):
+    key = prefix + MANIFEST
+    if not store.exists(bucket, key):
+        return {"partitions": {}, "stale": []}
+    manifest = json.loads(store.get_bytes(bucket, key))
+    manifest.setdefault("stale", [])
+    return manifest
+
+
+def save_manifest(store, manifest, bucket=RAW_BUCKET, prefix=PREFIX):
+    store.put_bytes(bucket, prefix + MANIFEST, json.dumps(manifest, indent=2).encode("utf-8"),
+                    "application/json")
+
+
+def partition_of(key, prefix=PREFIX):
+    """'sensor/historic_fill_levels/date=2024/01/05/x.jsonl' → '2024/01/05'."""
+    rest = key[len(prefix):]
+    if not rest.startswith("date="):
+        return None
+    return "/".join(rest[len("date="):].split("/")[:3])
+
+
+def list_sources(store, bucket=RAW_BUCKET, prefix=PREFIX):
+    """Objets JSONL par partition date=."""
+    partitions = {}
+    for key in store.list_keys(bucket, prefix):
+        if key.lower().endswith(SOURCE_SUFFIX):
+            part = partition_of(key, prefix)
+            if part:
+                partitions.setdefault(part, []).append(key)
+    return partitions
+
+
+def plan_reads(store, bucket=RAW_BUCKET, prefix=PREFIX):
+    """
+    Ce qu'un lecteur doit lire : (Parquet compactés, objets JSONL non encore
+    compactés). Sans manifeste, tous les JSONL.
+    """
+    manifest = load_manifest(store, bucket, prefix)
+    compacted, covered = [], set()
+    for part in sorted(manifest["partitions"]):
+        entry = manifest["partitions"][part]
+        compacted.append(entry["compacted_key"])
+        covered.update(entry["sources"])
+    pending = [k for keys in list_sources(store, bucket, prefix).values() for k in keys if k not in covered]
+    return compacted, sorted(pending)
+
+
+# ----------------------------------------------------------------------
+# Compaction
+# ----------------------------------------------------------------------
+def read_source(store, bucket, key):
+    data = store.get_bytes(bucket, key)
+    if key.lower().endswith(".gz"):
+        data = gzip.decompress(data)
+    # timestamp reste en ms entiers (pas de conversion automatique en dates)
+    df = pd.read_json(io.BytesIO(data), lines=True, convert_dates=False)
+    return df[COLUMNS] if not df.empty else pd.DataFrame(columns=COLUMNS)
+
+
+def compact_partition(store, part, sources, entry, bucket=RAW_BUCKET, prefix=PREFIX):
+    """Fusionne `sources` (+ Parquet existant) ; retourne la nouvelle entrée du manifeste."""
+    frames = []
+    if entry:
+        frames.append(store.read_parquet(bucket, entry["compacted_key"]))
+    new_sources = [k for k in sources if not entry or k not in entry["sources"]]
+    frames.extend(read_source(store, bucket, k) for k in new_sources)
+    df = pd.concat(frames, ignore_index=True)
+    df["sensor_id"] = df["sensor_id"].astype(str)
+    df["timestamp"] = df["timestamp"].astype("int64")
+    df["fill_level"] = df["fill_level"].astype("float64")
+    # dernière valeur reçue gagne (ordre des sources = ordre lexicographique des clés)
+    df = (df.drop_duplicates(["sensor_id", "timestamp"], keep="last")
+            .sort_values(["timestamp", "sensor_id"], kind="stable")
+            .reset_index(drop=True))
+
+    now = datetime.utcnow()
+    version = now.strftime("%Y%m%dT%H%M%S%fZ")
+    key = f"{prefix}date={part}/compacted_{version}.parquet"
+    store.write_parquet(df, bucket, key, compression="zstd", write_statistics=True,
+                        row_group_size=1_000_000)
+    first = first_compacted(entry) if entry else {}
+    first.update({k: now.isoformat() + "Z" for k in new_sources})
+    return {
+        "compacted_key": key,
+        "sources": sorted(set(entry["sources"] if entry else []) | set(new_sources)),
+        "first_compacted": first,
+        "expired": entry.get("expired", []) if entry else [],
+        "rows": int(len(df)),
+        "min_ts": int(df["timestamp"].min()) if len(df) else None,
+        "max_ts": int(df["timestamp"].max()) if len(df) else None,
+        "compacted_at": now.isoformat() + "Z",
+    }
+
+
+def first_compacted(entry):
+    """Date de première compaction par source (manifestes anciens : `compacted_at`)."""
+    first = dict(entry.get("first_compacted", {}))
+    for key in entry["sources"]:
+        first.setdefault(key, entry["compacted_at"])
+    return first
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value.rstrip("Z"))
+
+
+def expire_sources(store, manifest, retention_days, bucket=RAW_BUCKET):
+    """Supprime les sources compactées (chacune à sa propre date) depuis plus de `retention_days`."""
+    limit = datetime.utcnow() - timedelta(days=retention_days)
+    removed = 0
+    for part, entry in manifest["partitions"].items():
+        entry["first_compacted"] = first_compacted(entry)
+        for key, since in entry["first_compacted"].items():
+            if key in entry["expired"] or _parse_time(since) > limit:
+                continue
+            store.delete(bucket, key)
+            entry["expired"].append(key)
+            removed += 1
+    return removed
+
+
+def drop_stale(store, manifest, grace_seconds, bucket=RAW_BUCKET):
+    """Supprime les Parquet remplacés depuis plus de `grace_seconds`."""
+    limit = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    keep = []
+    for stale in manifest["stale"]:
+        if _parse_time(stale["since"]) > limit:
+            keep.append(stale)
+        else:
+            store.delete(bucket, stale["key"])
+    removed = len(manifest["stale"]) - len(keep)
+    manifest["stale"] = keep
+    return removed
+
+
+def compact_all(store=None, bucket=RAW_BUCKET, prefix=PREFIX, retention_days=None,
+                stale_grace=DEFAULT_GRACE):
+    store = store or get_storage()
+    manifest = load_manifest(store, bucket, prefix)
+    sources = list_sources(store, bucket, prefix)
+    # Parquet remplacés lors des passes précédentes : plus référencés par le
+    # manifeste publié, supprimés une fois le délai de grâce écoulé
+    drop_stale(store, manifest, stale_grace, bucket)
+    for part in sorted(sources):
+        entry = manifest["partitions"].get(part)
+        known = set(entry["sources"]) if entry else set()
+        if not set(sources[part]) - known:
+            continue
+        new_entry = compact_partition(store, part, sources[part], entry, bucket, prefix)
+        manifest["partitions"][part] = new_entry
+        if entry:
+            manifest["stale"].append({"key": entry["compacted_key"],
+                                      "since": new_entry["compacted_at"]})
+        logging.info("Compacted date=%s : %d objets → %s (%d lignes)",
+                     part, len(new_entry["sources"]), new_entry["compacted_key"], new_entry["rows"])
+    if retention_days is not None:
+        removed = expire_sources(store, manifest, retention_days, bucket)
+        if removed:
+            logging.info("Retention %s j : %d objets sources supprimés", retention_days, removed)
+    save_manifest(store, manifest, bucket, prefix)
+    return manifest
+
+
+# ----------------------------------------------------------------------
+# Main
+# ----------------------------------------------------------------------
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--once', action='store_true')
+    parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL)
+    parser.add_argument('--retention-days', type=float, default=None,
+                        help="supprimer les sources compactées depuis plus de N jours")
+    parser.add_argument('--stale-grace', type=float, default=DEFAULT_GRACE,
+                        help="délai (s) avant suppression d'un Parquet remplacé")
+    parser.add_argument('--log', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log),
+                        format="%(asctime)s %(levelname)s %(message)s",
+                        datefmt="%Y-%m-%dT%H:%M:%S")
+    while True:
+        compact_all(retention_days=args.retention_days, stale_grace=args.stale_grace)
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,7 +14,8 @@ entraîner le modèle de prédiction de niveau de remplissage.
   colonnes_verre, composteurs, conteneur_textile, stations_trilib, recycleries.
 – Tonnage de déchets par habitant (GeoJSON via CKAN API)
 
-Tous les fichiers sont poussés dans le bucket S3 RAW_BUCKET,
+Tous les fichiers sont poussés dans le bucket RAW_BUCKET du stockage
+configuré (STORAGE_URL : s3://, file://, mem://, voir storage.py),
 avec partitionnement par date et idempotence (skip si déjà existant).
 """
 
@@ -25,8 +26,8 @@ import logging
 import requests
 import random
 from datetime import datetime, timedelta
-from botocore.exceptions import ClientError
-from s3clinet import s3, RAW_BUCKET
+from s3clinet import RAW_BUCKET, SILVER_BUCKET, GOLD_BUCKET
+from storage import get_storage
 
 # ----------------------------------------------------------------------
 # Config
@@ -53,19 +54,15 @@ def setup_logging(level="INFO"):
     )
 
 def object_exists(key):
-    try:
-        s3.head_object(Bucket=RAW_BUCKET, Key=key)
-        return True
-    except ClientError as e:
-        if e.response['Error']['Code']=='404': return False
-        raise
+    return get_storage().exists(RAW_BUCKET, key)
 
 def put_bytes(key, data, content_type="application/json"):
+    store = get_storage()
     if object_exists(key):
-        logging.info("Skipped existing s3://%s/%s", RAW_BUCKET, key)
+        logging.info("Skipped existing %s %s/%s", store.url, RAW_BUCKET, key)
         return
-    s3.put_object(Bucket=RAW_BUCKET, Key=key, Body=data, ContentType=content_type)
-    logging.info("Uploaded s3://%s/%s", RAW_BUCKET, key)
+    store.put_bytes(RAW_BUCKET, key, data, content_type)
+    logging.info("Uploaded %s %s/%s", store.url, RAW_BUCKET, key)
 
 def fetch_ckan(dataset):
     url = f"https://opendata.paris.fr/api/records/1.0/search/?dataset={dataset}&rows=-1&format=geojson"
@@ -84,11 +81,12 @@ def ingest_sensor_positions(ts):
     put_bytes("sensor/sensor_position.json", data)
 
 
-def ingest_historic_fill(ts):
-    sensors = [f"S{i+1}" for i in range(45)]
-    start = ts - timedelta(days=30)
+def ingest_historic_fill(ts, n_sensors=45, days=30, samples_per_hour=1):
+    sensors = [f"S{i+1}" for i in range(n_sensors)]
+    start = ts - timedelta(days=days)
     lines = []
-    for h in range(30*24):
+    for k in range(days*24*samples_per_hour):
+        h = k / samples_per_hour
         ts_h = int((start + timedelta(hours=h)).timestamp()*1000)
         for s in sensors:
             base = 0.5 + 0.3 * max(0, __import__('math').sin(2*__import__('math').pi*(h%24)/24))
@@ -112,15 +110,6 @@ def ingest_population(ts):
         logging.warning(
             "CSV population absent (%s). Télécharger depuis INSEE et placer ici.", local_csv
         )
-    local_csv = "raw/demographics/populations_legales_2021.csv"
-    s3_key = "demographics/populations_legales_2021.csv"
-    if os.path.exists(local_csv):
-        with open(local_csv, 'rb') as f:
-            put_bytes(s3_key, f.read(), content_type="text/csv")
-    else:
-        logging.warning(
-            "CSV population absent (%s). Télécharger depuis INSEE et placer ici.", local_csv
-        )
 
 
 def ingest_apis(ts):
@@ -153,6 +142,7 @@ def main():
     args = parser.parse_args()
 
     setup_logging(args.log)
+    get_storage().ensure_buckets((RAW_BUCKET, SILVER_BUCKET, GOLD_BUCKET))
     logging.info("Starting ingestion (once=%s interval=%s)", args.once, args.interval)
     if args.once:
         ingest_all()
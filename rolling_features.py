@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+rolling_features.py
+
+Features de trajectoire par capteur pour le modèle de remplissage :
+    fill_lag_{1,2,3}          niveaux des 3 mesures précédentes
+    fill_mean_{1h,6h,24h}     moyenne glissante sur la fenêtre
+    fill_slope_{1h,6h,24h}    pente (niveau / heure, moindres carrés) sur la fenêtre
+    hours_since_empty         heures depuis le dernier vidage détecté
+
+Toutes les features d'une ligne n'utilisent que les mesures *strictement
+antérieures* (pas de fuite de la cible `fill_level`).
+
+Calcul incrémental : l'état conservé entre deux runs est la queue de
+l'historique (24 h et au moins 3 mesures par capteur) + la date du dernier
+vidage par capteur. `update()` ne traite que les lignes plus récentes que cet
+état, soit O(nouvelles données). Le calcul est vectorisé sur tous les
+capteurs à la fois : tri (capteur, ts), sommes préfixes et searchsorted
+sur une clé composite, sans groupby. Une mesure arrivée après que l'état de
+son capteur l'a dépassée (retard) n'est pas calculée : elle est comptée dans
+`rolling_late_rows_total`, journalisée, et écrite avec des features NaN ;
+présente dans la table, elle n'est plus en attente ni recomptée aux runs
+suivants.
+
+Table de sortie : une partition Parquet par jour UTC,
+    features/rolling/date=%Y-%m-%d.parquet
+dans laquelle chaque run fusionne ses lignes (`write_rows`) ; les jours
+absents de l'historique sont supprimés (`expire_rows`), le nombre d'objets
+reste borné par la rétention du raw. `update_table` (étape 7b de la Silver)
+ne cherche les lignes à calculer que dans les jours à partir de la queue de
+l'état ; les jours plus anciens ne sont lus que pour l'instantané complet
+features.parquet (et pour y repérer les mesures arrivées très en retard).
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+from metrics import counter
+
+WINDOWS     = {"1h": 3600, "6h": 6 * 3600, "24h": 24 * 3600}
+LAGS        = (1, 2, 3)
+EMPTY_DROP  = 0.30   # chute de niveau ≥ 30 points entre deux mesures = vidage
+STATE_TAIL  = "features/rolling_state/tail.parquet"
+STATE_EMPTY = "features/rolling_state/last_empty.parquet"
+KEY_STRIDE  = 10**10  # clé composite code * KEY_STRIDE + ts (s)
+PREFIX      = "features/rolling/"
+
+LATE_ROWS = counter("rolling_late_rows_total",
+                    "Mesures antérieures à l'état glissant de leur capteur, non calculées")
+
+ROLLING_COLUMNS = (
+    [f"fill_lag_{k}" for k in LAGS]
+    + [f"fill_mean_{w}" for w in WINDOWS]
+    + [f"fill_slope_{w}" for w in WINDOWS]
+    + ["hours_since_empty"]
+)
+
+
+def _seconds(ts):
+    return pd.to_datetime(ts).to_numpy(dtype="datetime64[s]").astype(np.int64)
+
+
+def composite_key(codes, seconds):
+    return codes.astype(np.int64) * KEY_STRIDE + seconds
+
+
+def compute(codes, seconds, values, last_empty=None):
+    """
+    Features pour des lignes triées par (code, ts). `last_empty[code]` donne la
+    date (s) du dernier vidage connu avant ces lignes (0 = aucun).
+    Retourne un dict colonne → tableau float32.
+    """
+    n = len(values)
+    idx = np.arange(n)
+    key = composite_key(codes, seconds)
+    y = values.astype(np.float64)
+
+    # t en heures depuis la première mesure du capteur (précision des sommes)
+    group_start = np.searchsorted(key, codes.astype(np.int64) * KEY_STRIDE, side="left")
+    t = (seconds - seconds[group_start]) / 3600.0
+
+    def prefix(x):
+        return np.concatenate(([0.0], np.cumsum(x)))
+
+    cs_y, cs_t, cs_ty, cs_tt = prefix(y), prefix(t), prefix(t * y), prefix(t * t)
+    out = {}
+
+    # Décalages : mesure i-k du même capteur
+    for k in LAGS:
+        prev = idx - k
+        valid = (prev >= group_start)
+        out[f"fill_lag_{k}"] = np.where(valid, y[np.maximum(prev, 0)], np.nan)
+
+    # Fenêtres [ts - W, ts[ exclusives de la ligne courante
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for name, width in WINDOWS.items():
+            start = np.searchsorted(key, key - width, side="right")
+            cnt = (idx - start).astype(np.float64)
+            sy = cs_y[idx] - cs_y[start]
+            st = cs_t[idx] - cs_t[start]
+            sty = cs_ty[idx] - cs_ty[start]
+            stt = cs_tt[idx] - cs_tt[start]
+            out[f"fill_mean_{name}"] = np.where(cnt > 0, sy / cnt, np.nan)
+            denom = cnt * stt - st * st
+            out[f"fill_slope_{name}"] = np.where((cnt > 1) & (denom > 1e-12),
+                                                 (cnt * sty - st * sy) / denom, np.nan)
+
+    # Vidages : chute ≥ EMPTY_DROP ; pour la ligne i, dernier vidage avant i
+    drop = np.zeros(n, dtype=bool)
+    drop[1:] = (y[:-1] - y[1:] >= EMPTY_DROP) & (idx[1:] > group_start[1:])
+    base = codes.astype(np.int64) * KEY_STRIDE
+    event_key = np.where(drop, key, base)
+    running = np.maximum.accumulate(event_key)  # ne déborde pas d'un capteur à l'autre
+    before = np.empty(n, dtype=np.int64)
+    before[0] = base[0] if n else 0
+    before[1:] = np.where(idx[1:] > group_start[1:], running[:-1], base[1:])
+    last = before - base
+    if last_empty is not None:
+        last = np.maximum(last, last_empty[codes])
+    out["hours_since_empty"] = np.where(last > 0, (seconds - last) / 3600.0, np.nan)
+
+    return {k: v.astype(np.float32) for k, v in out.items()}, drop
+
+
+class RollingFeatureEngine:
+    """État par capteur (queue d'historique + dernier vidage) et mise à jour incrémentale."""
+
+    def __init__(self, tail=None, last_empty=None):
+        self.tail = tail if tail is not None else pd.DataFrame(
+            {"sensor_id": pd.Series(dtype=str), "ts": pd.Series(dtype="datetime64[s]"),
+             "fill_level": pd.Series(dtype=np.float32)})
+        self.last_empty = last_empty if last_empty is not None else pd.Series(dtype=np.int64)
+
+    # ------------------------------------------------------------------
+    # Persistance (bucket silver)
+    # ------------------------------------------------------------------
+    @classmethod
+    def load(cls, store, bucket):
+        if not store.exists(bucket, STATE_TAIL):
+            return cls()
+        tail = store.read_parquet(bucket, STATE_TAIL)
+        tail["sensor_id"] = tail["sensor_id"].astype(str)
+        empty = store.read_parquet(bucket, STATE_EMPTY)
+        last_empty = pd.Series(empty["last_empty"].to_numpy(np.int64), index=empty["sensor_id"].astype(str))
+        return cls(tail, last_empty)
+
+    def save(self, store, bucket):
+        store.write_parquet(self.tail, bucket, STATE_TAIL)
+        store.write_parquet(pd.DataFrame({"sensor_id": self.last_empty.index.astype(str),
+                                          "last_empty": self.last_empty.to_numpy(np.int64)}),
+                            bucket, STATE_EMPTY)
+
+    # ------------------------------------------------------------------
+    # Mise à jour
+    # ------------------------------------------------------------------
+    def update(self, df):
+        """
+        `df` : sensor_id, ts, fill_level, lignes pas encore calculées (voir
+        `pending_mask`) ; celles encore dans la queue de l'état sont ignorées,
+        les autres antérieures à l'état sont des retards (comptés, non calculés).
+        Retourne les features des lignes nouvelles, plus les retards avec des
+        features NaN (à écrire : ils ne seront plus en attente), et met l'état à jour.
+        """
+        new = pd.DataFrame({"sensor_id": df["sensor_id"].astype(str).to_numpy(),
+                            "ts": _seconds(df["ts"]),
+                            "fill_level": df["fill_level"].to_numpy(np.float32)})
+        tail = pd.DataFrame({"sensor_id": self.tail["sensor_id"].to_numpy(),
+                             "ts": _seconds(self.tail["ts"]),
+                             "fill_level": self.tail["fill_level"].to_numpy(np.float32)})
+
+        # Lignes déjà couvertes par l'état : ignorées ; celles qui ne sont pas
+        # dans la queue sont des retards (l'état a déjà avancé au-delà)
+        late = new.iloc[:0]
+        if len(tail):
+            last_seen = tail.groupby("sensor_id")["ts"].max()
+            seen = new["sensor_id"].map(last_seen).fillna(-1).to_numpy()
+            old = new[new["ts"].to_numpy() <= seen]
+            new = new[new["ts"].to_numpy() > seen]
+            late = old[_absent(old["sensor_id"], old["ts"].to_numpy(), tail["sensor_id"], tail["ts"].to_numpy())]
+            late = late.drop_duplicates(["sensor_id", "ts"])
+            if len(late):
+                LATE_ROWS.inc(len(late))
+                logging.warning("%d mesures en retard sur %d capteurs ignorées (état glissant déjà plus récent)",
+                                len(late), late["sensor_id"].nunique())
+        new = new.drop_duplicates(["sensor_id", "ts"], keep="last")
+        late = pd.DataFrame({"sensor_id": late["sensor_id"].to_numpy(),
+                             "ts": late["ts"].to_numpy(np.int64).astype("datetime64[s]"),
+                             **{col: np.float32(np.nan) for col in ROLLING_COLUMNS}})
+        if new.empty:
+            return late if len(late) else pd.DataFrame(columns=["sensor_id", "ts"] + ROLLING_COLUMNS)
+
+        both = pd.concat([tail, new], ignore_index=True)
+        is_new = np.r_[np.zeros(len(tail), bool), np.ones(len(new), bool)]
+        codes, sensors = pd.factorize(both["sensor_id"])
+        seconds = both["ts"].to_numpy(np.int64)
+        order = np.lexsort((seconds, codes))
+        codes, seconds, is_new = codes[order], seconds[order], is_new[order]
+        values = both["fill_level"].to_numpy(np.float32)[order]
+
+        known = self.last_empty.reindex(sensors).fillna(0).to_numpy(np.int64)
+        feats, drop = compute(codes, seconds, values, known)
+
+        result = pd.DataFrame({"sensor_id": sensors.to_numpy()[codes[is_new]],
+                               "ts": seconds[is_new].astype("datetime64[s]")})
+        for col in ROLLING_COLUMNS:
+            result[col] = feats[col][is_new]
+
+        # Nouvel état : dernières 24 h (et au moins max(LAGS) mesures) par capteur
+        key = composite_key(codes, seconds)
+        group_end = np.searchsorted(key, (codes.astype(np.int64) + 1) * KEY_STRIDE, side="left")
+        last_ts = seconds[group_end - 1]
+        keep = (seconds > last_ts - max(WINDOWS.values())) | (group_end - np.arange(len(codes)) <= max(LAGS))
+        self.tail = pd.DataFrame({"sensor_id": sensors.to_numpy()[codes[keep]],
+                                  "ts": seconds[keep].astype("datetime64[s]"),
+                                  "fill_level": values[keep]})
+        events = pd.Series(seconds[drop], index=sensors.to_numpy()[codes[drop]])
+        last_empty = pd.concat([self.last_empty, events])
+        self.last_empty = last_empty.groupby(level=0).max().astype(np.int64)
+        return pd.concat([result, late], ignore_index=True) if len(late) else result
+
+    def first_day(self):
+        """Jour UTC de la plus ancienne mesure de la queue (None sans état)."""
+        if self.tail.empty:
+            return None
+        return str(min(days_of(self.tail["ts"])))
+
+
+def _absent(sensors, seconds, done_sensors, done_seconds):
+    """Masque des clés (capteur, ts en s) absentes de (done_sensors, done_seconds)."""
+    if len(done_sensors) == 0 or len(sensors) == 0:
+        return np.ones(len(sensors), dtype=bool)
+    codes, _ = pd.factorize(pd.concat([pd.Series(done_sensors, dtype=str), pd.Series(sensors, dtype=str)],
+                                      ignore_index=True))
+    n = len(done_sensors)
+    return ~np.isin(composite_key(codes[n:], seconds), composite_key(codes[:n], done_seconds))
+
+
+def pending_mask(df, df_done):
+    """Masque des lignes de `df` dont la clé (sensor_id, ts) n'est pas dans `df_done`."""
+    return _absent(df["sensor_id"].to_numpy(), _seconds(df["ts"]),
+                   df_done["sensor_id"].to_numpy(), _seconds(df_done["ts"]))
+
+
+# ----------------------------------------------------------------------
+# Table de sortie partitionnée par jour
+# ----------------------------------------------------------------------
+def _days(ts):
+    """Jour UTC (`%Y-%m-%d`) de chaque horodatage."""
+    return _seconds(ts).astype("datetime64[s]").astype("datetime64[D]").astype(str)
+
+
+def partition_key(day):
+    return f"{PREFIX}date={day}.parquet"
+
+
+def days_of(ts):
+    """Jours UTC (`%Y-%m-%d`) distincts de `ts`."""
+    return sorted(set(_days(ts)))
+
+
+def read_rows(store, bucket, days):
+    """Features déjà calculées pour les jours `days`."""
+    parts = [store.read_parquet(bucket, partition_key(d)) for d in days
+             if store.exists(bucket, partition_key(d))]
+    if not parts:
+        return pd.DataFrame(columns=["sensor_id", "ts"] + ROLLING_COLUMNS)
+    return pd.concat(parts, ignore_index=True)
+
+
+def write_rows(store, bucket, df_new):
+    """
+    Fusionne `df_new` dans les partitions de ses jours (dernière valeur par
+    (sensor_id, ts)). Les anciens fichiers `part_<run>.parquet` sont repris
+    puis supprimés. Retourne les clés écrites.
+    """
+    legacy = [k for k in store.list_keys(bucket, PREFIX) if k[len(PREFIX):].startswith("part_")]
+    if legacy:
+        df_new = pd.concat([store.read_parquet(bucket, k) for k in legacy] + [df_new], ignore_index=True)
+    if df_new.empty:
+        return []
+    written = []
+    for d, rows in df_new.groupby(_days(df_new["ts"]), sort=True):
+        key = partition_key(d)
+        if store.exists(bucket, key):
+            rows = pd.concat([store.read_parquet(bucket, key), rows], ignore_index=True)
+        rows = (rows.assign(sensor_id=rows["sensor_id"].astype(str))
+                .drop_duplicates(["sensor_id", "ts"], keep="last")
+                .sort_values(["sensor_id", "ts"], ignore_index=True))
+        store.write_parquet(rows, bucket, key)
+        written.append(key)
+    for k in legacy:
+        store.delete(bucket, k)
+    return written
+
+
+def expire_rows(store, bucket, keep_days):
+    """Supprime les partitions des jours absents de `keep_days` (historique expiré)."""
+    keep = {partition_key(d) for d in keep_days}
+    expired = [k for k in store.list_keys(bucket, PREFIX) if k.startswith(f"{PREFIX}date=") and k not in keep]
+    for k in expired:
+        store.delete(bucket, k)
+    return expired
+
+
+def update_table(store, bucket, df_hist):
+    """
+    Étape 7b de la Silver : calcule les lignes de `df_hist` absentes de la
+    table partitionnée, les y fusionne, sauve l'état et expire les jours
+    sortis de l'historique. Seuls les jours à partir de la queue de l'état
+    peuvent contenir des lignes à calculer ; les jours antérieurs ne sont lus
+    qu'une fois, pour l'instantané et pour y repérer les retards.
+    Retourne (features de toutes les lignes de df_hist, clés écrites).
+    """
+    engine = RollingFeatureEngine.load(store, bucket)
+    hist_days = _days(df_hist["ts"])
+    days = sorted(set(hist_days))
+    floor = engine.first_day()
+    recent_days = [d for d in days if floor is None or d >= floor]
+    recent = np.isin(hist_days, recent_days)
+
+    df_recent = read_rows(store, bucket, recent_days)
+    df_old = read_rows(store, bucket, [d for d in days if d not in recent_days])
+    pending = [df_hist[recent][pending_mask(df_hist[recent], df_recent)]]
+    if not recent.all():
+        pending.append(df_hist[~recent][pending_mask(df_hist[~recent], df_old)])
+    df_new = engine.update(pd.concat(pending, ignore_index=True))
+
+    written = write_rows(store, bucket, df_new)
+    engine.save(store, bucket)
+    expire_rows(store, bucket, days)
+    parts = [df for df in (df_old, df_recent, df_new) if not df.empty]
+    df_roll = pd.concat(parts, ignore_index=True) if parts else df_new
+    return df_roll, written
+
+
+def attach(df_feat, df_roll):
+    """
+    Ajoute les colonnes de `df_roll` (sensor_id, ts, ROLLING_COLUMNS) à la
+    table de features par lookup sur la clé (capteur, ts) — pas de merge.
+    `df_feat.sensor_id` est le catégoriel produit par features.build_features.
+    """
+    out = df_feat.copy(deep=False)
+    if df_roll.empty:
+        for col in ROLLING_COLUMNS:
+            out[col] = np.float32(np.nan)
+        return out
+    categories = df_feat["sensor_id"].cat.categories
+    roll_codes = categories.get_indexer(df_roll["sensor_id"].astype(str))
+    roll_key = composite_key(roll_codes, _seconds(df_roll["ts"]))
+    order = np.argsort(roll_key, kind="stable")
+    roll_key = roll_key[order]
+
+    feat_key = composite_key(df_feat["sensor_id"].cat.codes.to_numpy(), _seconds(df_feat["ts"]))
+    pos = np.minimum(np.searchsorted(roll_key, feat_key), len(roll_key) - 1)
+    found = roll_key[pos] == feat_key
+    rows = order[pos]
+    for col in ROLLING_COLUMNS:
+        values = df_roll[col].to_numpy(np.float32)
+        out[col] = np.where(found, values[rows], np.float32(np.nan))
+    return out
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+route_service.py
+
+Géométrie des tournées servie au dashboard (`/route/{id}`), à partir des
+fichiers `route_obu{N}.json` ({"geometry": [[lat, lon], ...], "distance",
+"duration"}) :
+
+– Simplification par niveau de zoom : un seul passage Douglas–Peucker par
+  version de la tournée attribue à chaque sommet son « importance » (écart en
+  mètres au-delà duquel il est conservé, bornée par celle de son parent).
+  La géométrie au zoom z = sommets d'importance > taille d'un pixel à z
+  (ROUTE_PIXEL_TOLERANCE pixels), identique à un Douglas–Peucker relancé avec
+  cette tolérance, sans recalcul.
+– Devant le camion : la position du camion est projetée sur le segment le
+  plus proche, et seule la suite de la tournée est renvoyée — la réponse
+  rétrécit au fil de la collecte.
+– Encodage : liste [[lat, lon], ...] arrondie au 1e-6°, ou polyline Google
+  (`precision` 5 ou 6 chiffres, deltas entiers zigzag en base 64 ASCII).
+– Cache : la version d'une tournée est (mtime_ns, taille) de son fichier ;
+  la préparation (projection, importances, distances cumulées) est refaite
+  seulement quand elle change. La géométrie simplifiée et encodée est gardée
+  dans un LRU indexé par (tournée, version, zoom, encodage, précision) ; la
+  coupe devant le camion est appliquée après la lecture du cache (tranche de
+  la liste, ou de la polyline grâce à l'offset de chaque sommet dans le
+  texte : seul le premier delta est réencodé), une position qui change ne
+  recalcule donc rien.
+
+Usage :
+    routes = RouteService("static/route_obu{}.json")
+    routes.get(1)                                   # réponse historique
+    routes.get(1, zoom=14, position=(48.85, 2.35), encoding="polyline")
+"""
+import os
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+EARTH_RADIUS_M  = 6371008.8
+TILE_M_PER_PX   = 2 * np.pi * 6378137 / 256   # m/pixel au zoom 0, à l'équateur
+MAX_ZOOM        = 22
+PIXEL_TOLERANCE = float(os.getenv("ROUTE_PIXEL_TOLERANCE", "1.0"))
+CACHE_SIZE      = int(os.getenv("ROUTE_CACHE_SIZE", "256"))
+ENCODINGS       = ("geojson", "polyline")
+
+
+# ----------------------------------------------------------------------
+# Géométrie
+# ----------------------------------------------------------------------
+def project(points, lat0):
+    """[[lat, lon], ...] en degrés → (x, y) en mètres autour de la latitude `lat0`."""
+    rad = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+    return np.column_stack((rad[:, 1] * EARTH_RADIUS_M * np.cos(np.radians(lat0)),
+                            rad[:, 0] * EARTH_RADIUS_M))
+
+
+def zoom_tolerance(zoom, lat0, pixels=PIXEL_TOLERANCE):
+    """Tolérance de simplification (m) : `pixels` pixels de carte au zoom `zoom`."""
+    return pixels * TILE_M_PER_PX * np.cos(np.radians(lat0)) / 2 ** zoom
+
+
+def _segment_distance(xy, a, b):
+    """Distance (m) des points `xy` au segment [a, b]."""
+    ab = b - a
+    den = float(ab @ ab)
+    t = np.clip((xy - a) @ ab / den, 0.0, 1.0) if den > 0 else np.zeros(len(xy))
+    return np.hypot(*(xy - a - t[:, None] * ab).T)
+
+
+def importance(xy, floor=0.0):
+    """
+    Importance Douglas–Peucker de chaque sommet : garder les sommets
+    d'importance > tol donne exactement la simplification à la tolérance tol.
+    Extrémités : +inf ; sous-tronçons dont aucun sommet ne s'écarte de plus
+    de `floor` m : 0, sans descendre plus loin.
+    """
+    n = len(xy)
+    out = np.zeros(n)
+    out[[0, -1]] = np.inf
+    # pile explicite (pas de récursion : plusieurs milliers de sommets)
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        i, j, parent = stack.pop()
+        if j - i < 2:
+            continue
+        d = _segment_distance(xy[i + 1:j], xy[i], xy[j])
+        k = int(np.argmax(d))
+        if d[k] <= floor:
+            continue
+        level = min(float(d[k]), parent)
+        out[i + 1 + k] = level
+        stack.append((i, i + 1 + k, level))
+        stack.append((i + 1 + k, j, level))
+    return out
+
+
+def _encode_polyline(points, precision=5):
+    """(polyline, offset du premier caractère de chaque sommet) ; voir encode_polyline."""
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(pts):
+        return "", np.zeros(1, dtype=np.int64)
+    ints = np.round(pts * 10 ** precision).astype(np.int64)
+    deltas = np.diff(ints, axis=0, prepend=0).ravel()
+    v = ((deltas << 1) ^ (deltas >> 63)).astype(np.uint64)          # zigzag
+    # découpage en blocs de 5 bits, bit 0x20 = « bloc suivant », + 63
+    shifts = np.arange(7, dtype=np.uint64) * np.uint64(5)
+    chunks = (v[:, None] >> shifts) & np.uint64(0x1f)
+    count = 1 + ((v[:, None] >> shifts[1:]) > 0).sum(axis=1)
+    cont = np.arange(7)[None, :] < (count - 1)[:, None]
+    chars = (chunks | (cont.astype(np.uint64) << np.uint64(5))) + np.uint64(63)
+    text = chars[np.arange(7)[None, :] < count[:, None]].astype(np.uint8).tobytes().decode("ascii")
+    offsets = np.concatenate(([0], np.cumsum(count.reshape(-1, 2).sum(axis=1))))
+    return text, offsets
+
+
+def encode_polyline(points, precision=5):
+    """Polyline Google (https://developers.google.com/maps/documentation/utilities/polylinealgorithm)."""
+    return _encode_polyline(points, precision)[0]
+
+
+def decode_polyline(text, precision=5):
+    """Inverse de encode_polyline : [[lat, lon], ...]."""
+    values, v, shift = [], 0, 0
+    for ch in text.encode("ascii"):
+        ch -= 63
+        v |= (ch & 0x1f) << shift
+        shift += 5
+        if ch < 0x20:
+            values.append(~(v >> 1) if v & 1 else v >> 1)
+            v, shift = 0, 0
+    coords = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0)
+    return (coords / 10 ** precision).tolist()
+
+
+# ----------------------------------------------------------------------
+# Tournée préparée
+# ----------------------------------------------------------------------
+class Route:
+    """Une version d'une tournée : sommets, projection, importances, distances cumulées."""
+
+    def __init__(self, data, version):
+        self.data = data
+        self.version = version
+        self.points = np.asarray(data["geometry"], dtype=np.float64).reshape(-1, 2)
+        self.lat0 = float(self.points[:, 0].mean()) if len(self.points) else 0.0
+        self.xy = project(self.points, self.lat0)
+        floor = zoom_tolerance(MAX_ZOOM, self.lat0)
+        self.importance = importance(self.xy, floor) if len(self.points) > 1 else np.full(len(self.points), np.inf)
+        steps = np.hypot(*np.diff(self.xy, axis=0).T) if len(self.points) > 1 else np.zeros(0)
+        self.cumulative = np.concatenate(([0.0], np.cumsum(steps)))
+
+    def locate(self, lat, lon):
+        """
+        (segment, point projeté, distance déjà parcourue en m) de la position
+        du camion : segment le plus proche, le premier en cas d'égalité
+        (tournée repassant par la même rue).
+        """
+        if len(self.points) < 2:
+            return 0, self.points[0] if len(self.points) else np.array([lat, lon]), 0.0
+        p = project([[lat, lon]], self.lat0)[0]
+        a, ab = self.xy[:-1], np.diff(self.xy, axis=0)
+        den = np.maximum((ab * ab).sum(axis=1), 1e-12)
+        t = np.clip(((p - a) * ab).sum(axis=1) / den, 0.0, 1.0)
+        d = np.hypot(*(a + t[:, None] * ab - p).T)
+        seg = int(np.argmax(d <= d.min() + 1e-6))
+        point = self.points[seg] + t[seg] * (self.points[seg + 1] - self.points[seg])
+        return seg, point, float(self.cumulative[seg] + t[seg] * np.sqrt(den[seg]))
+
+    def kept(self, zoom=None):
+        """Indices des sommets conservés au zoom `zoom` (tous si None)."""
+        if zoom is None:
+            return np.arange(len(self.points))
+        return np.flatnonzero(self.importance > zoom_tolerance(zoom, self.lat0))
+
+    def geometry(self, zoom=None, start=None):
+        """Sommets au zoom `zoom` (tous si None), à partir du segment `start` (point projeté en tête)."""
+        index = self.kept(zoom)
+        if start is None:
+            return self.points[index]
+        seg, point, _ = start
+        return np.vstack((point, self.points[index[index > seg]]))
+
+
+# ----------------------------------------------------------------------
+# Service
+# ----------------------------------------------------------------------
+class RouteService:
+    """Tournées `pattern.format(route_id)`, préparées par version, géométries encodées en LRU."""
+
+    def __init__(self, pattern, cache_size=CACHE_SIZE):
+        self.pattern = pattern
+        self.cache_size = cache_size
+        self.routes = {}                 # route_id → Route (dernière version lue)
+        self.shapes = OrderedDict()      # (route_id, version, zoom, encoding, precision) → dict
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def version(self, route_id):
+        """(mtime_ns, taille) du fichier de la tournée, None s'il n'existe pas."""
+        try:
+            st = os.stat(self.pattern.format(route_id))
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def load(self, route_id):
+        version = self.version(route_id)
+        if version is None:
+            return None
+        route = self.routes.get(route_id)
+        if route is None or route.version != version:
+            with open(self.pattern.format(route_id)) as f:
+                route = Route(json.load(f), version)
+            with self.lock:
+                self.routes[route_id] = route
+        return route
+
+    def shape(self, route_id, route, zoom, encoding, precision):
+        """Géométrie simplifiée au zoom et encodée, entière (en cache)."""
+        key = (route_id, route.version, zoom, encoding, precision)
+        with self.lock:
+            cached = self.shapes.get(key)
+            if cached is not None:
+                self.shapes.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        index = route.kept(zoom)
+        points = route.points[index]
+        shape = {"index": index}
+        if encoding == "polyline":
+            shape["polyline"], shape["offsets"] = _encode_polyline(points, precision)
+            shape["points"] = points      # pour réencoder le premier delta après une coupe
+        else:
+            shape["geometry"] = np.round(points, 6).tolist()
+        with self.lock:
+            self.shapes[key] = shape
+            while len(self.shapes) > self.cache_size:
+                self.shapes.popitem(last=False)
+        return shape
+
+    def get(self, route_id, zoom=None, position=None, encoding="geojson", precision=5):
+        """
+        Réponse `/route/{route_id}`, None si la tournée n'existe pas.
+        Sans zoom, position ni encodage : géométrie d'origine (format historique).
+        """
+        route = self.load(route_id)
+        if route is None:
+            return None
+        if zoom is None and position is None and encoding == "geojson":
+            return {"geometry": route.data["geometry"], "distance": route.data["distance"],
+                    "duration": route.data["duration"]}
+
+        if zoom is not None:
+            zoom = int(min(max(zoom, 0), MAX_ZOOM))
+        shape = self.shape(route_id, route, zoom, encoding, precision)
+
+        # devant le camion : point projeté, puis les sommets conservés après son segment
+        start = route.locate(*position) if position is not None else None
+        first = int(np.searchsorted(shape["index"], start[0], side="right")) if start else 0
+        count = len(shape["index"]) - first + (1 if start else 0)
+        out = {"distance": route.data["distance"], "duration": route.data["duration"],
+               "version": f"{route.version[0]:x}-{route.version[1]:x}", "zoom": zoom,
+               "points": count, "total_points": len(route.points),
+               "remaining_m": round(float(route.cumulative[-1] - (start[2] if start else 0.0)), 1),
+               "start": start[1].tolist() if start else None}
+        if encoding == "polyline":
+            text = shape["polyline"]
+            if start:
+                # deltas inchangés après le premier sommet conservé : seul celui-ci
+                # est réencodé, relativement au point projeté
+                head = np.vstack((start[1], shape["points"][first:first + 1]))
+                tail = shape["offsets"][min(first + 1, len(shape["index"]))]
+                text = encode_polyline(head, precision) + text[tail:]
+            out["polyline"], out["precision"] = text, precision
+        else:
+            geometry = shape["geometry"]
+            out["geometry"] = [np.round(start[1], 6).tolist()] + geometry[first:] if start else geometry
+        return out
@@ -1,34 +1,90 @@
 # s3_client.py
+"""
+Client S3/MinIO partagé par toutes les étapes du pipeline.
 
+– Le client boto3 est créé paresseusement au premier accès (`get_s3()` ou
+  `s3clinet.s3`), une seule fois par process, protégé par un verrou :
+  importer ce module ne coûte plus ni import boto3 ni aller-retour réseau.
+– Pool de connexions HTTP réglé (max_pool_connections, retries, keep-alive)
+  pour les threads qui partagent le client.
+– La création des buckets est une étape explicite : `ensure_buckets()`.
+
+Usage :
+    from s3clinet import get_s3, RAW_BUCKET
+    get_s3().put_object(Bucket=RAW_BUCKET, Key=..., Body=...)
+
+    python s3clinet.py      # bootstrap des buckets raw/silver/gold
+"""
 import os
-from botocore.client import Config
-import boto3
+import threading
 
 # --- Configuration S3/MinIO depuis variables d’environnement ---
-S3_ENDPOINT   = os.getenv("S3_ENDPOINT", "http://localhost:9000")
-S3_KEY        = os.getenv("S3_KEY", "minioadmin")
-S3_SECRET     = os.getenv("S3_SECRET", "minioadmin123")
+S3_ENDPOINT   = os.getenv("S3_ENDPOINT", os.getenv("MINIO_ENDPOINT", "http://localhost:9000"))
+S3_KEY        = os.getenv("S3_KEY", os.getenv("MINIO_ACCESS_KEY", "minioadmin"))
+S3_SECRET     = os.getenv("S3_SECRET", os.getenv("MINIO_SECRET_KEY", "minioadmin123"))
+S3_REGION     = os.getenv("S3_REGION", "us-east-1")
 
 RAW_BUCKET    = os.getenv("RAW_BUCKET", "raw")
 SILVER_BUCKET = os.getenv("SILVER_BUCKET", "silver")
 GOLD_BUCKET   = os.getenv("GOLD_BUCKET", "gold")
 
-# --- Client S3 ---
-s3 = boto3.client(
-    's3',
-    endpoint_url=S3_ENDPOINT,
-    aws_access_key_id=S3_KEY,
-    aws_secret_access_key=S3_SECRET,
-    config=Config(signature_version='s3v4'),
-    region_name='us-east-1'
-)
-
-# --- Création des buckets si nécessaire ---
-existing = {b['Name'] for b in s3.list_buckets().get('Buckets', [])}
-
-for bucket in (RAW_BUCKET, SILVER_BUCKET, GOLD_BUCKET):
-    if bucket not in existing:
-        s3.create_bucket(Bucket=bucket)
-        print(f"Bucket créé : {bucket}")
-    else:
-        print(f"Bucket déjà existant : {bucket}")
+# --- Réglages du pool de connexions ---
+S3_MAX_POOL   = int(os.getenv("S3_MAX_POOL", "32"))
+S3_RETRIES    = int(os.getenv("S3_RETRIES", "5"))
+S3_TIMEOUT    = float(os.getenv("S3_TIMEOUT", "10"))
+
+_client = None
+_lock   = threading.Lock()
+
+
+def get_s3():
+    """Client boto3 partagé (thread-safe), créé au premier appel."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import boto3
+                from botocore.client import Config
+                config = Config(
+                    signature_version='s3v4',
+                    max_pool_connections=S3_MAX_POOL,
+                    retries={'max_attempts': S3_RETRIES, 'mode': 'adaptive'},
+                    tcp_keepalive=True,
+                    connect_timeout=S3_TIMEOUT,
+                    read_timeout=S3_TIMEOUT * 3,
+                )
+                # boto3.client() passe par la session par défaut, non thread-safe :
+                # on crée une session dédiée sous verrou
+                session = boto3.session.Session()
+                _client = session.client(
+                    's3',
+                    endpoint_url=S3_ENDPOINT,
+                    aws_access_key_id=S3_KEY,
+                    aws_secret_access_key=S3_SECRET,
+                    config=config,
+                    region_name=S3_REGION
+                )
+    return _client
+
+
+def ensure_buckets(buckets=(RAW_BUCKET, SILVER_BUCKET, GOLD_BUCKET)):
+    """Crée les buckets manquants (bootstrap explicite, une fois)."""
+    s3 = get_s3()
+    existing = {b['Name'] for b in s3.list_buckets().get('Buckets', [])}
+    for bucket in buckets:
+        if bucket not in existing:
+            s3.create_bucket(Bucket=bucket)
+            print(f"Bucket créé : {bucket}")
+        else:
+            print(f"Bucket déjà existant : {bucket}")
+
+
+def __getattr__(name):
+    # compatibilité : `from s3clinet import s3` reste possible, mais paresseux
+    if name == 's3':
+        return get_s3()
+    raise AttributeError(name)
+
+
+if __name__ == '__main__':
+    ensure_buckets()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+its_codec.py
+
+Encodage des CAM / DENM sur MQTT : JSON (historique) ou ASN.1 UPER binaire.
+
+– Schéma : its.asn, schéma réduit propre au projet (structure des JSON de
+  obu.py / rsu.py, bornes des types élémentaires reprises d'ETSI) : ce ne
+  sont pas les modules ASN.1 ETSI, les payloads UPER ne sont lisibles que
+  par ce module. Compilé une seule fois par process, au premier usage, et
+  encodé / décodé par asn1tools.
+– Décodage : les bornes du schéma sont vérifiées ; un payload tronqué ou
+  invalide lève DecodeError quel que soit l'encodage.
+– Encodage choisi par topic (ITS_ENCODING, motifs fnmatch, premier qui
+  correspond ; JSON par défaut) :
+      ITS_ENCODING="rsu/cam/*=uper,vanetza/in/denm=json"
+  Les topics `vanetza/*` restent en JSON tant que le pont vanetza les lit en JSON.
+– UPER ne sert qu'à réduire la taille des payloads (CAM 124 → 18 o, DENM
+  694 → 53 o, bench/bench_its_codec.py) sur les liens où le volume compte ;
+  asn1tools est en Python pur, le parsing est plus coûteux qu'en JSON.
+– `encode(topic, msg)` / `decode(topic, payload)` manipulent toujours les
+  dicts JSON de obu.py / rsu.py (degrés, timestamps ISO ou epoch) ; les
+  conversions vers les unités ETSI (0,1 µdeg, ms depuis 2004) sont ici.
+"""
+import os
+import json
+import fnmatch
+import functools
+from datetime import datetime, timedelta
+
+import asn1tools
+
+SCHEMA      = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'its.asn')
+ENCODING    = os.getenv('ITS_ENCODING', '')
+ENCODINGS   = ('json', 'uper')
+MESSAGE_TYPES = (('*denm*', 'Denm'), ('*cam*', 'Cam'))
+
+ITS_EPOCH   = 1072915200     # 2004-01-01T00:00:00Z en secondes unix
+DEG_SCALE   = 10_000_000     # degrés → 0,1 µdeg
+
+
+class DecodeError(ValueError):
+    """Payload CAM / DENM illisible (JSON invalide, UPER tronqué ou hors bornes)."""
+
+
+# ----------------------------------------------------------------------
+# Schéma compilé (une fois par process)
+# ----------------------------------------------------------------------
+@functools.lru_cache(maxsize=None)
+def spec():
+    return asn1tools.compile_files(SCHEMA, 'uper')
+
+
+# ----------------------------------------------------------------------
+# Choix de l'encodage par topic
+# ----------------------------------------------------------------------
+def parse_rules(text):
+    rules = []
+    for item in filter(None, (p.strip() for p in text.split(','))):
+        pattern, _, encoding = item.partition('=')
+        if encoding not in ENCODINGS:
+            raise ValueError(f"ITS_ENCODING : encodage inconnu {encoding!r} pour {pattern!r}")
+        rules.append((pattern, encoding))
+    return rules
+
+
+RULES = parse_rules(ENCODING)
+
+
+@functools.lru_cache(maxsize=1024)
+def encoding_for(topic):
+    for pattern, encoding in RULES:
+        if fnmatch.fnmatchcase(topic, pattern):
+            return encoding
+    return 'json'
+
+
+@functools.lru_cache(maxsize=1024)
+def message_type(topic):
+    for pattern, name in MESSAGE_TYPES:
+        if fnmatch.fnmatchcase(topic, pattern):
+            return name
+    raise ValueError(f"Pas de type CAM/DENM pour le topic {topic!r}")
+
+
+# ----------------------------------------------------------------------
+# Conversions JSON ↔ unités ETSI
+# ----------------------------------------------------------------------
+def _deg(value):
+    return int(round(value * DEG_SCALE))
+
+
+def _its_from_unix(seconds):
+    return int(round((seconds - ITS_EPOCH) * 1000))
+
+
+def _its_from_iso(text):
+    dt = datetime.fromisoformat(text.rstrip('Z'))
+    return _its_from_unix((dt - datetime(1970, 1, 1)).total_seconds())
+
+
+def _iso_from_its(ms):
+    return (datetime(2004, 1, 1) + timedelta(milliseconds=ms)).isoformat(timespec='milliseconds') + 'Z'
+
+
+def cam_to_asn(cam):
+    out = {'stationID': cam['stationID'],
+           'latitude': _deg(cam['latitude']),
+           'longitude': _deg(cam['longitude'])}
+    if cam.get('timestamp'):
+        out['timestamp'] = _its_from_iso(cam['timestamp'])
+    for key in ('stationType', 'heading', 'speed'):
+        if key in cam:
+            out[key] = cam[key]
+    return out
+
+
+def cam_from_asn(value):
+    cam = dict(value, latitude=value['latitude'] / DEG_SCALE, longitude=value['longitude'] / DEG_SCALE)
+    if 'timestamp' in value:
+        cam['timestamp'] = _iso_from_its(value['timestamp'])
+    return cam
+
+
+def denm_to_asn(denm):
+    m = denm['management']
+    pos = m['eventPosition']
+    position = {'latitude': _deg(pos['latitude']), 'longitude': _deg(pos['longitude'])}
+    for key in ('positionConfidenceEllipse', 'altitude'):
+        if key in pos:
+            position[key] = pos[key]
+    management = {
+        'actionID': m['actionID'],
+        'detectionTime': _its_from_unix(m['detectionTime']),
+        'referenceTime': _its_from_unix(m['referenceTime']),
+        'eventPosition': position,
+        'validityDuration': m['validityDuration'],
+        'stationType': m['stationType'],
+    }
+    if 'eventType' in m:
+        management['eventType'] = {'subCauseCode': m['eventType']['subCauseCode']}
+    out = {'management': management}
+    if 'situation' in denm:
+        s = denm['situation']
+        situation = {'informationQuality': s['informationQuality'], 'eventType': s['eventType']}
+        if 'eventPosition' in s:
+            situation['eventPosition'] = {'latitude': _deg(s['eventPosition']['latitude']),
+                                          'longitude': _deg(s['eventPosition']['longitude'])}
+        if s.get('startTime'):
+            situation['startTime'] = _its_from_iso(s['startTime'])
+        out['situation'] = situation
+    return out
+
+
+def denm_from_asn(value):
+    m = dict(value['management'])
+    m['detectionTime'] = ITS_EPOCH + m['detectionTime'] / 1000
+    m['referenceTime'] = ITS_EPOCH + m['referenceTime'] / 1000
+    pos = dict(m['eventPosition'])
+    pos['latitude'] /= DEG_SCALE
+    pos['longitude'] /= DEG_SCALE
+    m['eventPosition'] = pos
+    out = {'management': m}
+    if 'situation' in value:
+        s = dict(value['situation'])
+        if 'eventPosition' in s:
+            s['eventPosition'] = {'latitude': s['eventPosition']['latitude'] / DEG_SCALE,
+                                  'longitude': s['eventPosition']['longitude'] / DEG_SCALE}
+        if 'startTime' in s:
+            s['startTime'] = _iso_from_its(s['startTime'])
+        out['situation'] = s
+    return out
+
+
+CONVERTERS = {'Cam': (cam_to_asn, cam_from_asn), 'Denm': (denm_to_asn, denm_from_asn)}
+
+
+# ----------------------------------------------------------------------
+# API
+# ----------------------------------------------------------------------
+def encode(topic, msg, encoding=None):
+    """dict JSON → payload MQTT (str JSON ou bytes UPER selon le topic)."""
+    if (encoding or encoding_for(topic)) == 'json':
+        return json.dumps(msg)
+    name = message_type(topic)
+    return spec().encode(name, CONVERTERS[name][0](msg), check_constraints=True)
+
+
+def decode(topic, payload, encoding=None):
+    """payload MQTT → dict JSON (mêmes clés qu'en mode JSON) ; DecodeError si illisible."""
+    if (encoding or encoding_for(topic)) == 'json':
+        try:
+            msg = json.loads(payload)
+        except ValueError as e:   # JSONDecodeError, UnicodeDecodeError
+            raise DecodeError(f"{topic} : JSON invalide ({e})") from None
+        if not isinstance(msg, dict):
+            raise DecodeError(f"{topic} : objet JSON attendu, {type(msg).__name__} reçu")
+        return msg
+    name = message_type(topic)
+    try:
+        value = spec().decode(name, payload, check_constraints=True)
+    except (TypeError, ValueError, asn1tools.Error) as e:
+        raise DecodeError(f"{topic} : {name} UPER illisible ({e})") from None
+    return CONVERTERS[name][1](value)
@@ -25,36 +25,35 @@ Usage :
 import os
 import json
 import time
+import sys
 import math
-import boto3
-from botocore.client import Config
 from datetime import datetime
 import requests
 import paho.mqtt.client as mqtt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from storage import get_storage
+from metrics import publish, received, start_http_server
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import its_codec
+
 # ----------------------------------------------------------------------
 # Configuration MinIO & buckets
 # ----------------------------------------------------------------------
-MINIO_ENDPOINT   = os.getenv('MINIO_ENDPOINT', 'http://localhost:9000')
-MINIO_ACCESS_KEY = os.getenv('MINIO_ACCESS_KEY', 'minioadmin')
-MINIO_SECRET_KEY = os.getenv('MINIO_SECRET_KEY', 'minioadmin123')
-GOLD_BUCKET      = 'gold'
+# (MINIO_ENDPOINT / MINIO_ACCESS_KEY / MINIO_SECRET_KEY lus par s3clinet.py,
+#  STORAGE_URL par storage.py)
+GOLD_BUCKET      = os.getenv('GOLD_BUCKET', 'gold')
 MAPBOX_TOKEN     = os.getenv('MAPBOX_TOKEN', '')  # optionnel
+METRICS_PORT     = int(os.getenv('METRICS_PORT', '9103'))
 
-# Init S3 client
-s3 = boto3.client(
-    's3',
-    endpoint_url=MINIO_ENDPOINT,
-    aws_access_key_id=MINIO_ACCESS_KEY,
-    aws_secret_access_key=MINIO_SECRET_KEY,
-    config=Config(signature_version='s3v4')
-)
+# Stockage Gold : MinIO par défaut, ou file:// / mem:// via STORAGE_URL
+store = get_storage()
 
 # ----------------------------------------------------------------------
 # Charger positions capteurs depuis Gold
 # ----------------------------------------------------------------------
-obj = s3.get_object(Bucket=GOLD_BUCKET, Key='sensor/sensor_position.json')
-sensor_positions = json.loads(obj['Body'].read())['positions']
+sensor_positions = json.loads(store.get_bytes(GOLD_BUCKET, 'sensor/sensor_position.json'))['positions']
 
 # Définir nombre de camions selon dispo
 TRUCK_COUNT = min(20, len(sensor_positions))
@@ -74,8 +73,6 @@ need_recalc     = [False] * TRUCK_COUNT
 # MQTT client pour publication CAM
 # ----------------------------------------------------------------------
 cam_client = mqtt.Client()
-cam_client.connect('127.0.0.1', 18830, 60)
-cam_client.loop_start()
 
 # ----------------------------------------------------------------------
 # Fonction de routage (Mapbox ou fallback)
@@ -103,7 +100,12 @@ def on_connect(client, userdata, flags, rc):
 
 
 def on_message(client, userdata, msg):
-    m = json.loads(msg.payload.decode())
+    received(msg.topic, msg.payload)
+    try:
+        m = its_codec.decode(msg.topic, msg.payload)
+    except its_codec.DecodeError as e:
+        print(f"⚠️ DENM illisible : {e}")
+        return
     sub = m.get('management', {}).get('eventType', {}).get('subCauseCode')
     if not isinstance(sub, int) or not (1 <= sub <= TRUCK_COUNT):
         return
@@ -120,42 +122,51 @@ def on_message(client, userdata, msg):
 sub_client = mqtt.Client()
 sub_client.on_connect  = on_connect
 sub_client.on_message  = on_message
-sub_client.connect('127.0.0.1', 18830, 60)
-sub_client.loop_start()
 
 # ----------------------------------------------------------------------
 # Boucle principale d'émission CAM
 # ----------------------------------------------------------------------
-print(f"Starting OBU loop with {TRUCK_COUNT} trucks...")
-while True:
-    for idx in range(TRUCK_COUNT):
-        home   = HOME_TRUCKS[idx]
-        queue  = queue_trucks[idx]
-        route  = current_routes[idx]
-
-        # recalcul route si demandé ou route vide
-        if need_recalc[idx] or not route:
-            if queue:
-                route = draw_route(queue)
-                current_routes[idx] = route
-            need_recalc[idx] = False
-
-        # choisir waypoint courant
-        if route:
-            waypoint = route.pop(0)
-            if not route:
-                queue_trucks[idx] = []
-        else:
-            waypoint = home
-
-        # construire CAM
-        cam = {
-            'stationID': idx+1,
-            'latitude' : waypoint[0],
-            'longitude': waypoint[1],
-            'timestamp': datetime.utcnow().isoformat() + 'Z'
-        }
-        cam_client.publish('vanetza/in/cam', json.dumps(cam))
-        time.sleep(0.2)
-
-    time.sleep(1)
+def main():
+    start_http_server(METRICS_PORT)
+    cam_client.connect('127.0.0.1', 18830, 60)
+    cam_client.loop_start()
+    sub_client.connect('127.0.0.1', 18830, 60)
+    sub_client.loop_start()
+
+    print(f"Starting OBU loop with {TRUCK_COUNT} trucks...")
+    while True:
+        for idx in range(TRUCK_COUNT):
+            home   = HOME_TRUCKS[idx]
+            queue  = queue_trucks[idx]
+            route  = current_routes[idx]
+
+            # recalcul route si demandé ou route vide
+            if need_recalc[idx] or not route:
+                if queue:
+                    route = draw_route(queue)
+                    current_routes[idx] = route
+                need_recalc[idx] = False
+
+            # choisir waypoint courant
+            if route:
+                waypoint = route.pop(0)
+                if not route:
+                    queue_trucks[idx] = []
+            else:
+                waypoint = home
+
+            # construire CAM
+            cam = {
+                'stationID': idx+1,
+                'latitude' : waypoint[0],
+                'longitude': waypoint[1],
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
+            }
+            publish(cam_client, 'vanetza/in/cam', its_codec.encode('vanetza/in/cam', cam))
+            time.sleep(0.2)
+
+        time.sleep(1)
+
+
+if __name__ == '__main__':
+    main()
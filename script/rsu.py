@@ -12,43 +12,56 @@ génère les alertes DENM vers OBU en MQTT pour N camions.
  3. Définir `TRUCK_COUNT` en fonction du nombre de positions des camions
  4. Initialiser les structures dynamiques pour N camions
  5. Souscrire aux CAM (`vanetza/out/cam`) pour mettre à jour les positions des camions
- 6. Boucle principale : lire `sensor_data.txt`, pour chaque capteur au-dessus du seuil,
-    générer un DENM en choisissant le camion le plus proche et publier MQTT
-    puis remettre à zéro la ligne dans `sensor_data.txt` et réécrire dans GOLD
+ 6. Boucle principale : lire `sensor_data.txt`, pour chaque capteur au-dessus du seuil
+    et pas encore dispatché, générer un DENM en choisissant le camion le plus proche
+    et publier MQTT ; le capteur redevient dispatchable quand son niveau repasse
+    sous le seuil
+
+État durable (voir rsu_state.py) : positions capteurs, positions camions
+et instant de leur dernier CAM, compteurs d'assignation et capteurs dispatchés sont journalisés dans
+RSU_STATE_DIR (snapshot recopié dans GOLD sous RSU_STATE_KEY). Au redémarrage
+l'état est rechargé en quelques ms, sans attendre GOLD ni de nouveaux CAM ;
+les positions capteurs sont rafraîchies en tâche de fond.
 
 Usage :
     export MINIO_ENDPOINT=http://localhost:9000
     export MINIO_ACCESS_KEY=minioadmin
     export MINIO_SECRET_KEY=minioadmin123
+    export MQTT_HOST=127.0.0.1 MQTT_PORT=18830   # optionnel
     pip install boto3 paho-mqtt
     python rsu.py
+
+Le module est importable (benchmarks) : `init_state()` puis `dispatch_cycle()`
+(sans journal tant que `journal` vaut None).
 """
 import os
 import json
 import time
 import math
+import sys
 import threading
-import boto3
-from botocore.client import Config
 import paho.mqtt.client as mqtt
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from storage import get_storage
+from metrics import DENM_SECONDS, publish, received, start_http_server
+from rsu_state import StateJournal
+import its_codec
+
 # ----------------------------------------------------------------------
 # Configuration MinIO via variables d'environnement
 # ----------------------------------------------------------------------
-MINIO_ENDPOINT   = os.getenv('MINIO_ENDPOINT', 'http://localhost:9000')
-MINIO_ACCESS_KEY = os.getenv('MINIO_ACCESS_KEY', 'minioadmin')
-MINIO_SECRET_KEY = os.getenv('MINIO_SECRET_KEY', 'minioadmin123')
-GOLD_BUCKET      = 'gold'
-
-# Init S3 client
-s3 = boto3.client(
-    's3',
-    endpoint_url=MINIO_ENDPOINT,
-    aws_access_key_id=MINIO_ACCESS_KEY,
-    aws_secret_access_key=MINIO_SECRET_KEY,
-    config=Config(signature_version='s3v4')
-)
+# (MINIO_ENDPOINT / MINIO_ACCESS_KEY / MINIO_SECRET_KEY lus par s3clinet.py,
+#  STORAGE_URL par storage.py)
+GOLD_BUCKET      = os.getenv('GOLD_BUCKET', 'gold')
+
+MQTT_HOST        = os.getenv('MQTT_HOST', '127.0.0.1')
+MQTT_PORT        = int(os.getenv('MQTT_PORT', '18830'))
+METRICS_PORT     = int(os.getenv('METRICS_PORT', '9102'))
+DENM_TEMPLATE    = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'in_denm.json')
+RSU_STATE_DIR    = os.getenv('RSU_STATE_DIR', 'rsu_state')
+RSU_STATE_KEY    = os.getenv('RSU_STATE_KEY', 'rsu/state/snapshot.json')  # '' : pas de copie GOLD
 
 # ----------------------------------------------------------------------
 # Seuils métier
@@ -57,23 +70,95 @@ WARNING_THRESHOLD = 0.70  # 70% fill triggers DENM
 MAX_ASSIGN_RATIO  = 0.75  # max assignments per truck (ratio of total assignments)
 
 # ----------------------------------------------------------------------
-# Charger positions capteurs depuis GOLD_BUCKET
+# Structures dynamiques pour N camions (remplies par init_state)
 # ----------------------------------------------------------------------
-obj = s3.get_object(Bucket=GOLD_BUCKET, Key='sensor/sensor_position.json')
-sensor_positions = json.loads(obj['Body'].read())['positions']
+sensor_positions   = []
+TRUCK_COUNT        = 0
+truck_positions    = []
+truck_seen         = []      # instant (time.time) du dernier CAM par camion, None = jamais
+truck_assign_count = []
+total_assigned     = 0
+dispatched         = set()   # capteurs dispatchés, en attente de vidage
+handoffs           = {}      # capteur confié à un autre shard → [shard, instant] (rsu_shard.py)
+journal            = None    # StateJournal (main) ; None = état en mémoire seulement
 
-# ----------------------------------------------------------------------
-# Définir nombre de camions
-# ----------------------------------------------------------------------
-# Typiquement, TRUCK_COUNT correspond au nombre de positions capteurs que vous voulez gérer
-TRUCK_COUNT = len(sensor_positions)
+with open(DENM_TEMPLATE) as f:
+    DENM_TPL = f.read()
+
+
+def load_sensor_positions(store):
+    """Positions capteurs depuis GOLD_BUCKET."""
+    return json.loads(store.get_bytes(GOLD_BUCKET, 'sensor/sensor_position.json'))['positions']
+
+
+def init_state(positions, truck_count=None):
+    """Initialise capteurs et camions (TRUCK_COUNT = nb positions par défaut)."""
+    global sensor_positions, TRUCK_COUNT, truck_positions, truck_seen, truck_assign_count, total_assigned
+    sensor_positions = positions
+    # Typiquement, TRUCK_COUNT correspond au nombre de positions capteurs que vous voulez gérer
+    TRUCK_COUNT = truck_count if truck_count is not None else len(positions)
+    truck_positions    = [ [None, None] for _ in range(TRUCK_COUNT) ]
+    truck_seen         = [None] * TRUCK_COUNT
+    truck_assign_count = [0] * TRUCK_COUNT
+    total_assigned     = 0
+    dispatched.clear()
+    handoffs.clear()
 
 # ----------------------------------------------------------------------
-# Initialiser structures dynamiques pour N camions
+# État durable (rsu_state.py)
 # ----------------------------------------------------------------------
-truck_positions    = [ [None, None] for _ in range(TRUCK_COUNT) ]
-truck_assign_count = [0] * TRUCK_COUNT
-total_assigned     = 0
+def current_state():
+    return {
+        'positions': sensor_positions,
+        'truck_positions': truck_positions,
+        'truck_seen': truck_seen,
+        'truck_assign_count': truck_assign_count,
+        'total_assigned': total_assigned,
+        'dispatched': sorted(dispatched),
+        'handoffs': sorted([s, owner, at] for s, (owner, at) in handoffs.items()),
+    }
+
+
+def restore_state(state):
+    """Recharge l'état d'un snapshot + journal (camions chauds, compteurs, dispatchs)."""
+    global sensor_positions, TRUCK_COUNT, truck_positions, truck_seen, truck_assign_count, total_assigned
+    sensor_positions   = state['positions']
+    truck_positions    = state['truck_positions']
+    truck_assign_count = state['truck_assign_count']
+    TRUCK_COUNT        = len(truck_positions)
+    truck_seen         = state.get('truck_seen') or [None] * TRUCK_COUNT
+    total_assigned     = state['total_assigned']
+    dispatched.clear()
+    dispatched.update(state['dispatched'])
+    handoffs.clear()
+    handoffs.update({s: [owner, at] for s, owner, at in state.get('handoffs', [])})
+
+
+def record(op, sync=False):
+    # appelé *après* la mise à jour de l'état en mémoire (voir StateJournal.snapshot)
+    if journal is not None:
+        journal.append(op, sync)
+
+
+def update_truck(truck, lat, lon):
+    """Position et instant du dernier CAM d'un camion, journalisés."""
+    now = time.time()
+    truck_positions[truck] = [lat, lon]
+    truck_seen[truck] = now
+    record({'op': 'cam', 'truck': truck, 'lat': lat, 'lon': lon, 'at': now})
+
+
+def refresh_sensor_positions(store):
+    """Positions capteurs depuis GOLD, sans bloquer le démarrage."""
+    global sensor_positions
+    try:
+        positions = load_sensor_positions(store)
+    except Exception as e:
+        print(f"⚠️ sensor_position.json indisponible, positions en cache conservées : {e}")
+        return
+    if positions != sensor_positions:
+        sensor_positions = positions
+        record({'op': 'positions', 'positions': positions})
 
 # ----------------------------------------------------------------------
 # MQTT callbacks pour CAM from OBU
@@ -83,12 +168,13 @@ def on_connect(client, userdata, flags, rc):
     client.subscribe("vanetza/out/cam")
 
 
-def on_message(client, userdata, msg):
-    payload = json.loads(msg.payload.decode())
+def cam_position(payload, truck_count=None):
+    """(stationID, lat, lon) d'un CAM décodé, ou None s'il est invalide."""
+    truck_count = TRUCK_COUNT if truck_count is None else truck_count
     station = payload.get('stationID')
-    if not isinstance(station, int) or not (1 <= station <= TRUCK_COUNT):
+    if not isinstance(station, int) or not (1 <= station <= truck_count):
         print("⚠️ CAM invalide, stationID manquant ou hors limites", station)
-        return
+        return None
     # extraction coords robuste
     if 'positionVector' in payload:
         lat = payload['positionVector'].get('latitude')
@@ -98,68 +184,146 @@ def on_message(client, userdata, msg):
         lon = payload.get('longitude')
     if lat is None or lon is None:
         print("⚠️ Coordonnées manquantes dans CAM", payload.keys())
+        return None
+    return station, lat, lon
+
+
+def on_message(client, userdata, msg):
+    received(msg.topic, msg.payload)
+    try:
+        cam = cam_position(its_codec.decode(msg.topic, msg.payload))
+    except its_codec.DecodeError as e:
+        print(f"⚠️ CAM illisible : {e}")
+        return
+    if cam is None:
         return
-    truck_positions[station-1] = [lat, lon]
+    station, lat, lon = cam
+    update_truck(station - 1, lat, lon)
     print(f"CAM reçu → Truck #{station} @ ({lat:.6f},{lon:.6f})")
 
 # ----------------------------------------------------------------------------
 # Génération du DENM
 # ----------------------------------------------------------------------------
 def generate_denm(sensor_idx, lat, lon, client):
-    global total_assigned
-    tpl = json.load(open('in_denm.json'))
-    tpl['management']['actionID']['originatingStationID'] = sensor_idx + 1
-    tpl['situation']['eventType']['causeCode'] = 50
-    tpl['situation']['eventPosition'] = {'latitude': lat, 'longitude': lon}
-    tpl['situation']['startTime'] = datetime.utcnow().isoformat() + 'Z'
+    with DENM_SECONDS.time():
+        return _generate_denm(sensor_idx, lat, lon, client)
+
 
-    # choisir camion le plus proche et disponible
+def nearest_truck(lat, lon, candidates=None):
+    """Camion le plus proche et disponible (parmi `candidates` si fourni), ou None."""
     nearest, min_dist = None, float('inf')
-    for idx, pos in enumerate(truck_positions):
+    for idx in (range(len(truck_positions)) if candidates is None else candidates):
+        pos = truck_positions[idx]
         if None in pos: continue
         if truck_assign_count[idx] > total_assigned * MAX_ASSIGN_RATIO: continue
         d = math.dist((lat, lon), tuple(pos))
         if d < min_dist:
             min_dist, nearest = d, idx
+    return nearest
+
+
+def _generate_denm(sensor_idx, lat, lon, client):
+    nearest = nearest_truck(lat, lon)
     if nearest is None:
         return False
-    tpl['management']['eventType']['subCauseCode'] = nearest + 1
-    truck_assign_count[nearest] += 1
-    total_assigned += 1
-    client.publish("vanetza/in/denm", json.dumps(tpl))
-    print(f"DENM généré pour capteur #{sensor_idx+1}, assigné Truck #{nearest+1}")
+    dispatched.add(sensor_idx)
+    send_denm(sensor_idx, lat, lon, nearest, client)
     return True
 
-# ----------------------------------------------------------------------------
-# Start MQTT client for CAM
-# ----------------------------------------------------------------------------
-client = mqtt.Client()
-client.on_connect = on_connect
-client.on_message = on_message
-client.connect('127.0.0.1', 18830, 60)
-threading.Thread(target=client.loop_forever, daemon=True).start()
+
+def send_denm(sensor_idx, lat, lon, truck, client, local=True):
+    """
+    Publie le DENM du capteur vers `truck`. `local=False` : capteur d'un autre
+    shard (rsu_shard.py), il n'entre pas dans `dispatched` de ce process.
+    """
+    global total_assigned
+    tpl = json.loads(DENM_TPL)
+    tpl['management']['actionID']['originatingStationID'] = sensor_idx + 1
+    tpl['situation']['eventType']['causeCode'] = 50
+    tpl['situation']['eventPosition'] = {'latitude': lat, 'longitude': lon}
+    tpl['situation']['startTime'] = datetime.utcnow().isoformat() + 'Z'
+
+    # in_denm.json n'a pas de management.eventType : c'est là que l'OBU lit le camion
+    tpl['management'].setdefault('eventType', {})['subCauseCode'] = truck + 1
+    truck_assign_count[truck] += 1
+    total_assigned += 1
+    # sur disque avant publication : après un crash, pas de second DENM pour ce capteur
+    record({'op': 'assign', 'sensor': sensor_idx if local else None, 'truck': truck,
+            'count': truck_assign_count[truck], 'total': total_assigned}, sync=True)
+    publish(client, "vanetza/in/denm", its_codec.encode("vanetza/in/denm", tpl))
+    print(f"DENM généré pour capteur #{sensor_idx+1}, assigné Truck #{truck+1}")
 
 # ----------------------------------------------------------------------------
-# Boucle principale : lecture et traitement des prédictions
+# Un passage sur les prédictions
 # ----------------------------------------------------------------------------
-print(f"RSU démarré pour {TRUCK_COUNT} trucks, seuil DENM={WARNING_THRESHOLD*100}%")
-while True:
-    obj = s3.get_object(Bucket=GOLD_BUCKET, Key='sensor/sensor_data.txt')
-    lines = obj['Body'].read().decode('utf-8').splitlines()
-    for idx, fill_str in enumerate(lines):
-        fill = int(fill_str)
+def dispatch_cycle(lines, client, pause=0.0, sensors=None, generate=None):
+    """
+    Traite une lecture de `sensor_data.txt` : DENM pour chaque capteur au-dessus
+    du seuil qui n'est pas déjà dispatché ; un capteur dispatché est libéré
+    quand son niveau repasse sous le seuil (poubelle vidée).
+    `sensors` : indices à traiter (shard), tous par défaut ; `generate` remplace
+    `generate_denm`. Retourne le nombre de DENM publiés.
+    """
+    generate = generate or generate_denm
+    sent = 0
+    for idx in (range(len(lines)) if sensors is None else sensors):
+        fill = int(lines[idx])
         pct = fill / 100.0
-        if pct > WARNING_THRESHOLD:
-            lat, lon = sensor_positions[idx]
-            if generate_denm(idx, lat, lon, client):
-                lines[idx] = '0'
-                s3.put_object(
-                    Bucket=GOLD_BUCKET,
-                    Key='sensor/sensor_data.txt',
-                    Body='\n'.join(lines).encode('utf-8'),
-                    ContentType='text/plain'
-                )
-            else:
-                print(f"Aucun truck dispo pour capteur #{idx+1}")
-            time.sleep(0.3)
-    time.sleep(1)
+        if pct <= WARNING_THRESHOLD:
+            if idx in dispatched:
+                dispatched.discard(idx)
+                handoffs.pop(idx, None)
+                record({'op': 'clear', 'sensor': idx})
+            continue
+        if idx in dispatched:
+            continue
+        lat, lon = sensor_positions[idx]
+        if generate(idx, lat, lon, client):
+            sent += 1
+        else:
+            print(f"Aucun truck dispo pour capteur #{idx+1}")
+        if pause:
+            time.sleep(pause)
+    return sent
+
+
+def main():
+    global journal
+    start_http_server(METRICS_PORT)
+    store = get_storage()
+    journal = StateJournal(RSU_STATE_DIR,
+                           mirror=(store, GOLD_BUCKET, RSU_STATE_KEY) if RSU_STATE_KEY else None)
+    t0 = time.perf_counter()
+    state = journal.load()
+    if state is not None:
+        restore_state(state)
+        threading.Thread(target=refresh_sensor_positions, args=(store,), daemon=True).start()
+        print(f"État RSU rechargé en {(time.perf_counter() - t0) * 1000:.1f} ms "
+              f"({len(dispatched)} capteurs dispatchés, {total_assigned} DENM)")
+    else:
+        init_state(load_sensor_positions(store))
+        journal.snapshot(current_state)
+
+    # Start MQTT client for CAM
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(MQTT_HOST, MQTT_PORT, 60)
+    threading.Thread(target=client.loop_forever, daemon=True).start()
+
+    # Boucle principale : lecture et traitement des prédictions
+    print(f"RSU démarré pour {TRUCK_COUNT} trucks, seuil DENM={WARNING_THRESHOLD*100}%")
+    try:
+        while True:
+            lines = store.get_bytes(GOLD_BUCKET, 'sensor/sensor_data.txt').decode('utf-8').splitlines()
+            dispatch_cycle(lines, client, pause=0.3)
+            if journal.due():
+                journal.snapshot(current_state)
+            time.sleep(1)
+    except KeyboardInterrupt:
+        journal.snapshot(current_state)
+        journal.close()
+
+
+if __name__ == '__main__':
+    main()
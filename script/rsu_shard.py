@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+rsu_shard.py
+
+Dispatch RSU partitionné géographiquement, un process par shard.
+
+– Grille lat/lon de pas `--cell-size` degrés (0.01° ≈ 1.1 km × 0.7 km à Paris) :
+  les cellules sont parcourues ligne par ligne et découpées en `--shards`
+  bandes contiguës de même nombre de capteurs (ShardPlan).
+– Routeur : s'abonne à `vanetza/out/cam` et republie chaque CAM sur
+  `rsu/cam/<cellule>` (cellule de la position du camion).
+– Worker k : process indépendant (état rsu.py propre, journal
+  RSU_STATE_DIR/shard-k), abonné aux CAM de ses cellules et d'une bordure
+  de `--halo` cellules autour ; il ne traite que les capteurs de ses cellules.
+– Bordure : si le camion le plus proche d'un capteur est dans un autre shard,
+  la demande est confiée à ce shard (`rsu/handoff/<shard>`), qui choisit parmi
+  ses propres camions et publie le DENM ; sans camion disponible il renvoie un
+  refus, et le capteur redevient dispatchable chez son shard d'origine, qui
+  pendant RSU_TRUCK_TTL s ne le confie plus à personne et le sert avec ses
+  propres camions (pas de ping-pong vers le camion de la bordure). Le shard
+  du camion acquitte chaque DENM publié ; un handoff sans réponse après
+  RSU_HANDOFF_TIMEOUT s est traité comme un refus (le capteur ne reste pas
+  dispatché indéfiniment). Les handoffs en attente sont journalisés.
+– Un payload de handoff illisible est journalisé puis ignoré.
+– Fraîcheur des camions : instant du dernier CAM (`rsu.truck_seen`, horloge
+  murale), journalisé et inclus dans le snapshot, conservé au redémarrage.
+
+Usage :
+    python rsu_shard.py --shards 4 [--cell-size 0.01] [--halo 1]
+"""
+import os
+import sys
+import json
+import math
+import time
+import threading
+import multiprocessing as mp
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import rsu
+from rsu_state import StateJournal
+import its_codec
+from metrics import publish, received, start_http_server
+
+CAM_IN_TOPIC   = "vanetza/out/cam"
+CAM_TOPIC      = "rsu/cam/"
+HANDOFF_TOPIC  = "rsu/handoff/"
+DEFAULT_CELL   = 0.01   # degrés
+DEFAULT_HALO   = 1      # cellules
+TRUCK_TTL      = float(os.getenv('RSU_TRUCK_TTL', '30'))  # s sans CAM → camion ignoré
+HANDOFF_TIMEOUT = float(os.getenv('RSU_HANDOFF_TIMEOUT', '10'))  # s sans ack / nack → refus
+
+
+# ----------------------------------------------------------------------
+# Partition
+# ----------------------------------------------------------------------
+class ShardPlan:
+    """Cellules de grille → shard, en bandes contiguës équilibrées en capteurs."""
+
+    def __init__(self, positions, shards, cell_size=DEFAULT_CELL):
+        self.shards = shards
+        self.cell_size = cell_size
+        cells = [self.cell(lat, lon) for lat, lon in positions]
+        rows = [c[0] for c in cells]
+        cols = [c[1] for c in cells]
+        self.row_min, self.row_max = min(rows), max(rows)
+        self.col_min, self.col_max = min(cols), max(cols)
+
+        # parcours ligne par ligne, coupure tous les len(positions) / shards capteurs
+        counts = defaultdict(int)
+        for c in cells:
+            counts[c] += 1
+        self.owner = {}
+        seen, per_shard = 0, len(positions) / shards
+        for row in range(self.row_min, self.row_max + 1):
+            for col in range(self.col_min, self.col_max + 1):
+                self.owner[(row, col)] = min(int(seen / per_shard), shards - 1)
+                seen += counts.get((row, col), 0)
+
+        self.sensors = [[] for _ in range(shards)]
+        for idx, c in enumerate(cells):
+            self.sensors[self.owner[c]].append(idx)
+
+    def cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def clamp(self, cell):
+        # hors de l'emprise des capteurs : cellule de bord la plus proche
+        return (min(max(cell[0], self.row_min), self.row_max),
+                min(max(cell[1], self.col_min), self.col_max))
+
+    def shard_of(self, lat, lon):
+        return self.owner[self.clamp(self.cell(lat, lon))]
+
+    @staticmethod
+    def cell_name(cell):
+        return f"{cell[0]}_{cell[1]}"
+
+    def cells_of(self, shard, halo=0):
+        """Cellules du shard, élargies de `halo` cellules (bordure des voisins)."""
+        own = [c for c, s in self.owner.items() if s == shard]
+        out = set()
+        for row, col in own:
+            for dr in range(-halo, halo + 1):
+                for dc in range(-halo, halo + 1):
+                    out.add(self.clamp((row + dr, col + dc)))
+        return sorted(out)
+
+
+# ----------------------------------------------------------------------
+# Routeur de CAM
+# ----------------------------------------------------------------------
+def route_cam(plan, payload):
+    """(topic `rsu/cam/<cellule>`, payload) d'un CAM, ou None s'il est invalide."""
+    try:
+        msg = its_codec.decode(CAM_IN_TOPIC, payload)
+    except its_codec.DecodeError as e:
+        print(f"⚠️ CAM illisible : {e}")
+        return None
+    cam = rsu.cam_position(msg, truck_count=sys.maxsize)
+    if cam is None:
+        return None
+    _, lat, lon = cam
+    topic = CAM_TOPIC + plan.cell_name(plan.clamp(plan.cell(lat, lon)))
+    # ré-encodé seulement si les deux topics n'ont pas le même encodage
+    if its_codec.encoding_for(topic) != its_codec.encoding_for(CAM_IN_TOPIC):
+        payload = its_codec.encode(topic, msg)
+    return topic, payload
+
+
+def run_router(plan, host, port):
+    import paho.mqtt.client as mqtt
+
+    def on_connect(client, userdata, flags, rc):
+        print(f"Routeur CAM connecté (rc={rc}), {len(plan.owner)} cellules")
+        client.subscribe(CAM_IN_TOPIC)
+
+    def on_message(client, userdata, msg):
+        received(msg.topic, msg.payload)
+        routed = route_cam(plan, msg.payload)
+        if routed:
+            publish(client, *routed)
+
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(host, port, 60)
+    client.loop_forever()
+
+
+# ----------------------------------------------------------------------
+# Worker
+# ----------------------------------------------------------------------
+class ShardWorker:
+    """Dispatch des capteurs d'un shard, sur l'état rsu.py du process."""
+
+    def __init__(self, plan, shard):
+        self.plan = plan
+        self.shard = shard
+        self.sensors = plan.sensors[shard]
+        self.refused = {}     # capteur → {shard: instant du refus}
+        self.handoffs = 0
+        # handoffs (thread MQTT) et dispatch (boucle principale) modifient les mêmes compteurs
+        self.lock = threading.Lock()
+
+    def topics(self, halo=DEFAULT_HALO):
+        cams = [CAM_TOPIC + ShardPlan.cell_name(c) for c in self.plan.cells_of(self.shard, halo)]
+        return cams + [HANDOFF_TOPIC + str(self.shard)]
+
+    def fresh_trucks(self):
+        now = time.time()
+        return [t for t, seen in enumerate(rsu.truck_seen) if seen is not None and now - seen <= TRUCK_TTL]
+
+    def own_trucks(self):
+        return [t for t in self.fresh_trucks()
+                if self.plan.shard_of(*rsu.truck_positions[t]) == self.shard]
+
+    # CAM / handoff -----------------------------------------------------
+    def on_cam(self, topic, payload):
+        try:
+            cam = rsu.cam_position(its_codec.decode(topic, payload))
+        except its_codec.DecodeError as e:
+            print(f"⚠️ CAM illisible : {e}")
+            return
+        if cam is None:
+            return
+        station, lat, lon = cam
+        rsu.update_truck(station - 1, lat, lon)
+
+    def on_handoff(self, request, client):
+        with self.lock:
+            self._on_handoff(request, client)
+
+    def _on_handoff(self, request, client):
+        sensor, origin = request['sensor'], request['from']
+        if request['op'] == 'ack':
+            if rsu.handoffs.pop(sensor, None) is not None:
+                rsu.record({'op': 'ack', 'sensor': sensor})
+            return
+        if request['op'] == 'nack':
+            self._release(sensor, origin)
+            return
+        truck = rsu.nearest_truck(request['lat'], request['lon'], self.own_trucks())
+        reply = 'nack' if truck is None else 'ack'
+        if truck is not None:
+            rsu.send_denm(sensor, request['lat'], request['lon'], truck, client, local=False)
+        publish(client, HANDOFF_TOPIC + str(origin),
+                json.dumps({'op': reply, 'sensor': sensor, 'from': self.shard}))
+
+    def _release(self, sensor, shard):
+        # refusé (ou sans réponse) : redevient dispatchable au prochain cycle,
+        # sur les camions locaux (voir candidates)
+        rsu.dispatched.discard(sensor)
+        rsu.handoffs.pop(sensor, None)
+        rsu.record({'op': 'clear', 'sensor': sensor})
+        self.refused.setdefault(sensor, {})[shard] = time.time()
+
+    def expire_handoffs(self):
+        """Handoffs sans ack / nack depuis HANDOFF_TIMEOUT s : traités comme un refus."""
+        now = time.time()
+        with self.lock:
+            for sensor, (owner, at) in list(rsu.handoffs.items()):
+                if now - at > HANDOFF_TIMEOUT:
+                    print(f"⚠️ Handoff du capteur #{sensor+1} vers le shard {owner} sans réponse")
+                    self._release(sensor, owner)
+
+    def on_message(self, client, userdata, msg):
+        received(msg.topic, msg.payload)
+        if msg.topic.startswith(HANDOFF_TOPIC):
+            # thread réseau paho : une exception ici arrêterait la boucle
+            try:
+                request = json.loads(msg.payload.decode())
+                self.on_handoff(request, client)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"⚠️ Handoff illisible ignoré sur {msg.topic} : {e!r}")
+        else:
+            self.on_cam(msg.topic, msg.payload)
+
+    # Dispatch ------------------------------------------------------------
+    def generate(self, sensor_idx, lat, lon, client):
+        with self.lock:
+            return self._generate(sensor_idx, lat, lon, client)
+
+    def candidates(self, sensor_idx):
+        """Camions frais ; seulement les locaux si un autre shard a refusé ce capteur récemment."""
+        refused = self.refused.get(sensor_idx)
+        if refused:
+            now = time.time()
+            if any(now - at <= TRUCK_TTL for at in refused.values()):
+                return self.own_trucks()
+            del self.refused[sensor_idx]
+        return self.fresh_trucks()
+
+    def _generate(self, sensor_idx, lat, lon, client):
+        truck = rsu.nearest_truck(lat, lon, self.candidates(sensor_idx))
+        if truck is None:
+            return False
+        owner = self.plan.shard_of(*rsu.truck_positions[truck])
+        rsu.dispatched.add(sensor_idx)
+        if owner == self.shard:
+            self.refused.pop(sensor_idx, None)
+            rsu.send_denm(sensor_idx, lat, lon, truck, client)
+            return True
+        # camion de l'autre côté de la frontière : le shard propriétaire décide
+        now = time.time()
+        rsu.handoffs[sensor_idx] = [owner, now]
+        rsu.record({'op': 'handoff', 'sensor': sensor_idx, 'owner': owner, 'at': now}, sync=True)
+        publish(client, HANDOFF_TOPIC + str(owner),
+                json.dumps({'op': 'assign', 'sensor': sensor_idx, 'lat': lat, 'lon': lon,
+                            'from': self.shard}))
+        self.handoffs += 1
+        return True
+
+    def cycle(self, lines, client, pause=0.0):
+        self.expire_handoffs()
+        return rsu.dispatch_cycle(lines, client, pause, sensors=self.sensors, generate=self.generate)
+
+
+def run_worker(plan, shard, host, port, halo, state_dir, metrics_port):
+    import paho.mqtt.client as mqtt
+
+    start_http_server(metrics_port)
+    store = rsu.get_storage()
+    key = f"rsu/state/shard-{shard}.json" if rsu.RSU_STATE_KEY else ''
+    rsu.journal = StateJournal(os.path.join(state_dir, f"shard-{shard}"),
+                               mirror=(store, rsu.GOLD_BUCKET, key) if key else None)
+    state = rsu.journal.load()
+    if state is not None:
+        rsu.restore_state(state)
+    else:
+        rsu.init_state(rsu.load_sensor_positions(store))
+        rsu.journal.snapshot(rsu.current_state)
+    worker = ShardWorker(plan, shard)
+
+    client = mqtt.Client()
+    client.on_connect = lambda c, u, f, rc: [c.subscribe(t) for t in worker.topics(halo)]
+    client.on_message = worker.on_message
+    client.connect(host, port, 60)
+    threading.Thread(target=client.loop_forever, daemon=True).start()
+
+    print(f"Shard {shard} : {len(worker.sensors)} capteurs, "
+          f"{len(plan.cells_of(shard))} cellules (+ bordure {halo})")
+    while True:
+        lines = store.get_bytes(rsu.GOLD_BUCKET, 'sensor/sensor_data.txt').decode('utf-8').splitlines()
+        worker.cycle(lines, client, pause=0.3)
+        if rsu.journal.due():
+            # handoffs (thread MQTT) : pas de mutation entre l'état lu et le seq
+            with worker.lock:
+                rsu.journal.snapshot(rsu.current_state)
+        time.sleep(1)
+
+
+# ----------------------------------------------------------------------
+# Main
+# ----------------------------------------------------------------------
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shards', type=int, default=os.cpu_count())
+    parser.add_argument('--cell-size', type=float, default=DEFAULT_CELL)
+    parser.add_argument('--halo', type=int, default=DEFAULT_HALO)
+    parser.add_argument('--mqtt-host', default=rsu.MQTT_HOST)
+    parser.add_argument('--mqtt-port', type=int, default=rsu.MQTT_PORT)
+    parser.add_argument('--state-dir', default=rsu.RSU_STATE_DIR)
+    args = parser.parse_args()
+
+    positions = rsu.load_sensor_positions(rsu.get_storage())
+    plan = ShardPlan(positions, args.shards, args.cell_size)
+    procs = [mp.Process(target=run_router, args=(plan, args.mqtt_host, args.mqtt_port), daemon=True)]
+    for shard in range(args.shards):
+        # port de métriques par shard : METRICS_PORT + 1 + shard
+        procs.append(mp.Process(target=run_worker, daemon=True,
+                                args=(plan, shard, args.mqtt_host, args.mqtt_port, args.halo,
+                                      args.state_dir, rsu.METRICS_PORT + 1 + shard)))
+    for p in procs:
+        p.start()
+    print(f"RSU partitionné : {args.shards} shards, {len(plan.owner)} cellules de {args.cell_size}°")
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+
+if __name__ == '__main__':
+    main()
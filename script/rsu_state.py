@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+rsu_state.py
+
+État durable du dispatcher RSU : journal append-only + snapshots compacts.
+
+État (dict JSON) :
+    positions           positions capteurs (cache de sensor_position.json)
+    truck_positions     [[lat, lon] | [None, None]] par camion
+    truck_seen          instant (time.time) du dernier CAM par camion, None = jamais
+    truck_assign_count  DENM assignés par camion
+    total_assigned      total des DENM assignés
+    dispatched          capteurs déjà dispatchés, en attente de vidage
+    handoffs            [[capteur, shard, instant]] confiés à un autre shard, sans réponse
+    seq                 numéro de la dernière opération incluse
+
+– Chaque mutation est une ligne JSON du journal `journal.jsonl` :
+    {"seq", "op": "cam",    "truck", "lat", "lon", "at"}
+    {"seq", "op": "assign", "sensor", "truck", "count", "total"}
+                                                    fsync avant publication du DENM
+                                                    (sensor None : capteur d'un autre shard ;
+                                                    count / total : compteurs après l'assignation)
+    {"seq", "op": "handoff", "sensor", "owner", "at"} confié au shard du camion (rsu_shard.py)
+    {"seq", "op": "ack",    "sensor"}               DENM publié par ce shard
+    {"seq", "op": "clear",  "sensor"}
+    {"seq", "op": "positions", "positions"}
+- Toutes les `snapshot_every` opérations, `snapshot.json` est réécrit
+  (tmp + os.replace) puis le journal est vidé ; au chargement, seules les
+  opérations de seq > snapshot sont rejouées (un crash entre les deux est sans effet).
+- Les opérations portent des valeurs absolues (positions, compteurs après
+  assignation) : rejouer une opération déjà reflétée par le snapshot ne
+  compte rien deux fois.
+- Le snapshot peut être recopié dans le stockage (`mirror=(store, bucket, key)`) :
+  un RSU redémarré sur une autre machine repart du dernier snapshot.
+"""
+import os
+import json
+import threading
+
+DEFAULT_SNAPSHOT_EVERY = 1000
+
+
+def empty_state(positions, truck_count=None):
+    truck_count = truck_count if truck_count is not None else len(positions)
+    return {
+        "positions": positions,
+        "truck_positions": [[None, None] for _ in range(truck_count)],
+        "truck_seen": [None] * truck_count,
+        "truck_assign_count": [0] * truck_count,
+        "total_assigned": 0,
+        "dispatched": [],
+        "handoffs": [],
+        "seq": 0,
+    }
+
+
+def _drop_handoff(state, sensor):
+    state["handoffs"] = [h for h in state.get("handoffs", []) if h[0] != sensor]
+
+
+def apply(state, op):
+    """Applique une opération du journal à `state` (sur place)."""
+    kind = op["op"]
+    if kind == "cam":
+        state["truck_positions"][op["truck"]] = [op["lat"], op["lon"]]
+        if "at" in op:
+            seen = state.setdefault("truck_seen", [None] * len(state["truck_positions"]))
+            seen[op["truck"]] = op["at"]
+    elif kind == "assign":
+        if "count" in op:
+            state["truck_assign_count"][op["truck"]] = op["count"]
+            state["total_assigned"] = op["total"]
+        else:  # journaux antérieurs aux compteurs absolus
+            state["truck_assign_count"][op["truck"]] += 1
+            state["total_assigned"] += 1
+        if op["sensor"] is not None and op["sensor"] not in state["dispatched"]:
+            state["dispatched"].append(op["sensor"])
+    elif kind == "handoff":
+        if op["sensor"] not in state["dispatched"]:
+            state["dispatched"].append(op["sensor"])
+        if "owner" in op:
+            _drop_handoff(state, op["sensor"])
+            state["handoffs"].append([op["sensor"], op["owner"], op["at"]])
+    elif kind == "ack":
+        _drop_handoff(state, op["sensor"])
+    elif kind == "clear":
+        if op["sensor"] in state["dispatched"]:
+            state["dispatched"].remove(op["sensor"])
+        _drop_handoff(state, op["sensor"])
+    elif kind == "positions":
+        state["positions"] = op["positions"]
+    state["seq"] = op["seq"]
+    return state
+
+
+class StateJournal:
+    """Journal + snapshots dans `directory` (miroir optionnel du snapshot dans le stockage)."""
+
+    def __init__(self, directory, snapshot_every=DEFAULT_SNAPSHOT_EVERY, mirror=None):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.mirror = mirror
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.log_path = os.path.join(directory, "journal.jsonl")
+        self._lock = threading.Lock()
+        self._log = None
+        self._seq = 0
+        self._since_snapshot = 0
+        os.makedirs(directory, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Chargement
+    # ------------------------------------------------------------------
+    def _read_snapshot(self):
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                return json.load(f)
+        if self.mirror:
+            store, bucket, key = self.mirror
+            if store.exists(bucket, key):
+                return json.loads(store.get_bytes(bucket, key))
+        return None
+
+    def load(self):
+        """État = snapshot + opérations du journal ; None si aucun état n'existe."""
+        state = self._read_snapshot()
+        if os.path.exists(self.log_path):
+            with open(self.log_path) as f:
+                for line in f:
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        continue  # dernière ligne tronquée par un crash
+                    if state is not None and op["seq"] > state["seq"]:
+                        apply(state, op)
+                        self._since_snapshot += 1
+        if state is not None:
+            self._seq = state["seq"]
+        self._log = open(self.log_path, "a")
+        return state
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+    def append(self, op, sync=False):
+        """Ajoute une opération ; `sync=True` garantit qu'elle est sur disque au retour."""
+        with self._lock:
+            self._seq += 1
+            op = dict(op, seq=self._seq)
+            self._log.write(json.dumps(op, separators=(",", ":")) + "\n")
+            self._log.flush()
+            if sync:
+                os.fsync(self._log.fileno())
+            self._since_snapshot += 1
+        return op
+
+    def due(self):
+        return self._since_snapshot >= self.snapshot_every
+
+    def snapshot(self, build_state):
+        """
+        Écrit `build_state()` (seq courant) puis vide le journal. L'état est
+        construit sous le verrou : aucune opération ne peut s'intercaler entre
+        sa lecture et le seq enregistré. L'appelant modifie son état *avant*
+        `append` : une mutation pas encore journalisée peut être dans le
+        snapshot et rejouée ensuite, d'où les valeurs absolues de `apply`.
+        Si plusieurs threads mutent l'état, l'appelant prend leur verrou
+        autour de l'appel (voir rsu_shard.py).
+        """
+        with self._lock:
+            state = dict(build_state(), seq=self._seq)
+            body = json.dumps(state, separators=(",", ":"))
+            tmp = self.snapshot_path + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+            self._log.close()
+            self._log = open(self.log_path, "w")
+            self._since_snapshot = 0
+        if self.mirror:
+            store, bucket, key = self.mirror
+            store.put_bytes(bucket, key, body.encode("utf-8"), "application/json")
+        return state
+
+    def close(self):
+        with self._lock:
+            if self._log:
+                self._log.close()
+                self._log = None
@@ -1,8 +1,12 @@
 import random
 import time
 import os
+import sys
 import json
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from timeseries_store import TimeSeriesStore
+
 
 # Max capacity of the garbage container
 MAX_CAPACITY = 100
@@ -23,6 +27,9 @@ with open(path, "r") as file:
 
 NUMBER_SENSORS = len(sensor_positions['positions'])
 
+# Append-only history of every tick (sensor_data.txt only keeps "now")
+history = TimeSeriesStore(os.getenv("HISTORY_DIR", "history"))
+
 
 # Create a list of initial fill percentages for all sensors
 data = [str(INITIAL_PERCENTAGE) + "\n"] * NUMBER_SENSORS
@@ -75,6 +82,8 @@ while True:
     with open("sensor_data.txt", "w") as file:
         file.writelines(data)
 
+    history.append(time.time(), [int(fill) / MAX_CAPACITY for fill in data])
+
     print("Sensor data updated.")
 
     # Simulate some delay between fill iterations
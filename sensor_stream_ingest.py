@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+sensor_stream_ingest.py
+
+Ingestion continue des niveaux de remplissage live vers le bucket raw,
+par micro-batchs (pas un objet par mesure).
+
+– Sources :
+    • file : relit `sensor/sensor_data.txt` (simulateur) à chaque modification ;
+             le timestamp d'une mesure est le mtime du fichier
+    • mqtt : messages JSON {"sensor_id", "timestamp" (ms), "fill_level"} ou liste
+- Buffer mémoire vidé sur seuil de taille (`--max-records`) ou d'âge (`--max-age`)
+- Objets JSONL gzip partitionnés comme l'historique existant :
+    sensor/historic_fill_levels/date=%Y/%m/%d/live_<ts>_<hash>.jsonl.gz
+  → lus directement par pyspark_clean_silver.py (entraînement sur les mesures réelles)
+- At-least-once : chaque mesure acceptée est d'abord journalisée (spool local),
+  le journal n'est vidé qu'après l'écriture des objets ; au redémarrage il est
+  rejoué. Le nom d'objet dérive du contenu : un batch rejoué écrase le même objet.
+  Chaque partition écrite sort aussitôt du buffer et avance ses filigranes : un
+  flush interrompu ne renvoie que les partitions restantes.
+- Les callbacks (thread MQTT) ne font que bufferiser ; le flush a lieu dans la
+  boucle principale, une erreur de stockage n'arrête pas la réception.
+- Déduplication sur (sensor_id, timestamp) : dans le buffer, et pour les
+  mesures déjà écrites par capteur, via le filigrane (dernier timestamp écrit)
+  et les clés écrites dans la fenêtre de retard (`--lateness`) sous celui-ci.
+  Une mesure en désordre dans la fenêtre est acceptée ; plus ancienne, elle
+  est écartée, comptée (outcome="late") et journalisée.
+
+Usage :
+    python sensor_stream_ingest.py --source file --path sensor/sensor_data.txt
+    python sensor_stream_ingest.py --source mqtt --mqtt-topic sensor/fill
+"""
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+
+from s3clinet import RAW_BUCKET
+from storage import get_storage
+from metrics import counter, start_http_server
+
+PREFIX            = "sensor/historic_fill_levels"
+DEFAULT_RECORDS   = 5000
+DEFAULT_AGE       = 60.0
+DEFAULT_SPOOL     = os.getenv("INGEST_SPOOL_DIR", "spool")
+DEFAULT_LATENESS  = 300.0   # s acceptées sous le filigrane d'un capteur
+
+RECORDS = counter("stream_ingest_records_total", "Mesures live reçues", ["outcome"])
+BATCHES = counter("stream_ingest_batches_total", "Objets raw écrits par l'ingestion live")
+BYTES   = counter("stream_ingest_bytes_total", "Octets compressés écrits par l'ingestion live")
+
+
+class MicroBatchWriter:
+    """Buffer + journal local + flush par lots partitionnés par date."""
+
+    def __init__(self, store, bucket=RAW_BUCKET, max_records=DEFAULT_RECORDS,
+                 max_age=DEFAULT_AGE, spool_dir=DEFAULT_SPOOL, lateness=DEFAULT_LATENESS):
+        self.store = store
+        self.bucket = bucket
+        self.max_records = max_records
+        self.max_age = max_age
+        self.lateness = int(lateness * 1000)   # ms, comme les timestamps
+        self.spool_path = os.path.join(spool_dir, "pending.jsonl")
+        self.watermark_path = os.path.join(spool_dir, "watermarks.json")
+        self._lock = threading.Lock()
+        self._buffer = {}          # (sensor_id, timestamp) → record
+        self._oldest = None
+        os.makedirs(spool_dir, exist_ok=True)
+        self._watermarks, self._recent = self._load_watermarks()
+        self._spool = None
+        self._replay()
+
+    # ------------------------------------------------------------------
+    # Journal local
+    # ------------------------------------------------------------------
+    def _load_watermarks(self):
+        """(filigrane par capteur, timestamps écrits dans la fenêtre de retard)."""
+        if not os.path.exists(self.watermark_path):
+            return {}, {}
+        with open(self.watermark_path) as f:
+            state = json.load(f)
+        if "watermarks" not in state:
+            return state, {}   # ancien format : filigranes seuls
+        return state["watermarks"], {sid: set(ts) for sid, ts in state["recent"].items()}
+
+    def _save_watermarks(self):
+        tmp = self.watermark_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"watermarks": self._watermarks,
+                       "recent": {sid: sorted(ts) for sid, ts in self._recent.items()}}, f)
+        os.replace(tmp, self.watermark_path)
+
+    def _written(self, batch):
+        """Avance filigranes et clés récentes des capteurs de `batch` (écrit)."""
+        for record in batch:
+            sid, ts = record["sensor_id"], record["timestamp"]
+            self._watermarks[sid] = max(self._watermarks.get(sid, -1), ts)
+            self._recent.setdefault(sid, set()).add(ts)
+        # clés sorties de la fenêtre de retard : le filigrane suffit
+        for sid in {record["sensor_id"] for record in batch}:
+            floor = self._watermarks[sid] - self.lateness
+            self._recent[sid] = {ts for ts in self._recent[sid] if ts > floor}
+
+    def _replay(self):
+        if os.path.exists(self.spool_path):
+            replayed = 0
+            with open(self.spool_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # dernière ligne tronquée par un crash
+                    if self._accept(record) == "accepted":
+                        replayed += 1
+            if replayed:
+                logging.info("Rejoué %d mesures depuis %s", replayed, self.spool_path)
+        self._rewrite_spool()
+
+    def _rewrite_spool(self):
+        # journal réécrit avec le seul contenu du buffer
+        if self._spool is not None:
+            self._spool.close()
+        with open(self.spool_path, "w") as f:
+            for record in self._buffer.values():
+                f.write(json.dumps(record) + "\n")
+        self._spool = open(self.spool_path, "a")
+
+    # ------------------------------------------------------------------
+    # Réception
+    # ------------------------------------------------------------------
+    def _accept(self, record):
+        """Bufferise la mesure si elle est nouvelle ; retourne l'outcome compté."""
+        try:
+            sensor_id, ts = str(record["sensor_id"]), int(record["timestamp"])
+            fill_level = float(record["fill_level"])
+        except (KeyError, TypeError, ValueError):
+            outcome = "invalid"
+        else:
+            key = (sensor_id, ts)
+            watermark = self._watermarks.get(sensor_id, -1)
+            if key in self._buffer or ts in self._recent.get(sensor_id, ()):
+                outcome = "duplicate"
+            elif ts <= watermark - self.lateness:
+                outcome = "late"   # sous la fenêtre : peut-être déjà écrite, on ne sait plus
+            else:
+                outcome = "accepted"
+                self._buffer[key] = {"sensor_id": sensor_id, "timestamp": ts, "fill_level": fill_level}
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+        RECORDS.labels(outcome=outcome).inc()
+        return outcome
+
+    def add(self, records):
+        """Ajoute des mesures au buffer et au journal (pas de flush, voir `should_flush`)."""
+        late = 0
+        with self._lock:
+            for record in records:
+                outcome = self._accept(record)
+                if outcome == "accepted":
+                    key = (str(record["sensor_id"]), int(record["timestamp"]))
+                    self._spool.write(json.dumps(self._buffer[key]) + "\n")
+                late += outcome == "late"
+            self._spool.flush()
+            os.fsync(self._spool.fileno())
+        if late:
+            logging.warning("%d mesures plus anciennes que la fenêtre de retard (%.0f s) ignorées",
+                            late, self.lateness / 1000)
+
+    def should_flush(self):
+        with self._lock:
+            if not self._buffer:
+                return False
+            return (len(self._buffer) >= self.max_records
+                    or time.monotonic() - self._oldest >= self.max_age)
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+    @staticmethod
+    def object_key(date, records, body):
+        first = records[0]["timestamp"]
+        tag = datetime.fromtimestamp(first / 1000, tz=timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        digest = hashlib.sha1(body).hexdigest()[:12]
+        return f"{PREFIX}/date={date}/live_{tag}_{digest}.jsonl.gz"
+
+    def flush(self):
+        """
+        Écrit le buffer (un objet par partition date=, dans l'ordre des dates) ;
+        retourne le nb de mesures. Chaque partition écrite est retirée du buffer
+        et ses filigranes avancés avant la suivante : si une écriture échoue,
+        l'exception remonte et seules les partitions restantes sont conservées.
+        """
+        with self._lock:
+            if not self._buffer:
+                return 0
+            records = sorted(self._buffer.values(), key=lambda r: (r["timestamp"], r["sensor_id"]))
+            partitions = {}
+            for record in records:
+                date = datetime.fromtimestamp(record["timestamp"] / 1000, tz=timezone.utc).strftime("%Y/%m/%d")
+                partitions.setdefault(date, []).append(record)
+            flushed = 0
+            try:
+                for date, batch in partitions.items():
+                    text = "\n".join(json.dumps(r, separators=(",", ":")) for r in batch).encode("utf-8")
+                    # mtime=0 : même contenu → mêmes octets → même clé (rejeu idempotent)
+                    body = gzip.compress(text, mtime=0)
+                    key = self.object_key(date, batch, text)
+                    self.store.put_bytes(self.bucket, key, body, "application/gzip")
+                    self._written(batch)
+                    for record in batch:
+                        del self._buffer[(record["sensor_id"], record["timestamp"])]
+                    self._save_watermarks()
+                    flushed += len(batch)
+                    BATCHES.inc()
+                    BYTES.inc(len(body))
+                    logging.info("Uploaded %s/%s (%d mesures)", self.bucket, key, len(batch))
+            finally:
+                if flushed:
+                    if not self._buffer:
+                        self._oldest = None
+                    self._rewrite_spool()
+                    RECORDS.labels(outcome="flushed").inc(flushed)
+            return flushed
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._spool.close()
+
+
+# ----------------------------------------------------------------------
+# Sources
+# ----------------------------------------------------------------------
+def read_sensor_file(path):
+    """Mesures de `sensor_data.txt` horodatées au mtime du fichier."""
+    ts = int(os.path.getmtime(path) * 1000)
+    with open(path) as f:
+        lines = [l.strip() for l in f if l.strip()]
+    return [{"sensor_id": f"S{i+1}", "timestamp": ts, "fill_level": int(v) / 100.0}
+            for i, v in enumerate(lines)]
+
+
+def decode_message(payload):
+    """Mesures d'un message MQTT (objet ou liste JSON) ; ValueError si illisible."""
+    data = json.loads(payload.decode())
+    records = data if isinstance(data, list) else [data]
+    return [r for r in records
+            if isinstance(r, dict) and {"sensor_id", "timestamp", "fill_level"} <= r.keys()]
+
+
+def flush_if_due(writer):
+    try:
+        if writer.should_flush():
+            writer.flush()
+    except Exception as e:
+        # stockage indisponible : le buffer et le journal sont conservés, on réessaie
+        logging.warning("Flush en échec, nouvel essai au prochain tick : %s", e)
+
+
+def run_file_source(writer, path, poll_interval):
+    last_mtime = None
+    while True:
+        try:
+            mtime = os.path.getmtime(path)
+            if mtime != last_mtime:
+                records = read_sensor_file(path)
+                writer.add(records)
+                last_mtime = mtime
+        except (OSError, ValueError) as e:
+            logging.warning("Lecture %s impossible : %s", path, e)
+        flush_if_due(writer)
+        time.sleep(poll_interval)
+
+
+def run_mqtt_source(writer, host, port, topic, poll_interval):
+    import paho.mqtt.client as mqtt
+
+    def on_connect(client, userdata, flags, rc):
+        logging.info("MQTT connecté (rc=%s), abonnement à %s", rc, topic)
+        client.subscribe(topic, qos=1)
+
+    def on_message(client, userdata, msg):
+        # thread réseau paho : une exception ici arrêterait loop_start()
+        try:
+            records = decode_message(msg.payload)
+        except ValueError:
+            RECORDS.labels(outcome="invalid").inc()
+            return
+        try:
+            writer.add(records)
+        except OSError as e:
+            # journal local inécrivable : message perdu pour ce process, le
+            # broker le redélivre (QoS 1) à la prochaine session
+            logging.error("Journalisation impossible, message ignoré : %s", e)
+
+    # session persistante + QoS 1 : le broker redélivre ce qui n'a pas été acquitté
+    client = mqtt.Client(client_id="sensor-stream-ingest", clean_session=False)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(host, port, 60)
+    client.loop_start()
+    while True:
+        time.sleep(poll_interval)
+        flush_if_due(writer)
+
+
+# ----------------------------------------------------------------------
+# Main
+# ----------------------------------------------------------------------
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', choices=['file', 'mqtt'], default='file')
+    parser.add_argument('--path', default=os.path.join('sensor', 'sensor_data.txt'))
+    parser.add_argument('--mqtt-host', default=os.getenv('MQTT_HOST', '127.0.0.1'))
+    parser.add_argument('--mqtt-port', type=int, default=int(os.getenv('MQTT_PORT', '18830')))
+    parser.add_argument('--mqtt-topic', default='sensor/fill')
+    parser.add_argument('--max-records', type=int, default=DEFAULT_RECORDS)
+    parser.add_argument('--max-age', type=float, default=DEFAULT_AGE)
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--spool-dir', default=DEFAULT_SPOOL)
+    parser.add_argument('--lateness', type=float, default=DEFAULT_LATENESS,
+                        help="retard accepté sous le dernier timestamp écrit d'un capteur (s)")
+    parser.add_argument('--metrics-port', type=int, default=int(os.getenv('METRICS_PORT', '9104')))
+    parser.add_argument('--log', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log),
+                        format="%(asctime)s %(levelname)s %(message)s",
+                        datefmt="%Y-%m-%dT%H:%M:%S")
+    start_http_server(args.metrics_port)
+    writer = MicroBatchWriter(get_storage(), RAW_BUCKET, args.max_records,
+                              args.max_age, args.spool_dir, args.lateness)
+    try:
+        if args.source == 'file':
+            run_file_source(writer, args.path, args.poll_interval)
+        else:
+            run_mqtt_source(writer, args.mqtt_host, args.mqtt_port, args.mqtt_topic,
+                            args.poll_interval)
+    except KeyboardInterrupt:
+        writer.close()
+
+
+if __name__ == '__main__':
+    main()
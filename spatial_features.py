@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+spatial_features.py
+
+Voisinage des capteurs parmi les points d'apport volontaire (pav/points.parquet :
+colonnes à verre, composteurs, conteneurs textile, stations Trilib, recycleries) :
+    pav_<type>_n_<r>m     nombre de PAV du type à moins de r mètres
+    pav_<type>_dist_m     distance au PAV du type le plus proche (m)
+
+– Index : un KD-tree (scipy cKDTree) par type de PAV, sur des coordonnées
+  projetées en mètres (équirectangulaire autour de la latitude moyenne :
+  erreur < 1 m à l'échelle d'une ville), au lieu d'un parcours capteurs × PAV.
+  ~1 s par type pour 100k capteurs × 10k points.
+– Cache : le résultat est écrit dans Silver sous
+      pav/neighbourhood/<version PAV>/<version capteurs + rayons>.parquet
+  la version PAV est un hash du contenu des points : tant que l'ingestion
+  ne change pas les PAV (ni les positions, ni les rayons), rien n'est recalculé.
+  Seule l'entrée du run courant est conservée : les autres versions sont
+  supprimées à chaque appel (`expire_cache`), le cache ne grossit pas.
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from features import lookup
+
+EARTH_RADIUS_M = 6371008.8
+DEFAULT_RADII  = (100, 250, 500)
+PREFIX         = "pav_"
+CACHE_PREFIX   = "pav/neighbourhood/"
+
+
+def spatial_columns(columns):
+    """Colonnes de voisinage PAV présentes dans `columns` (ordre conservé)."""
+    return [c for c in columns if c.startswith(PREFIX)]
+
+
+def _slug(pav_type):
+    return "".join(ch if ch.isalnum() else "_" for ch in str(pav_type).lower())
+
+
+def _digest(*frames):
+    h = hashlib.sha1()
+    for df in frames:
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+
+def dataset_version(df_pav):
+    """Hash du contenu des PAV, indépendant de l'ordre des fichiers / lignes."""
+    pts = df_pav[["pav_type", "lat", "lon"]].astype({"pav_type": str, "lat": float, "lon": float})
+    return _digest(pts.sort_values(["pav_type", "lat", "lon"]).reset_index(drop=True))
+
+
+def cache_key(df_pav, df_pos, radii):
+    sensors = df_pos[["sensor_id", "lat", "lon"]].astype({"sensor_id": str, "lat": float, "lon": float})
+    radii = pd.DataFrame({"r": np.asarray(radii, dtype=np.float64)})
+    return f"{CACHE_PREFIX}{dataset_version(df_pav)}/{_digest(sensors, radii)}.parquet"
+
+
+def project(lat, lon, lat0):
+    """(lat, lon) en degrés → (x, y) en mètres autour de la latitude `lat0`."""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    return np.column_stack((lon * EARTH_RADIUS_M * np.cos(np.radians(lat0)), lat * EARTH_RADIUS_M))
+
+
+def compute(df_pos, df_pav, radii=DEFAULT_RADII):
+    """Une ligne par capteur (ordre de df_pos) : sensor_id + colonnes pav_*."""
+    out = {"sensor_id": df_pos["sensor_id"].astype(str).to_numpy()}
+    if df_pos.empty:
+        return pd.DataFrame(out)
+    lat0 = float(np.nanmean(df_pos["lat"]))
+    sensors = project(df_pos["lat"], df_pos["lon"], lat0)
+    for pav_type, pts in df_pav.groupby("pav_type", sort=True):
+        name = _slug(pav_type)
+        tree = cKDTree(project(pts["lat"], pts["lon"], lat0))
+        for r in radii:
+            out[f"{PREFIX}{name}_n_{int(r)}m"] = tree.query_ball_point(
+                sensors, r, return_length=True, workers=-1).astype(np.int32)
+        dist, _ = tree.query(sensors, k=1, workers=-1)
+        out[f"{PREFIX}{name}_dist_m"] = dist.astype(np.float32)
+    return pd.DataFrame(out)
+
+
+def expire_cache(store, bucket, keep):
+    """Supprime les entrées du cache autres que `keep` (versions périmées)."""
+    expired = [k for k in store.list_keys(bucket, CACHE_PREFIX) if k != keep]
+    for k in expired:
+        store.delete(bucket, k)
+    return expired
+
+
+def neighbourhood(store, bucket, df_pos, df_pav, radii=DEFAULT_RADII):
+    """`compute` avec cache Silver par version des PAV ; retourne (df, clé, recalculé ?)."""
+    key = cache_key(df_pav, df_pos, radii)
+    if store.exists(bucket, key):
+        df, computed = store.read_parquet(bucket, key), False
+    else:
+        df, computed = compute(df_pos, df_pav, radii), True
+        store.write_parquet(df, bucket, key)
+    expire_cache(store, bucket, key)
+    return df, key, computed
+
+
+def attach(df_feat, df_spatial):
+    """
+    Ajoute les colonnes pav_* à la table de features par lookup sur les codes
+    du catégoriel `sensor_id` (une ligne par capteur → diffusée sur l'historique).
+    """
+    out = df_feat.copy(deep=False)
+    categories = df_feat["sensor_id"].cat.categories
+    codes = df_feat["sensor_id"].cat.codes.to_numpy()
+    per_sensor = df_spatial.set_index(df_spatial["sensor_id"].astype(str)).reindex(categories)
+    for col in spatial_columns(df_spatial.columns):
+        out[col] = lookup(per_sensor[col], codes)
+    return out
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+storage.py
+
+Abstraction de stockage objet pour tout le pipeline (raw → silver → gold → RSU/OBU).
+
+Le backend est choisi par le schéma de l'URL (variable d'env STORAGE_URL) :
+    s3://               MinIO / S3 via le client partagé de s3clinet.py (défaut)
+    file:///data/lake   système de fichiers local : <root>/<bucket>/<key>,
+                        lectures Parquet en memory-map (pyarrow)
+    mem://nom           en mémoire, partagé dans le process (tests, benchmarks)
+
+Toutes les étapes parlent en (bucket, key) : le même code tourne contre MinIO
+ou entièrement hors-ligne, ce qui permet de mesurer le coût du saut réseau.
+Un objet absent lève FileNotFoundError quel que soit le backend.
+
+Usage :
+    from storage import get_storage
+    store = get_storage()                       # STORAGE_URL ou s3://
+    store.put_bytes("raw", "a/b.json", b"{}")
+    df = get_storage("file:///tmp/lake").read_parquet("silver", "features/features.parquet")
+"""
+import io
+import os
+import re
+import abc
+import time
+import functools
+import threading
+from urllib.parse import urlparse
+
+from metrics import STORAGE_SECONDS, STORAGE_BYTES
+
+STORAGE_URL = os.getenv("STORAGE_URL", "s3://")
+TMP_PATTERN = re.compile(r"\.tmp\d+\.\d+$")   # fichiers temporaires de LocalStorage
+
+
+def _tmp_path(path):
+    """Fichier temporaire propre au process / thread (voir TMP_PATTERN)."""
+    return f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+
+
+def _instrumented(op):
+    """
+    Durée de l'opération + octets lus/écrits (get/put) par backend. Chaque
+    opération de chaque backend est décorée (`_instrumented_list` pour
+    list_keys) : mêmes séries `op` pour s3, file et mem.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            with STORAGE_SECONDS.labels(backend=self.backend, op=op).time():
+                result = fn(self, *args, **kwargs)
+            if op == "get":
+                STORAGE_BYTES.labels(backend=self.backend, direction="in").inc(len(result))
+            elif op == "put":
+                data = args[2] if len(args) > 2 else kwargs["data"]
+                STORAGE_BYTES.labels(backend=self.backend, direction="out").inc(len(data))
+            return result
+        return wrapper
+    return decorator
+
+
+def _instrumented_list(fn):
+    """list_keys est un générateur : on mesure le listing complet."""
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        yield from fn(self, *args, **kwargs)
+        STORAGE_SECONDS.labels(backend=self.backend, op="list").observe(time.perf_counter() - start)
+    return wrapper
+
+
+class Storage(abc.ABC):
+    """Interface commune aux backends (bucket, key)."""
+
+    url = None
+    backend = None
+
+    @abc.abstractmethod
+    def get_bytes(self, bucket, key):
+        """Contenu de l'objet ; FileNotFoundError s'il n'existe pas."""
+
+    @abc.abstractmethod
+    def put_bytes(self, bucket, key, data, content_type="application/octet-stream"):
+        """Écrit (ou remplace) l'objet."""
+
+    @abc.abstractmethod
+    def exists(self, bucket, key):
+        """True si l'objet existe."""
+
+    @abc.abstractmethod
+    def list_keys(self, bucket, prefix=""):
+        """Clés commençant par `prefix`, en ordre lexicographique."""
+
+    @abc.abstractmethod
+    def delete(self, bucket, key):
+        """Supprime l'objet ; sans effet s'il n'existe pas."""
+
+    def ensure_buckets(self, buckets):
+        pass
+
+    # --- Parquet : implémentation générique via bytes -------------------
+    # (octets comptés par get / put, durée totale parsing compris ici)
+    @_instrumented("read_parquet")
+    def read_parquet(self, bucket, key, columns=None):
+        import pandas as pd
+        return pd.read_parquet(io.BytesIO(self.get_bytes(bucket, key)), columns=columns)
+
+    @_instrumented("write_parquet")
+    def write_parquet(self, df, bucket, key, **kwargs):
+        buf = io.BytesIO()
+        df.to_parquet(buf, index=False, **kwargs)
+        self.put_bytes(bucket, key, buf.getvalue(), "application/octet-stream")
+
+
+class S3Storage(Storage):
+    """MinIO / S3 via le client boto3 partagé."""
+
+    backend = "s3"
+
+    def __init__(self, url="s3://"):
+        self.url = url
+
+    @property
+    def client(self):
+        from s3clinet import get_s3
+        return get_s3()
+
+    @_instrumented("get")
+    def get_bytes(self, bucket, key):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                raise FileNotFoundError(f"{self.url}{bucket}/{key}") from None
+            raise
+
+    @_instrumented("put")
+    def put_bytes(self, bucket, key, data, content_type="application/octet-stream"):
+        self.client.put_object(Bucket=bucket, Key=key, Body=data, ContentType=content_type)
+
+    @_instrumented("head")
+    def exists(self, bucket, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return False
+            raise
+
+    @_instrumented_list
+    def list_keys(self, bucket, prefix=""):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"]
+
+    @_instrumented("delete")
+    def delete(self, bucket, key):
+        self.client.delete_object(Bucket=bucket, Key=key)
+
+    def ensure_buckets(self, buckets):
+        from s3clinet import ensure_buckets
+        ensure_buckets(buckets)
+
+
+class LocalStorage(Storage):
+    """Fichiers locaux : <root>/<bucket>/<key>, Parquet lu en memory-map."""
+
+    backend = "file"
+
+    def __init__(self, root, url=None):
+        self.root = os.path.abspath(root)
+        self.url = url or f"file://{self.root}"
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    @_instrumented("get")
+    def get_bytes(self, bucket, key):
+        with open(self._path(bucket, key), "rb") as f:
+            return f.read()
+
+    @_instrumented("put")
+    def put_bytes(self, bucket, key, data, content_type="application/octet-stream"):
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # écriture atomique : un lecteur ne voit jamais un objet partiel
+        tmp = _tmp_path(path)
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    @_instrumented("head")
+    def exists(self, bucket, key):
+        return os.path.isfile(self._path(bucket, key))
+
+    @_instrumented_list
+    def list_keys(self, bucket, prefix=""):
+        base = os.path.join(self.root, bucket)
+        keys = []
+        for dirpath, _, filenames in os.walk(base):
+            for name in filenames:
+                if TMP_PATTERN.search(name):
+                    continue  # écriture en cours (put_bytes / write_parquet)
+                key = os.path.relpath(os.path.join(dirpath, name), base).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+        # même ordre lexicographique que list_objects_v2
+        yield from sorted(keys)
+
+    @_instrumented("delete")
+    def delete(self, bucket, key):
+        try:
+            os.remove(self._path(bucket, key))
+        except FileNotFoundError:
+            pass
+
+    def ensure_buckets(self, buckets):
+        for bucket in buckets:
+            os.makedirs(os.path.join(self.root, bucket), exist_ok=True)
+
+    @_instrumented("read_parquet")
+    def read_parquet(self, bucket, key, columns=None):
+        import pyarrow.parquet as pq
+        path = self._path(bucket, key)
+        table = pq.read_table(path, columns=columns, memory_map=True)
+        STORAGE_BYTES.labels(backend=self.backend, direction="in").inc(os.path.getsize(path))
+        return table.to_pandas()
+
+    @_instrumented("write_parquet")
+    def write_parquet(self, df, bucket, key, **kwargs):
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = _tmp_path(path)
+        df.to_parquet(tmp, index=False, **kwargs)
+        os.replace(tmp, path)
+        STORAGE_BYTES.labels(backend=self.backend, direction="out").inc(os.path.getsize(path))
+
+
+class MemoryStorage(Storage):
+    """Objets en mémoire (dict), partagés par nom dans le process."""
+
+    backend = "mem"
+
+    _spaces = {}
+
+    def __init__(self, name="default", url=None):
+        self.url = url or f"mem://{name}"
+        self._objects = MemoryStorage._spaces.setdefault(name, {})
+        self._lock = threading.Lock()
+
+    @_instrumented("get")
+    def get_bytes(self, bucket, key):
+        try:
+            return self._objects[(bucket, key)]
+        except KeyError:
+            raise FileNotFoundError(f"{self.url}/{bucket}/{key}") from None
+
+    @_instrumented("put")
+    def put_bytes(self, bucket, key, data, content_type="application/octet-stream"):
+        with self._lock:
+            self._objects[(bucket, key)] = bytes(data)
+
+    @_instrumented("head")
+    def exists(self, bucket, key):
+        return (bucket, key) in self._objects
+
+    @_instrumented_list
+    def list_keys(self, bucket, prefix=""):
+        with self._lock:
+            keys = [k for b, k in self._objects if b == bucket and k.startswith(prefix)]
+        yield from sorted(keys)
+
+    @_instrumented("delete")
+    def delete(self, bucket, key):
+        with self._lock:
+            self._objects.pop((bucket, key), None)
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+
+
+_instances = {}
+_lock = threading.Lock()
+
+
+def open_storage(url):
+    """Construit un backend à partir de son URL."""
+    parsed = urlparse(url)
+    if parsed.scheme == "s3":
+        return S3Storage(url)
+    if parsed.scheme == "file":
+        return LocalStorage(parsed.netloc + parsed.path or ".", url)
+    if parsed.scheme == "mem":
+        return MemoryStorage(parsed.netloc or "default", url)
+    raise ValueError(f"Schéma de stockage inconnu : {url!r} (s3://, file://, mem://)")
+
+
+def get_storage(url=None):
+    """Backend partagé pour `url` (défaut : STORAGE_URL)."""
+    url = url or STORAGE_URL
+    if url not in _instances:
+        with _lock:
+            if url not in _instances:
+                _instances[url] = open_storage(url)
+    return _instances[url]
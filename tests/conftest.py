@@ -0,0 +1,16 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "script"))
+
+
+@pytest.fixture
+def store():
+    """Stockage mem:// isolé par test."""
+    from storage import MemoryStorage
+    return MemoryStorage(uuid.uuid4().hex)
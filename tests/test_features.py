@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from features import FEATURE_COLUMNS, build_features, encode_sensors
+
+
+def inputs():
+    df_pos = pd.DataFrame({"sensor_id": ["S1", "S2"], "lat": [48.8, 48.9], "lon": [2.3, 2.4],
+                           "capacity_tons": 0.12})
+    df_proxy = pd.DataFrame({"sensor_id": ["S2", "S1"], "annual_tons": [2.0, 1.0], "daily_tons": [0.2, 0.1]})
+    df_hist = pd.DataFrame({"sensor_id": ["S2", "S9", "S1", "S9"],
+                            "ts": pd.to_datetime(["2024-01-01 08:00"] * 2 + ["2024-01-06 23:00"] * 2),
+                            "fill_level": [0.1, 0.2, 0.3, 0.4]})
+    return df_hist, df_pos, df_proxy
+
+
+def test_matches_left_join():
+    df = build_features(*inputs())
+    assert list(df.columns) == FEATURE_COLUMNS
+    assert df["sensor_id"].astype(str).tolist() == ["S2", "S9", "S1", "S9"]
+    np.testing.assert_allclose(df["lat"], [48.9, np.nan, 48.8, np.nan])
+    np.testing.assert_allclose(df["annual_tons"], [2.0, np.nan, 1.0, np.nan])
+    assert df["hour_of_day"].tolist() == [8, 8, 23, 23]
+    assert df["day_of_week"].tolist() == [0, 0, 5, 5]
+
+
+def test_unknown_sensor_keeps_its_id():
+    sensor = encode_sensors(pd.Series(["S9", "S1", None, "S9"]), pd.Index(["S1", "S2"]))
+    assert list(sensor.categories) == ["S1", "S2", "S9"]
+    assert sensor.codes.tolist() == [2, 0, -1, 2]
+    assert sensor.isna().tolist() == [False, False, True, False]
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+import forecast
+
+COLUMNS = ["hour_of_day", "fill_lag_1", "fill_lag_2", "fill_mean_1h", "hours_since_empty"]
+
+
+def latest(n=3):
+    return pd.DataFrame({
+        "sensor_id": [f"S{i+1}" for i in range(n)],
+        "ts": pd.Timestamp("2024-02-01 22:00"),
+        "fill_level": np.linspace(0.1, 0.5, n, dtype=np.float32),
+        "hour_of_day": 22.0,
+        "fill_lag_1": 0.0,
+        "fill_lag_2": 0.0,
+        "fill_mean_1h": 0.0,
+        "hours_since_empty": [3.0, forecast.MISSING, 1.0][:n],
+    })
+
+
+def growth_model(step=0.05):
+    """Niveau suivant = dernier niveau + step : la prévision doit s'accumuler."""
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.random((200, len(COLUMNS))), columns=COLUMNS)
+    return LinearRegression().fit(X, X["fill_lag_1"] + step)
+
+
+def test_forecast_shape():
+    df = forecast.forecast(growth_model(), latest(), COLUMNS, hours=6)
+    assert len(df) == 3
+    assert list(df.columns[:5]) == ["sensor_id", "issued_at", "fill_now", "fill_max", "hours_to_threshold"]
+    assert list(df.columns[5:]) == [f"h{h:02d}" for h in range(1, 7)]
+    assert df["h01"].dtype == np.float32
+
+
+def test_forecast_is_recursive():
+    df = forecast.forecast(growth_model(0.05), latest(), COLUMNS, hours=6)
+    horizons = df[[f"h{h:02d}" for h in range(1, 7)]].to_numpy()
+    expected = df["fill_now"].to_numpy()[:, None] + 0.05 * np.arange(1, 7)
+    np.testing.assert_allclose(horizons, expected, atol=1e-5)
+    # 0.5 + 0.05 h atteint 0.70 en 4 h
+    assert df["hours_to_threshold"].iloc[2] == pytest.approx(4.0, abs=1e-4)
+
+
+def test_advance_moves_time_and_lags():
+    df = latest()
+    mat = df[COLUMNS].to_numpy(np.float32, copy=True)
+    col = {c: i for i, c in enumerate(COLUMNS)}
+    level = df["fill_level"].to_numpy(np.float32)
+    targets = forecast.horizon_times(df, 3)
+    forecast.advance(mat, col, targets[0], level)
+    forecast.advance(mat, col, targets[1], level + 0.1, level)
+    assert (mat[:, col["hour_of_day"]] == 0).all()               # 22 h + 2 h
+    np.testing.assert_allclose(mat[:, col["fill_lag_1"]], level + 0.1)
+    np.testing.assert_allclose(mat[:, col["fill_lag_2"]], level)
+    np.testing.assert_allclose(mat[:, col["fill_mean_1h"]], level + 0.1)
+    assert mat[:, col["hours_since_empty"]].tolist() == [5.0, forecast.MISSING, 3.0]
+
+
+def test_time_to_threshold_monotonic():
+    rng = np.random.default_rng(1)
+    current = rng.random(200) * 0.5
+    preds = current[:, None] + np.cumsum(rng.random((200, 24)) * 0.05, axis=1)
+    slow = forecast.time_to_threshold(current, preds)
+    fast = forecast.time_to_threshold(current, preds + 0.1)
+    both = ~np.isnan(slow)
+    assert (fast[both] <= slow[both] + 1e-6).all()              # plus rempli → plus tôt
+    previous = np.zeros(200)
+    for threshold in (0.3, 0.5, 0.7, 0.9):
+        hours = forecast.time_to_threshold(current, preds, threshold)
+        known = ~np.isnan(hours)
+        assert (hours[known] >= previous[known] - 1e-6).all()   # seuil plus haut → plus tard
+        previous = np.where(known, hours, np.inf)
+
+
+def test_time_to_threshold_edges():
+    current = np.array([0.8, 0.6, 0.1], dtype=np.float32)
+    preds = np.array([[0.9, 0.9], [0.6, 0.8], [0.2, 0.3]], dtype=np.float32)
+    hours = forecast.time_to_threshold(current, preds, 0.7)
+    assert hours[0] == 0.0
+    assert hours[1] == pytest.approx(1.5)
+    assert np.isnan(hours[2])
@@ -0,0 +1,75 @@
+import json
+import os
+
+import asn1tools
+import pytest
+
+import its_codec
+from its_codec import DecodeError
+
+SCRIPT_DIR = os.path.dirname(its_codec.__file__)
+CAM = {"stationID": 7, "latitude": 48.8566123, "longitude": 2.3522456,
+       "timestamp": "2024-01-30T08:00:00.250Z"}
+
+
+def denm():
+    with open(os.path.join(SCRIPT_DIR, "in_denm.json")) as f:
+        msg = json.load(f)
+    msg["management"]["actionID"]["originatingStationID"] = 12
+    msg["management"].setdefault("eventType", {})["subCauseCode"] = 3
+    msg["situation"]["eventType"]["causeCode"] = 50
+    msg["situation"]["eventPosition"] = {"latitude": 48.85, "longitude": 2.35}
+    msg["situation"]["startTime"] = "2024-01-30T08:00:00.250Z"
+    return msg
+
+
+def uper(topic, msg):
+    return its_codec.encode(topic, msg, "uper")
+
+
+@pytest.mark.parametrize("encoding", its_codec.ENCODINGS)
+def test_cam_round_trip(encoding):
+    back = its_codec.decode("vanetza/in/cam", its_codec.encode("vanetza/in/cam", CAM, encoding), encoding)
+    assert back["stationID"] == 7 and back["timestamp"] == CAM["timestamp"]
+    assert back["latitude"] == pytest.approx(CAM["latitude"], abs=1e-7)
+    assert back["longitude"] == pytest.approx(CAM["longitude"], abs=1e-7)
+
+
+def test_denm_round_trip():
+    msg = denm()
+    back = its_codec.decode("vanetza/in/denm", uper("vanetza/in/denm", msg), "uper")
+    assert back["management"]["eventType"]["subCauseCode"] == 3
+    assert back["management"]["actionID"] == msg["management"]["actionID"]
+    assert back["situation"]["eventPosition"] == pytest.approx(msg["situation"]["eventPosition"])
+    assert back["situation"]["startTime"] == msg["situation"]["startTime"]
+
+
+def test_uper_payload_sizes():
+    assert len(uper("vanetza/in/cam", CAM)) < len(its_codec.encode("vanetza/in/cam", CAM, "json")) / 4
+    assert len(uper("vanetza/in/denm", denm())) < len(its_codec.encode("vanetza/in/denm", denm(), "json")) / 4
+
+
+@pytest.mark.parametrize("topic,msg", [("vanetza/in/cam", CAM), ("vanetza/in/denm", denm())])
+def test_truncated_uper_raises_decode_error(topic, msg):
+    payload = uper(topic, msg)
+    for n in range(len(payload)):
+        with pytest.raises(DecodeError):
+            its_codec.decode(topic, payload[:n], "uper")
+
+
+def test_out_of_range_and_bad_types():
+    with pytest.raises(DecodeError):
+        its_codec.decode("vanetza/in/cam", b"\xff" * 32, "uper")
+    with pytest.raises(DecodeError):
+        its_codec.decode("vanetza/in/cam", "pas des octets", "uper")
+
+
+def test_out_of_range_encode_is_rejected():
+    with pytest.raises(asn1tools.Error):
+        uper("vanetza/in/cam", dict(CAM, latitude=91.0))
+
+
+@pytest.mark.parametrize("payload", [b"{tronqu", b"\xff\xfe", b"42", b"[1, 2]", b""])
+def test_malformed_json_raises_decode_error(payload):
+    with pytest.raises(DecodeError):
+        its_codec.decode("vanetza/in/cam", payload, "json")
@@ -0,0 +1,81 @@
+import json
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import raw_compaction as rc
+
+PART = rc.PREFIX + "date=2024/01/05/"
+T0 = 1704412800000   # 2024-01-05T00:00:00Z
+
+
+def put(store, name, rows):
+    body = "\n".join(json.dumps({"sensor_id": s, "timestamp": t, "fill_level": v}) for s, t, v in rows)
+    store.put_bytes("raw", PART + name, body.encode())
+
+
+def backdate(store, days, *keys):
+    manifest = rc.load_manifest(store, "raw")
+    entry = manifest["partitions"]["2024/01/05"]
+    for key in keys:
+        entry["first_compacted"][key] = (datetime.utcnow() - timedelta(days=days)).isoformat() + "Z"
+    rc.save_manifest(store, manifest, "raw")
+
+
+def test_plan_reads_covers_compacted_and_new_sources(store):
+    put(store, "a.jsonl", [("S1", T0, 0.1), ("S2", T0, 0.2)])
+    assert rc.plan_reads(store, "raw") == ([], [PART + "a.jsonl"])
+
+    manifest = rc.compact_all(store, "raw")
+    entry = manifest["partitions"]["2024/01/05"]
+    put(store, "b.jsonl", [("S1", T0, 0.9), ("S1", T0 + 1, 0.3)])
+    assert rc.plan_reads(store, "raw") == ([entry["compacted_key"]], [PART + "b.jsonl"])
+
+    # recompaction : la dernière valeur reçue gagne, dédupliquée
+    manifest = rc.compact_all(store, "raw")
+    entry = manifest["partitions"]["2024/01/05"]
+    df = store.read_parquet("raw", entry["compacted_key"])
+    assert entry["rows"] == len(df) == 3
+    assert df.loc[(df.sensor_id == "S1") & (df.timestamp == T0), "fill_level"].item() == 0.9
+    assert rc.plan_reads(store, "raw") == ([entry["compacted_key"]], [])
+
+
+def test_retention_uses_each_source_age(store):
+    put(store, "a.jsonl", [("S1", T0, 0.1)])
+    rc.compact_all(store, "raw")
+    backdate(store, 10, PART + "a.jsonl")
+    put(store, "b.jsonl", [("S1", T0 + 1, 0.2)])
+
+    # la recompaction de la partition active ne rajeunit pas a.jsonl
+    manifest = rc.compact_all(store, "raw", retention_days=7)
+    entry = manifest["partitions"]["2024/01/05"]
+    assert entry["expired"] == [PART + "a.jsonl"]
+    assert not store.exists("raw", PART + "a.jsonl")
+    assert store.exists("raw", PART + "b.jsonl")
+    assert rc.plan_reads(store, "raw")[1] == []
+    assert len(store.read_parquet("raw", entry["compacted_key"])) == 2
+
+
+def test_replaced_parquet_kept_for_grace_period(store):
+    put(store, "a.jsonl", [("S1", T0, 0.1)])
+    first = rc.compact_all(store, "raw")["partitions"]["2024/01/05"]["compacted_key"]
+    put(store, "b.jsonl", [("S1", T0 + 1, 0.2)])
+
+    manifest = rc.compact_all(store, "raw", stale_grace=3600)
+    assert manifest["stale"][0]["key"] == first
+    assert store.exists("raw", first)   # un lecteur de l'ancien manifeste peut finir
+
+    manifest = rc.compact_all(store, "raw", stale_grace=3600)
+    assert store.exists("raw", first)
+    manifest = rc.compact_all(store, "raw", stale_grace=0)
+    assert manifest["stale"] == [] and not store.exists("raw", first)
+    assert store.exists("raw", manifest["partitions"]["2024/01/05"]["compacted_key"])
+
+
+def test_manifest_without_first_compacted(store):
+    put(store, "a.jsonl", [("S1", T0, 0.1)])
+    manifest = rc.compact_all(store, "raw")
+    entry = manifest["partitions"]["2024/01/05"]
+    del entry["first_compacted"]
+    entry["compacted_at"] = (datetime.utcnow() - timedelta(days=30)).isoformat() + "Z"
+    assert rc.expire_sources(store, manifest, 7, "raw") == 1
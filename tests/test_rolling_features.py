@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import rolling_features as rf
+from rolling_features import ROLLING_COLUMNS, RollingFeatureEngine
+
+
+def history(sensors=4, days=3, step=900, seed=0):
+    rng = np.random.default_rng(seed)
+    t0 = pd.Timestamp("2024-01-01").value // 10**9
+    ticks = np.arange(t0, t0 + days * 86400, step)
+    rows = []
+    for s in range(sensors):
+        level = np.cumsum(rng.uniform(0, 0.02, len(ticks))) % 1.0   # remplissage + vidages
+        rows.append(pd.DataFrame({"sensor_id": f"S{s+1}", "ts": pd.to_datetime(ticks, unit="s"),
+                                  "fill_level": level.astype(np.float32)}))
+    return pd.concat(rows, ignore_index=True)
+
+
+def by_key(df):
+    return df.assign(sensor_id=df["sensor_id"].astype(str)).sort_values(["sensor_id", "ts"], ignore_index=True)
+
+
+def test_incremental_matches_full_recompute(store):
+    df = history()
+    full = by_key(RollingFeatureEngine().update(df))
+
+    parts = []
+    ticks = np.sort(df["ts"].unique())
+    for chunk in np.array_split(ticks, 4):
+        engine = RollingFeatureEngine.load(store, "silver")
+        parts.append(engine.update(df[df["ts"].isin(chunk)]))
+        engine.save(store, "silver")
+    incremental = by_key(pd.concat(parts, ignore_index=True))
+
+    assert len(incremental) == len(full) == len(df)
+    assert (incremental["ts"].to_numpy() == full["ts"].to_numpy()).all()
+    for col in ROLLING_COLUMNS:
+        np.testing.assert_allclose(incremental[col], full[col], rtol=1e-4, atol=1e-5, err_msg=col)
+
+
+def test_rows_in_tail_are_skipped_and_late_rows_counted():
+    df = history(sensors=2, days=2)
+    engine = RollingFeatureEngine()
+    engine.update(df.iloc[::2])   # une mesure sur deux
+
+    before = rf.LATE_ROWS.labels().value
+    tail_rows = df.iloc[::2].tail(4)
+    assert engine.update(tail_rows).empty
+    assert rf.LATE_ROWS.labels().value == before
+
+    late = df.iloc[1::2].head(3)   # jamais vues, antérieures à l'état
+    out = engine.update(late)
+    assert rf.LATE_ROWS.labels().value == before + 3
+    # rendues avec des features NaN, pour être écrites (plus en attente)
+    assert by_key(out)[["sensor_id", "ts"]].equals(by_key(late)[["sensor_id", "ts"]])
+    assert out[ROLLING_COLUMNS].isna().all().all()
+
+
+def test_pending_mask():
+    df = history(sensors=2, days=1)
+    done = df.iloc[:10]
+    mask = rf.pending_mask(df, done)
+    assert not mask[:10].any() and mask[10:].all()
+    assert rf.pending_mask(df, done.iloc[:0]).all()
+
+
+def test_partitions_merge_read_and_expire(store):
+    df = history(sensors=2, days=3)
+    feats = RollingFeatureEngine().update(df)
+
+    # ancienne sortie par run, reprise puis supprimée
+    store.write_parquet(feats.iloc[:50], "silver", f"{rf.PREFIX}part_20240101T000000Z.parquet")
+    keys = rf.write_rows(store, "silver", feats.iloc[40:])
+    days = rf.days_of(df["ts"])
+    assert keys == [rf.partition_key(d) for d in days]
+    assert sorted(store.list_keys("silver", rf.PREFIX)) == keys
+
+    # réécriture d'un jour : une valeur par (capteur, ts), la dernière
+    changed = feats.iloc[:5].assign(fill_lag_1=np.float32(-7))
+    rf.write_rows(store, "silver", changed)
+    back = by_key(rf.read_rows(store, "silver", days))
+    assert len(back) == len(feats)
+    assert (back.merge(changed[["sensor_id", "ts"]])["fill_lag_1"] == -7).all()
+
+    assert rf.expire_rows(store, "silver", days[1:]) == [rf.partition_key(days[0])]
+    assert len(rf.read_rows(store, "silver", days)) == (df["ts"].dt.strftime("%Y-%m-%d") != days[0]).sum()
+
+
+def test_update_table_counts_late_rows_once(store):
+    df = history(sensors=2, days=3)
+    on_time = df[df["ts"] < df["ts"].max() - pd.Timedelta(hours=6)]
+    rows, written = rf.update_table(store, "silver", on_time.iloc[::2])
+    assert len(rows) == len(on_time.iloc[::2]) and written
+
+    before = rf.LATE_ROWS.labels().value
+    missed = on_time.iloc[1::2]                     # jours anciens et récents
+    seen = on_time.iloc[::2].groupby("sensor_id")["ts"].max()
+    late = missed[missed["ts"] < missed["sensor_id"].map(seen)]
+    rows, _ = rf.update_table(store, "silver", pd.concat([on_time.iloc[::2], missed, df[~df.index.isin(on_time.index)]]))
+    assert rf.LATE_ROWS.labels().value == before + len(late) > before
+    assert len(rows) == len(df)
+
+    # run suivant, mêmes données : rien à calculer, rien de recompté
+    rows, written = rf.update_table(store, "silver", df)
+    assert written == [] and rf.LATE_ROWS.labels().value == before + len(late)
+    assert len(by_key(rows).drop_duplicates(["sensor_id", "ts"])) == len(df)
+
+
+def test_update_table_reads_recent_partitions_for_pending(store, monkeypatch):
+    df = history(sensors=2, days=4)
+    rf.update_table(store, "silver", df[df["ts"] < pd.Timestamp("2024-01-04")])
+    floor = RollingFeatureEngine.load(store, "silver").first_day()
+    assert floor == "2024-01-03"   # queue de 24 h avant la dernière mesure (03 à 23:45)
+
+    masks = []
+    pending_mask = rf.pending_mask
+    monkeypatch.setattr(rf, "pending_mask", lambda d, done: masks.append(rf.days_of(d["ts"])) or pending_mask(d, done))
+    rows, written = rf.update_table(store, "silver", df)
+    # seuls les jours depuis la queue sont examinés, les lignes anciennes à part
+    assert masks[0] == ["2024-01-03", "2024-01-04"]
+    assert written == [rf.partition_key("2024-01-04")]
+    assert len(rows) == len(df)
@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+import pytest
+
+import route_service
+from route_service import RouteService, decode_polyline, encode_polyline, importance
+
+
+def douglas_peucker(xy, tol):
+    """Référence récursive : indices conservés à la tolérance `tol`."""
+    def rec(i, j):
+        if j - i < 2:
+            return []
+        d = route_service._segment_distance(xy[i + 1:j], xy[i], xy[j])
+        k = int(np.argmax(d))
+        if d[k] <= tol:
+            return []
+        return rec(i, i + 1 + k) + [i + 1 + k] + rec(i + 1 + k, j)
+    return [0] + rec(0, len(xy) - 1) + [len(xy) - 1]
+
+
+def zigzag(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack((np.cumsum(rng.normal(5, 3, n)), np.cumsum(rng.normal(0, 4, n))))
+
+
+@pytest.mark.parametrize("tol", [0.5, 2.0, 5.0, 20.0, 100.0])
+def test_importance_matches_douglas_peucker(tol):
+    xy = zigzag()
+    assert np.flatnonzero(importance(xy) > tol).tolist() == douglas_peucker(xy, tol)
+
+
+def test_importance_floor_and_ends():
+    xy = zigzag()
+    imp = importance(xy, floor=3.0)
+    assert np.isinf(imp[[0, -1]]).all()
+    assert np.flatnonzero(imp > 3.0).tolist() == douglas_peucker(xy, 3.0)
+
+
+def test_polyline_reference_and_round_trip():
+    # exemple de la documentation Google
+    points = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+    assert encode_polyline(points) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    rng = np.random.default_rng(1)
+    for precision in (5, 6):
+        pts = np.column_stack((48.8 + rng.random(200) / 10, 2.3 + rng.random(200) / 10))
+        back = np.asarray(decode_polyline(encode_polyline(pts, precision), precision))
+        assert np.abs(back - pts).max() <= 0.5 / 10 ** precision + 1e-12
+    assert encode_polyline([]) == "" and decode_polyline("") == []
+
+
+def write_route(tmp_path, geometry):
+    path = tmp_path / "route_obu1.json"
+    path.write_text(json.dumps({"geometry": geometry, "distance": 1.0, "duration": "0:10"}))
+    return RouteService(str(tmp_path / "route_obu{}.json"))
+
+
+STREET = [[48.85, 2.33 + 0.001 * i] for i in range(11)]   # plein est, ~73 m par segment
+
+
+def test_locate_projects_on_nearest_segment(tmp_path):
+    route = write_route(tmp_path, STREET).load(1)
+    seg, point, done = route.locate(48.8501, 2.3345)
+    assert seg == 4
+    np.testing.assert_allclose(point, [48.85, 2.3345])
+    assert done == pytest.approx(route.cumulative[4] + 0.5 * (route.cumulative[5] - route.cumulative[4]))
+    assert route.locate(48.86, 2.20)[0] == 0                 # avant le départ
+    assert route.locate(48.85, 2.40)[2] == pytest.approx(route.cumulative[-1])
+
+
+def test_ahead_hits_cache_and_matches_geometry(tmp_path):
+    routes = write_route(tmp_path, (zigzag(300) / 1e5 + [48.85, 2.33]).tolist())
+    route = routes.load(1)
+    for encoding in route_service.ENCODINGS:
+        for lat, lon in (route.points[40] + 1e-6, route.points[150] - 2e-6, route.points[-1]):
+            r = routes.get(1, zoom=17, position=(lat, lon), encoding=encoding)
+            expected = route.geometry(17, route.locate(lat, lon))
+            got = decode_polyline(r["polyline"]) if encoding == "polyline" else r["geometry"]
+            assert r["points"] == len(expected)
+            np.testing.assert_allclose(got, expected, atol=1e-5)
+    # une géométrie encodée par encodage, les positions ne recalculent rien
+    assert routes.misses == 2 and routes.hits == 4
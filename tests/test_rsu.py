@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+
+import its_codec
+import rsu
+
+POSITIONS = [[48.85, 2.33], [48.86, 2.34]]
+
+
+def cam_message(station, lat, lon, topic="vanetza/out/cam"):
+    cam = {"stationID": station, "latitude": lat, "longitude": lon}
+    return SimpleNamespace(topic=topic, payload=its_codec.encode(topic, cam).encode())
+
+
+def test_on_message_updates_truck_position(monkeypatch):
+    monkeypatch.setattr(rsu, "journal", None)
+    rsu.init_state(POSITIONS, truck_count=2)
+    rsu.on_message(None, None, cam_message(2, 48.8612, 2.3456))
+    assert rsu.truck_positions == [[None, None], [48.8612, 2.3456]]
+    assert rsu.truck_seen[1] is not None and rsu.truck_seen[0] is None
+
+
+def test_on_message_ignores_bad_cams(monkeypatch):
+    monkeypatch.setattr(rsu, "journal", None)
+    rsu.init_state(POSITIONS, truck_count=2)
+    rsu.on_message(None, None, SimpleNamespace(topic="vanetza/out/cam", payload=b"{tronqu"))
+    rsu.on_message(None, None, cam_message(9, 48.0, 2.0))   # stationID hors limites
+    assert rsu.truck_positions == [[None, None], [None, None]]
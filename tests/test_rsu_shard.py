@@ -0,0 +1,145 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import rsu
+import rsu_shard
+from rsu_state import StateJournal
+
+# capteur 0 dans le shard 0, capteur 1 dans le shard 1 (bandes de 0.01°)
+POSITIONS = [[48.805, 2.305], [48.845, 2.305]]
+BORDER_TRUCK = [48.815, 2.305]   # shard 1, le plus proche du capteur 0
+LOCAL_TRUCK = [48.78, 2.305]     # shard 0, plus loin
+
+
+class Recorder:
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, topic, payload):
+        self.messages.append((topic, payload))
+
+    def topics(self):
+        return [t for t, _ in self.messages]
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    monkeypatch.setattr(rsu, "journal", None)
+    rsu.init_state(POSITIONS, truck_count=2)
+    for t, pos in enumerate((BORDER_TRUCK, LOCAL_TRUCK)):
+        rsu.truck_positions[t] = list(pos)
+        rsu.truck_seen[t] = time.time()
+    plan = rsu_shard.ShardPlan(POSITIONS, 2, 0.01)
+    assert plan.sensors == [[0], [1]]
+    return rsu_shard.ShardWorker(plan, 0)
+
+
+def test_nack_falls_back_to_local_trucks(worker):
+    client = Recorder()
+    assert worker.generate(0, *POSITIONS[0], client)
+    assert client.topics() == [rsu_shard.HANDOFF_TOPIC + "1"]
+
+    worker.on_handoff({"op": "nack", "sensor": 0, "from": 1}, client)
+    assert 0 not in rsu.dispatched
+
+    # pas de nouveau handoff vers le camion de la bordure : camion local
+    assert worker.generate(0, *POSITIONS[0], client)
+    assert client.topics()[1:] == ["vanetza/in/denm"]
+    assert rsu.truck_assign_count == [0, 1]
+
+
+def test_nack_without_local_truck_waits(worker):
+    rsu.truck_seen[1] = None
+    client = Recorder()
+    worker.generate(0, *POSITIONS[0], client)
+    worker.on_handoff({"op": "nack", "sensor": 0, "from": 1}, client)
+    assert not worker.generate(0, *POSITIONS[0], client)
+    assert client.topics() == [rsu_shard.HANDOFF_TOPIC + "1"]
+
+
+def test_refusal_expires(worker, monkeypatch):
+    client = Recorder()
+    worker.on_handoff({"op": "nack", "sensor": 0, "from": 1}, client)
+    monkeypatch.setattr(rsu_shard, "TRUCK_TTL", 0.0)
+    rsu.truck_seen[:] = [time.time() + 60] * 2   # camions toujours frais
+    assert worker.generate(0, *POSITIONS[0], client)
+    assert client.topics() == [rsu_shard.HANDOFF_TOPIC + "1"]
+    assert 0 not in worker.refused
+
+
+def test_truck_freshness_survives_restart(worker, tmp_path, monkeypatch):
+    journal = StateJournal(tmp_path)
+    journal.load()
+    journal.snapshot(rsu.current_state)
+    monkeypatch.setattr(rsu, "journal", journal)
+    rsu.update_truck(0, *BORDER_TRUCK)
+    journal.close()
+
+    rsu.init_state(POSITIONS, truck_count=2)   # redémarrage
+    assert worker.fresh_trucks() == []
+    rsu.restore_state(StateJournal(tmp_path).load())
+    assert worker.fresh_trucks() == [0, 1]
+
+
+def handoff_message(payload):
+    return SimpleNamespace(topic=rsu_shard.HANDOFF_TOPIC + "0", payload=payload)
+
+
+def test_malformed_handoff_is_dropped(worker):
+    client = Recorder()
+    for payload in (b"{tronqu", b"\xff", b"42", b'{"op": "assign"}', b'{"op": "assign", "sensor": 1, "from": 1}'):
+        worker.on_message(client, None, handoff_message(payload))
+    assert client.messages == []
+
+
+def test_ack_settles_handoff(worker):
+    client = Recorder()
+    worker.generate(0, *POSITIONS[0], client)
+    assert 0 in rsu.handoffs
+    worker.on_handoff({"op": "ack", "sensor": 0, "from": 1}, client)
+    assert rsu.handoffs == {} and 0 in rsu.dispatched
+
+
+def test_owner_acks_published_denm():
+    rsu.init_state(POSITIONS, truck_count=2)
+    rsu.truck_positions[0] = list(BORDER_TRUCK)
+    rsu.truck_seen[0] = time.time()
+    owner = rsu_shard.ShardWorker(rsu_shard.ShardPlan(POSITIONS, 2, 0.01), 1)
+    client = Recorder()
+    owner.on_handoff({"op": "assign", "sensor": 0, "lat": POSITIONS[0][0], "lon": POSITIONS[0][1],
+                      "from": 0}, client)
+    assert client.topics() == ["vanetza/in/denm", rsu_shard.HANDOFF_TOPIC + "0"]
+    assert json.loads(client.messages[1][1])["op"] == "ack"
+
+
+def test_unanswered_handoff_times_out(worker, monkeypatch):
+    client = Recorder()
+    worker.generate(0, *POSITIONS[0], client)
+    worker.expire_handoffs()
+    assert 0 in rsu.dispatched                  # encore dans le délai
+    monkeypatch.setattr(rsu_shard, "HANDOFF_TIMEOUT", -1.0)
+    worker.expire_handoffs()
+    assert 0 not in rsu.dispatched and rsu.handoffs == {}
+    # redispatché sur un camion local, pas de nouveau handoff
+    assert worker.cycle(["80", "10"], client) == 1
+    assert client.topics()[-1] == "vanetza/in/denm"
+
+
+def test_pending_handoff_survives_restart(worker, tmp_path, monkeypatch):
+    journal = StateJournal(tmp_path)
+    journal.load()
+    journal.snapshot(rsu.current_state)
+    monkeypatch.setattr(rsu, "journal", journal)
+    worker.generate(0, *POSITIONS[0], Recorder())
+    journal.close()
+    monkeypatch.setattr(rsu, "journal", None)
+
+    rsu.init_state(POSITIONS, truck_count=2)
+    rsu.restore_state(StateJournal(tmp_path).load())
+    assert list(rsu.handoffs) == [0] and rsu.handoffs[0][0] == 1
+    monkeypatch.setattr(rsu_shard, "HANDOFF_TIMEOUT", -1.0)
+    worker.expire_handoffs()
+    assert 0 not in rsu.dispatched
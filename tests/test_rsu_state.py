@@ -0,0 +1,92 @@
+import json
+
+from rsu_state import StateJournal, empty_state
+
+POSITIONS = [[48.85, 2.33], [48.86, 2.34], [48.87, 2.35]]
+
+
+def assign(state, sensor, truck):
+    """Comme rsu.send_denm : état modifié, puis opération avec compteurs absolus."""
+    state["truck_assign_count"][truck] += 1
+    state["total_assigned"] += 1
+    state["dispatched"].append(sensor)
+    return {"op": "assign", "sensor": sensor, "truck": truck,
+            "count": state["truck_assign_count"][truck], "total": state["total_assigned"]}
+
+
+def test_replay_after_crash(tmp_path):
+    journal = StateJournal(tmp_path)
+    state = empty_state(POSITIONS, truck_count=2)
+    assert journal.load() is None
+    journal.snapshot(lambda: state)
+    state["truck_positions"][1] = [48.9, 2.4]
+    journal.append({"op": "cam", "truck": 1, "lat": 48.9, "lon": 2.4})
+    journal.append(assign(state, 0, 1), sync=True)
+    journal.append(assign(state, 2, 1), sync=True)
+    state["dispatched"].remove(0)
+    journal.append({"op": "clear", "sensor": 0})
+    # crash : pas de close ni de snapshot
+
+    restored = StateJournal(tmp_path).load()
+    assert restored["truck_positions"] == [[None, None], [48.9, 2.4]]
+    assert restored["truck_assign_count"] == [0, 2]
+    assert restored["total_assigned"] == 2
+    assert restored["dispatched"] == [2]
+    assert restored["seq"] == 4
+
+
+def test_crash_between_snapshot_and_truncate(tmp_path):
+    journal = StateJournal(tmp_path)
+    state = empty_state(POSITIONS, truck_count=2)
+    journal.load()
+    for sensor in range(3):
+        journal.append(assign(state, sensor, 0), sync=True)
+    log = (tmp_path / "journal.jsonl").read_text()
+    journal.snapshot(lambda: state)
+    (tmp_path / "journal.jsonl").write_text(log)   # journal pas encore vidé
+
+    restored = StateJournal(tmp_path).load()
+    assert restored["truck_assign_count"] == [3, 0]
+    assert restored["total_assigned"] == 3
+
+
+def test_mutation_snapshotted_before_its_append(tmp_path):
+    # l'état est modifié avant append : le snapshot peut déjà contenir
+    # l'assignation, rejouée ensuite avec un seq plus grand
+    journal = StateJournal(tmp_path)
+    state = empty_state(POSITIONS, truck_count=2)
+    journal.load()
+    op = assign(state, 1, 1)
+    journal.snapshot(lambda: json.loads(json.dumps(state)))
+    journal.append(op, sync=True)
+
+    restored = StateJournal(tmp_path).load()
+    assert restored["truck_assign_count"] == [0, 1]
+    assert restored["total_assigned"] == 1
+
+
+def test_truncated_last_line_and_legacy_assign(tmp_path):
+    journal = StateJournal(tmp_path)
+    state = empty_state(POSITIONS, truck_count=2)
+    journal.load()
+    journal.snapshot(lambda: state)
+    journal.append({"op": "assign", "sensor": 0, "truck": 0}, sync=True)   # sans compteurs
+    journal.close()
+    with open(tmp_path / "journal.jsonl", "a") as f:
+        f.write('{"seq": 2, "op": "ass')
+
+    restored = StateJournal(tmp_path).load()
+    assert restored["truck_assign_count"] == [1, 0]
+    assert restored["seq"] == 1
+
+
+def test_mirror_restores_on_another_machine(tmp_path, store):
+    mirror = (store, "gold", "rsu/state/snapshot.json")
+    state = empty_state(POSITIONS)
+    journal = StateJournal(tmp_path / "a", mirror=mirror)
+    journal.load()
+    journal.append(assign(state, 0, 2))
+    journal.snapshot(lambda: state)
+
+    restored = StateJournal(tmp_path / "b", mirror=mirror).load()
+    assert restored["truck_assign_count"] == [0, 0, 1]
@@ -0,0 +1,124 @@
+import gzip
+import json
+
+import pytest
+
+from sensor_stream_ingest import RECORDS, MicroBatchWriter, decode_message
+
+DAY = 86400 * 1000
+T0 = 1704067200000   # 2024-01-01T00:00:00Z
+
+
+def records(n, start=T0, step=60000, sensors=("S1", "S2")):
+    return [{"sensor_id": s, "timestamp": start + i * step, "fill_level": i / n}
+            for i in range(n) for s in sensors]
+
+
+def stored(store, bucket="raw"):
+    out = []
+    for key in store.list_keys(bucket):
+        out += [json.loads(l) for l in gzip.decompress(store.get_bytes(bucket, key)).splitlines()]
+    return out
+
+
+class FailingStore:
+    """Échoue sur la n-ième écriture (une seule fois)."""
+
+    def __init__(self, store, fail_at):
+        self.store, self.fail_at, self.puts = store, fail_at, 0
+
+    def put_bytes(self, *args):
+        self.puts += 1
+        if self.puts == self.fail_at:
+            raise ConnectionError("stockage indisponible")
+        self.store.put_bytes(*args)
+
+
+def test_add_only_buffers(store, tmp_path):
+    writer = MicroBatchWriter(store, "raw", max_records=2, spool_dir=tmp_path)
+    writer.add(records(5))
+    assert writer.should_flush()
+    assert list(store.list_keys("raw")) == []
+    assert writer.flush() == 10
+    assert len(stored(store)) == 10
+
+
+def test_replay_after_crash_and_watermarks(store, tmp_path):
+    writer = MicroBatchWriter(store, "raw", spool_dir=tmp_path)
+    writer.add(records(3))
+    # crash : pas de flush ; le journal est rejoué au redémarrage
+    writer = MicroBatchWriter(store, "raw", spool_dir=tmp_path)
+    assert writer.flush() == 6
+
+    # mesures déjà écrites : écartées par les filigranes, même après redémarrage
+    writer = MicroBatchWriter(store, "raw", spool_dir=tmp_path)
+    writer.add(records(3) + records(1, start=T0 + 3600 * 1000))
+    assert writer.flush() == 2
+    assert len(stored(store)) == 8
+
+
+def test_partial_flush_keeps_only_unwritten_partitions(store, tmp_path):
+    batch = records(2) + records(2, start=T0 + DAY)   # deux partitions date=
+    failing = FailingStore(store, fail_at=2)
+    writer = MicroBatchWriter(failing, "raw", spool_dir=tmp_path)
+    writer.add(batch)
+    with pytest.raises(ConnectionError):
+        writer.flush()
+    assert len(list(store.list_keys("raw"))) == 1
+
+    # redémarrage : seule la 2e partition est rejouée, aucun objet en double
+    writer = MicroBatchWriter(store, "raw", spool_dir=tmp_path)
+    assert writer.flush() == 4
+    assert len(list(store.list_keys("raw"))) == 2
+    rows = stored(store)
+    assert len(rows) == len(batch)
+    assert len({(r["sensor_id"], r["timestamp"]) for r in rows}) == len(batch)
+
+
+def test_invalid_records_are_skipped(store, tmp_path):
+    writer = MicroBatchWriter(store, "raw", spool_dir=tmp_path)
+    writer.add([{"sensor_id": "S1", "timestamp": "x", "fill_level": 1},
+                {"sensor_id": "S1", "timestamp": T0, "fill_level": 0.5}])
+    assert writer.flush() == 1
+
+
+def test_decode_message():
+    ok = {"sensor_id": "S1", "timestamp": T0, "fill_level": 0.5}
+    assert decode_message(json.dumps(ok).encode()) == [ok]
+    assert decode_message(json.dumps([ok, 3, "x", None, {"sensor_id": "S2"}]).encode()) == [ok]
+    assert decode_message(b"42") == []
+    with pytest.raises(ValueError):
+        decode_message(b"{not json")
+
+
+def test_out_of_order_within_lateness(store, tmp_path):
+    writer = MicroBatchWriter(store, "raw", spool_dir=tmp_path, lateness=600)
+    writer.add(records(1, start=T0 + 300 * 1000, sensors=("S1",)))
+    writer.flush()
+    # redémarrage : filigrane à T0 + 5 min, fenêtre de 10 min en dessous
+    writer = MicroBatchWriter(store, "raw", spool_dir=tmp_path, lateness=600)
+    late = RECORDS.labels(outcome="late").value
+    writer.add([{"sensor_id": "S1", "timestamp": T0 + 60 * 1000, "fill_level": 0.1},    # en désordre
+                {"sensor_id": "S1", "timestamp": T0 + 300 * 1000, "fill_level": 0.0},   # déjà écrite
+                {"sensor_id": "S1", "timestamp": T0 - 600 * 1000, "fill_level": 0.2}])  # trop ancienne
+    assert writer.flush() == 1
+    assert RECORDS.labels(outcome="late").value == late + 1
+    assert sorted(r["timestamp"] for r in stored(store)) == [T0 + 60 * 1000, T0 + 300 * 1000]
+    # la mesure en retard, une fois écrite, est un doublon
+    writer.add([{"sensor_id": "S1", "timestamp": T0 + 60 * 1000, "fill_level": 0.1}])
+    assert writer.flush() == 0
+
+
+def test_recent_keys_leave_the_window(store, tmp_path):
+    writer = MicroBatchWriter(store, "raw", spool_dir=tmp_path, lateness=120)
+    writer.add(records(10, sensors=("S1",)))   # une mesure par minute
+    writer.flush()
+    # filigrane 9 min, fenêtre 2 min : 7 min est à la limite, comptée en retard
+    assert sorted(writer._recent["S1"]) == [T0 + 8 * 60000, T0 + 9 * 60000]
+
+
+def test_legacy_watermarks_file(store, tmp_path):
+    (tmp_path / "watermarks.json").write_text(json.dumps({"S1": T0}))
+    writer = MicroBatchWriter(store, "raw", spool_dir=tmp_path)
+    writer.add([{"sensor_id": "S1", "timestamp": T0 - 1000, "fill_level": 0.1}])
+    assert writer.flush() == 1
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+import spatial_features as sf
+
+
+def points(n, seed, **extra):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"lat": 48.85 + rng.random(n) / 100, "lon": 2.34 + rng.random(n) / 100, **extra})
+
+
+def test_compute_matches_brute_force():
+    df_pos = points(30, 0, sensor_id=[f"S{i+1}" for i in range(30)])
+    df_pav = points(80, 1, pav_type=np.where(np.arange(80) % 2, "Verre", "Textile"))
+    out = sf.compute(df_pos, df_pav, radii=(100, 300))
+
+    lat0 = df_pos["lat"].mean()
+    sensors = sf.project(df_pos["lat"], df_pos["lon"], lat0)
+    for pav_type, pts in df_pav.groupby("pav_type"):
+        d = np.hypot(*(sensors[:, None, :] - sf.project(pts["lat"], pts["lon"], lat0)[None]).transpose(2, 0, 1))
+        name = sf._slug(pav_type)
+        np.testing.assert_allclose(out[f"pav_{name}_dist_m"], d.min(axis=1), rtol=1e-5)
+        for r in (100, 300):
+            assert (out[f"pav_{name}_n_{r}m"] == (d <= r).sum(axis=1)).all()
+
+
+def test_cache_keeps_only_current_version(store):
+    df_pos = points(10, 0, sensor_id=[f"S{i+1}" for i in range(10)])
+    pav_v1 = points(20, 1, pav_type="Verre")
+    pav_v2 = points(25, 2, pav_type="Verre")
+
+    _, key1, computed = sf.neighbourhood(store, "silver", df_pos, pav_v1)
+    assert computed
+    _, key, computed = sf.neighbourhood(store, "silver", df_pos, pav_v1.iloc[::-1])   # même contenu
+    assert key == key1 and not computed
+
+    _, key2, computed = sf.neighbourhood(store, "silver", df_pos, pav_v2)
+    assert computed and key2 != key1
+    assert list(store.list_keys("silver", sf.CACHE_PREFIX)) == [key2]
+    _, _, computed = sf.neighbourhood(store, "silver", df_pos, pav_v1)
+    assert computed and list(store.list_keys("silver", sf.CACHE_PREFIX)) == [key1]
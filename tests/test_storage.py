@@ -0,0 +1,44 @@
+import uuid
+
+import pandas as pd
+import pytest
+
+from metrics import STORAGE_BYTES, STORAGE_SECONDS
+from storage import LocalStorage, MemoryStorage, S3Storage
+
+OPS = ("get", "put", "head", "list", "delete", "read_parquet", "write_parquet")
+
+
+def counts(backend):
+    return {key[1]: child.count for key, child in STORAGE_SECONDS._samples() if key[0] == backend}
+
+
+def exercise(store):
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    store.put_bytes("b", "x/1.bin", b"abc")
+    store.get_bytes("b", "x/1.bin")
+    store.exists("b", "x/1.bin")
+    list(store.list_keys("b", "x/"))
+    store.write_parquet(df, "b", "x/t.parquet")
+    assert store.read_parquet("b", "x/t.parquet").equals(df)
+    store.delete("b", "x/1.bin")
+    with pytest.raises(FileNotFoundError):
+        store.get_bytes("b", "x/1.bin")
+
+
+@pytest.mark.parametrize("make", [lambda tmp: LocalStorage(tmp), lambda tmp: MemoryStorage(uuid.uuid4().hex)],
+                         ids=["file", "mem"])
+def test_every_operation_is_instrumented(make, tmp_path):
+    store = make(str(tmp_path))
+    before = counts(store.backend)
+    bytes_in = STORAGE_BYTES.labels(backend=store.backend, direction="in").value
+    exercise(store)
+    after = counts(store.backend)
+    for op in OPS:
+        assert after.get(op, 0) > before.get(op, 0), op
+    assert STORAGE_BYTES.labels(backend=store.backend, direction="in").value > bytes_in + 3
+
+
+def test_s3_backend_decorates_the_same_operations():
+    for op in ("get_bytes", "put_bytes", "exists", "list_keys", "delete"):
+        assert hasattr(getattr(S3Storage, op), "__wrapped__"), op
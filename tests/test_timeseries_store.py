@@ -0,0 +1,88 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from timeseries_store import CHUNK_SECONDS, TimeSeriesStore
+
+DAY = 20000 * CHUNK_SECONDS   # minuit UTC
+
+
+def test_append_and_query_raw(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    assert store.append(DAY, [0.1, 0.2, 0.3])
+    assert store.append(DAY + 15, [0.4, 0.5, 0.6])
+    assert not store.append(DAY + 15, [0.9, 0.9, 0.9])    # doublon
+    assert not store.append(DAY + 10, [0.9, 0.9, 0.9])    # en retard
+    ts, val = store.query(1, DAY, DAY + 60)
+    assert ts.tolist() == [DAY, DAY + 15]
+    np.testing.assert_allclose(val, [0.2, 0.5])
+    with pytest.raises(ValueError):
+        store.append(DAY + 30, [0.1, 0.2])
+
+
+def test_rollups_are_bucket_means(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    for i in range(8):   # 2 minutes de ticks toutes les 15 s
+        store.append(DAY + 15 * i, [i, 0.0])
+    store.append(DAY + 3600, [0.0, 0.0])   # clôt la 2e minute et la 1re heure
+    ts, val = store.query(0, DAY, DAY + 7200, "1m")
+    assert ts.tolist() == [DAY, DAY + 60]
+    np.testing.assert_allclose(val, [1.5, 5.5])
+    ts, val = store.query(0, DAY, DAY + 7200, "1h")
+    assert ts.tolist() == [DAY]
+    np.testing.assert_allclose(val, [3.5])
+
+
+def test_rollover_seals_previous_day(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    store.append(DAY + 10, [0.2])
+    store.append(DAY + 20, [0.4])
+    store.append(DAY + CHUNK_SECONDS, [1.0])   # nouveau jour
+    assert store.chunk_starts() == [DAY, DAY + CHUNK_SECONDS]
+    with open(os.path.join(tmp_path, f"chunk={DAY}", "meta.json")) as f:
+        assert json.load(f)["sealed"]
+    # le dernier bucket du jour, jamais clos par un tick, est écrit au scellement
+    ts, val = store.query(0, DAY, DAY + CHUNK_SECONDS, "1h")
+    assert ts.tolist() == [DAY]
+    np.testing.assert_allclose(val, [0.3])
+    assert not store.append(DAY + 30, [0.5])   # jour déjà clos
+
+
+def test_restart_seals_and_keeps_current_bucket(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    store.append(DAY + 10, [0.2])
+    store.close()
+    reopened = TimeSeriesStore(str(tmp_path))
+    reopened.append(DAY + 20, [0.4])
+    reopened.append(DAY + 60, [0.0])
+    ts, val = reopened.query(0, DAY, DAY + 60, "1m")
+    np.testing.assert_allclose(val, [0.3])   # tick d'avant le redémarrage inclus
+    reopened.close()
+    # redémarré le lendemain : la veille est scellée à l'ouverture
+    TimeSeriesStore(str(tmp_path)).append(DAY + CHUNK_SECONDS + 5, [0.0])
+    ts, _ = TimeSeriesStore(str(tmp_path)).query(0, DAY, DAY + CHUNK_SECONDS, "1h")
+    assert ts.tolist() == [DAY]
+
+
+def test_long_ranges_use_rollups():
+    assert TimeSeriesStore.resolution_for(0, 3600, "raw") == "raw"
+    assert TimeSeriesStore.resolution_for(0, 24 * 3600, "raw") == "1m"
+    assert TimeSeriesStore.resolution_for(0, 7 * 24 * 3600, "raw") == "1h"
+    assert TimeSeriesStore.resolution_for(0, 7 * 24 * 3600, "1m") == "1h"
+    assert TimeSeriesStore.resolution_for(0, 3600, "1h") == "1h"
+    with pytest.raises(ValueError):
+        TimeSeriesStore.resolution_for(0, 3600, "5m")
+
+
+def test_sparkline(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    for i in range(3 * 60):
+        store.append(DAY + 60 * i, [i / 180])
+    # pas de 30 min → rollup 1m (l'heure en cours n'est pas encore dans le 1h)
+    ts, val = store.sparkline(0, DAY + 3 * 3600, hours=3, points=6)
+    assert ts.tolist() == [DAY + 1800 * k for k in range(6)]
+    assert np.all(np.diff(val) > 0)
+    with pytest.raises(ValueError):
+        store.sparkline(0, DAY + 3600, points=0)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+timeseries_store.py
+
+Historique embarqué (append-only) des niveaux de remplissage par capteur.
+
+Organisation sur disque :
+    <root>/chunk=<epoch_debut_jour>/
+        meta.json        {"start": ..., "n_sensors": ..., "sealed": bool}
+        raw.ts           int64   — timestamp (s) de chaque tick
+        raw.val          float32 — matrice [n_ticks, n_sensors] (fill_level 0-1)
+        1m.ts / 1m.val   rollup moyen à la minute
+        1h.ts / 1h.val   rollup moyen à l'heure
+
+– Un tick = une ligne contenant le niveau de *tous* les capteurs (c'est ce que
+  produisent `sensor_simulator.py` et `gold.py`), stockée telle quelle : la
+  matrice est « tick-major », l'append d'un tick est une seule écriture
+  séquentielle. En contrepartie, lire *un* capteur est une lecture strided
+  (un float32 par ligne de 4 × n_sensors octets) : avec le readahead du noyau,
+  l'I/O est de l'ordre de la taille du chunk entier, pas de la colonne.
+  Ordres de grandeur pour 5000 capteurs et un tick toutes les 15 s, sur une
+  semaine : raw ≈ 800 Mo lus, 1m ≈ 200 Mo, 1h ≈ 3,4 Mo. Les requêtes longues
+  passent donc par les rollups : `resolution_for` remonte à la résolution
+  suivante au-delà de MAX_SPAN (6 h de raw, 2 jours de 1m), `sparkline`
+  choisit d'après le pas demandé. Le store n'est pas columnaire par capteur.
+– Un chunk par jour UTC : les buckets 1m/1h ne chevauchent jamais deux chunks.
+  Un chunk est « scellé » (dernier bucket 1m/1h écrit depuis le raw) quand le
+  jour suivant est ouvert, y compris par un process redémarré après minuit.
+– Les valeurs sont écrites avant les timestamps, un lecteur concurrent
+  (dashboard) ne voit donc jamais une ligne incomplète.
+
+Usage :
+    store = TimeSeriesStore("sensor/history")
+    store.append(time.time(), [0.12, 0.70, ...])
+    ts, values = store.query(sensor=3, start=t0, end=t1, resolution="1h")
+"""
+import os
+import json
+import threading
+import numpy as np
+
+CHUNK_SECONDS = 24 * 3600
+RESOLUTIONS   = {"raw": 0, "1m": 60, "1h": 3600}
+ROLLUPS       = {"1m": 60, "1h": 3600}
+# fenêtre maximale servie par résolution, au-delà on lit le rollup suivant
+MAX_SPAN      = {"raw": 6 * 3600, "1m": 2 * 24 * 3600}
+
+
+class _Chunk:
+    """Un jour de données : fichiers raw + rollups, lus via memmap."""
+
+    def __init__(self, path, start, n_sensors, sealed=False):
+        self.path      = path
+        self.start     = start
+        self.n_sensors = n_sensors
+        self.sealed    = sealed
+
+    def _files(self, resolution):
+        return (os.path.join(self.path, f"{resolution}.ts"),
+                os.path.join(self.path, f"{resolution}.val"))
+
+    def read(self, resolution):
+        """Retourne (ts[n], val[n, n_sensors]) en memmap, vides si absents."""
+        ts_path, val_path = self._files(resolution)
+        if not os.path.exists(ts_path) or os.path.getsize(ts_path) == 0:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.n_sensors), dtype=np.float32)
+        row_bytes = 4 * self.n_sensors
+        n = min(os.path.getsize(ts_path) // 8, os.path.getsize(val_path) // row_bytes)
+        if n == 0:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.n_sensors), dtype=np.float32)
+        ts  = np.memmap(ts_path, dtype=np.int64, mode="r", shape=(n,))
+        val = np.memmap(val_path, dtype=np.float32, mode="r", shape=(n, self.n_sensors))
+        return ts, val
+
+    def append(self, resolution, ts, row):
+        ts_path, val_path = self._files(resolution)
+        # valeurs d'abord, timestamp ensuite : la ligne n'existe pour les
+        # lecteurs qu'une fois complète
+        with open(val_path, "ab") as f:
+            f.write(np.asarray(row, dtype=np.float32).tobytes())
+        with open(ts_path, "ab") as f:
+            f.write(np.int64(ts).tobytes())
+
+
+class _Rollup:
+    """Accumulateur incrémental pour un bucket (somme + compte)."""
+
+    def __init__(self, width, n_sensors):
+        self.width  = width
+        self.bucket = None
+        self.sum    = np.zeros(n_sensors, dtype=np.float64)
+        self.count  = 0
+
+    def add(self, ts, row):
+        """Ajoute un tick ; retourne (bucket, moyenne) si un bucket est clos."""
+        bucket = ts - ts % self.width
+        closed = None
+        if self.bucket is not None and bucket != self.bucket and self.count:
+            closed = (self.bucket, (self.sum / self.count).astype(np.float32))
+            self.sum[:] = 0.0
+            self.count = 0
+        self.bucket = bucket
+        self.sum += row
+        self.count += 1
+        return closed
+
+
+class TimeSeriesStore:
+    """Store time-series tick-major, append-only, chunké par jour."""
+
+    def __init__(self, root):
+        self.root    = root
+        self._lock   = threading.Lock()
+        self._chunks = {}
+        self._active = None
+        self._last_ts = None
+        self._rollups = {}
+        os.makedirs(root, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Chunks
+    # ------------------------------------------------------------------
+    def _chunk_path(self, start):
+        return os.path.join(self.root, f"chunk={start}")
+
+    def _load_chunk(self, start):
+        chunk = self._chunks.get(start)
+        if chunk is not None:
+            return chunk
+        path = self._chunk_path(start)
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        chunk = _Chunk(path, meta["start"], meta["n_sensors"], meta.get("sealed", False))
+        self._chunks[start] = chunk
+        return chunk
+
+    @staticmethod
+    def _write_meta(chunk):
+        meta_path = os.path.join(chunk.path, "meta.json")
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"start": chunk.start, "n_sensors": chunk.n_sensors, "sealed": chunk.sealed}, f)
+        os.replace(tmp, meta_path)
+
+    def _create_chunk(self, start, n_sensors):
+        path = self._chunk_path(start)
+        os.makedirs(path, exist_ok=True)
+        chunk = _Chunk(path, start, n_sensors)
+        self._write_meta(chunk)
+        self._chunks[start] = chunk
+        return chunk
+
+    def chunk_starts(self):
+        starts = []
+        for name in os.listdir(self.root):
+            if name.startswith("chunk="):
+                starts.append(int(name.split("=", 1)[1]))
+        return sorted(starts)
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _replay(chunk, name, rollup, ts, val):
+        """Rejoue dans `rollup` les ticks raw postérieurs au dernier bucket écrit."""
+        last_ts, _ = chunk.read(name)
+        resume = int(last_ts[-1]) + rollup.width if len(last_ts) else chunk.start
+        for i in range(int(np.searchsorted(ts, resume)), len(ts)):
+            closed = rollup.add(int(ts[i]), val[i])
+            if closed is not None:
+                chunk.append(name, *closed)
+
+    def _seal(self, chunk):
+        """Jour terminé : écrit le dernier bucket 1m/1h depuis le raw, une seule fois."""
+        if chunk.sealed:
+            return
+        ts, val = chunk.read("raw")
+        for name, width in ROLLUPS.items():
+            rollup = _Rollup(width, chunk.n_sensors)
+            self._replay(chunk, name, rollup, ts, val)
+            if rollup.count:
+                chunk.append(name, rollup.bucket, (rollup.sum / rollup.count).astype(np.float32))
+        chunk.sealed = True
+        self._write_meta(chunk)
+
+    def _open_active(self, start, n_sensors):
+        # jours précédents non scellés (process arrêté avant minuit) : le
+        # dernier bucket de la journée n'a jamais été écrit
+        for chunk_start in self.chunk_starts():
+            if chunk_start < start:
+                previous = self._load_chunk(chunk_start)
+                if previous is not None:
+                    self._seal(previous)
+        chunk = self._load_chunk(start)
+        if chunk is None:
+            chunk = self._create_chunk(start, n_sensors)
+        elif chunk.n_sensors != n_sensors:
+            raise ValueError(
+                f"Chunk {start} contient {chunk.n_sensors} capteurs, tick de {n_sensors}"
+            )
+        self._active = chunk
+        # Reconstruire les buckets en cours à partir du raw déjà écrit,
+        # pour qu'un redémarrage ne perde pas la minute / l'heure courante
+        self._rollups = {name: _Rollup(width, n_sensors) for name, width in ROLLUPS.items()}
+        ts, val = chunk.read("raw")
+        self._last_ts = int(ts[-1]) if len(ts) else None
+        for name, rollup in self._rollups.items():
+            self._replay(chunk, name, rollup, ts, val)
+        return chunk
+
+    def append(self, ts, values):
+        """Ajoute un tick (timestamp en secondes, niveau 0-1 de chaque capteur)."""
+        ts  = int(ts)
+        row = np.asarray(values, dtype=np.float32)
+        start = ts - ts % CHUNK_SECONDS
+        with self._lock:
+            if self._active is not None and start < self._active.start:
+                return False  # tick d'un jour déjà clos
+            if self._active is None or self._active.start != start:
+                if self._active is not None:
+                    self._seal(self._active)
+                self._open_active(start, len(row))
+            elif self._active.n_sensors != len(row):
+                raise ValueError(
+                    f"Tick de {len(row)} capteurs, chunk courant en a {self._active.n_sensors}"
+                )
+            if self._last_ts is not None and ts <= self._last_ts:
+                return False  # append-only : ticks en retard ou doublons ignorés
+            self._active.append("raw", ts, row)
+            self._last_ts = ts
+            for name, rollup in self._rollups.items():
+                closed = rollup.add(ts, row)
+                if closed is not None:
+                    self._active.append(name, *closed)
+        return True
+
+    def close(self):
+        # Les buckets partiels ne sont pas écrits : ils sont reconstruits
+        # depuis le raw à la réouverture (pas de doublon de bucket).
+        with self._lock:
+            self._active = None
+            self._rollups = {}
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+    def _iter_ranges(self, start, end, resolution):
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Résolution inconnue : {resolution}")
+        for chunk_start in self.chunk_starts():
+            if chunk_start + CHUNK_SECONDS <= start or chunk_start >= end:
+                continue
+            chunk = self._load_chunk(chunk_start)
+            if chunk is None:
+                continue  # chunk en cours de création (bascule de jour) : meta.json pas encore écrit
+            ts, val = chunk.read(resolution)
+            lo = int(np.searchsorted(ts, start, side="left"))
+            hi = int(np.searchsorted(ts, end, side="left"))
+            if hi > lo:
+                yield chunk, ts[lo:hi], val[lo:hi]
+
+    def query(self, sensor, start, end, resolution="raw"):
+        """Série d'un capteur (index 0-based) sur [start, end[ → (ts, values)."""
+        ts_parts, val_parts = [], []
+        for chunk, ts, val in self._iter_ranges(int(start), int(end), resolution):
+            if sensor >= chunk.n_sensors:
+                continue
+            ts_parts.append(np.asarray(ts))
+            val_parts.append(np.asarray(val[:, sensor]))
+        if not ts_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(ts_parts), np.concatenate(val_parts)
+
+    @staticmethod
+    def resolution_for(start, end, resolution="raw"):
+        """Résolution au moins aussi grossière que `resolution` qui couvre [start, end[ dans MAX_SPAN."""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Résolution inconnue : {resolution}")
+        names = list(RESOLUTIONS)
+        for name in names[names.index(resolution):]:
+            if end - start <= MAX_SPAN.get(name, float("inf")):
+                return name
+        return names[-1]
+
+    def sparkline(self, sensor, end, hours=24, points=48):
+        """Série sous-échantillonnée à `points` valeurs pour un mini-graphe."""
+        if hours <= 0 or points <= 0:
+            raise ValueError("hours et points doivent être positifs")
+        start = int(end) - hours * 3600
+        span = hours * 3600 / points
+        resolution = "1h" if span >= 3600 else ("1m" if span >= 60 else "raw")
+        ts, val = self.query(sensor, start, end, resolution)
+        if len(ts) == 0:
+            return ts, val
+        bins = np.minimum(((ts - start) // span).astype(np.int64), points - 1)
+        sums = np.bincount(bins, weights=val, minlength=points)
+        counts = np.bincount(bins, minlength=points)
+        keep = counts > 0
+        bucket_ts = (start + np.arange(points) * span).astype(np.int64)
+        return bucket_ts[keep], (sums[keep] / counts[keep]).astype(np.float32)
+
+    def latest(self):
+        """Dernier tick écrit → (ts, values) ou (None, None)."""
+        for chunk_start in reversed(self.chunk_starts()):
+            chunk = self._load_chunk(chunk_start)
+            if chunk is None:
+                continue
+            ts, val = chunk.read("raw")
+            if len(ts):
+                return int(ts[-1]), np.asarray(val[-1])
+        return None, None
+
+    def to_frame(self, since=0, until=None, resolution="raw"):
+        """
+        Export long (sensor_id, ts, fill_level) pour la feature build Silver.
+        `since` permet une lecture incrémentale : seuls les ticks > since.
+        """
+        import pandas as pd
+        until = until if until is not None else np.iinfo(np.int64).max
+        frames = []
+        for chunk, ts, val in self._iter_ranges(int(since) + 1, int(until), resolution):
+            n_ticks, n_sensors = val.shape
+            frames.append(pd.DataFrame({
+                "sensor_id": np.tile(np.array([f"S{i+1}" for i in range(n_sensors)]), n_ticks),
+                "ts": pd.to_datetime(np.repeat(np.asarray(ts), n_sensors), unit="s"),
+                "fill_level": np.asarray(val).reshape(-1),
+            }))
+        if not frames:
+            return pd.DataFrame(columns=["sensor_id", "ts", "fill_level"])
+        return pd.concat(frames, ignore_index=True)